@@ -17,14 +17,18 @@
 
 import os
 import sys
+import copy
 import json
 import yaml
+import time
 import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Union
-from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Any, Optional, Union, Callable, Awaitable
+from dataclasses import dataclass, asdict, field, is_dataclass
 from enum import Enum
 
 # 导入现有组件
@@ -106,6 +110,8 @@ class EnhancedTestCase:
     generation_iteration: int
     quality_score: float
     diversity_metrics: Dict[str, float]
+    stage_timings: Dict[str, float] = field(default_factory=dict)  # 各阶段耗时(秒)
+    cached_stages: List[str] = field(default_factory=list)  # 命中阶段缓存的阶段
 
 class PowerAutoWorkflowEngine:
     """
@@ -138,6 +144,17 @@ class PowerAutoWorkflowEngine:
         self.current_workflows: Dict[str, EnhancedTestCase] = {}
         self.iteration_counter = 0
         
+        # 并发与阶段缓存配置
+        self.verification_concurrency = 8
+        self.stage_cache_size = 128
+        self._stage_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 只缓存无副作用的分析阶段。executor 每次生成带新 test_id 的测试用例，
+        # 验证阶段依赖本次执行数据，执行、录制和修正阶段都有副作用，均每次重新运行
+        self.cacheable_stages = {
+            WorkflowStage.TEXT_DRIVEN,
+            WorkflowStage.TEXT_TEMPLATE
+        }
+        
         # n8n集成配置
         self.n8n_config = {
             "base_url": "http://localhost:5678",  # n8n默认地址
@@ -159,30 +176,43 @@ class PowerAutoWorkflowEngine:
         
         self.logger.info(f"🚀 开始执行完整工作流: {description[:50]}...")
         
+        timings: Dict[str, float] = {}
+        cached_stages: List[str] = []
+        
         try:
             # 阶段1: 文本驱动
-            stage1_result = await self._stage1_text_driven(description, context)
+            stage1_result = await self._run_stage(WorkflowStage.TEXT_DRIVEN, self._stage1_text_driven,
+                                                  description, context, timings, cached_stages)
             
             # 阶段2: 文本+范本
-            stage2_result = await self._stage2_text_template(stage1_result, context)
+            stage2_result = await self._run_stage(WorkflowStage.TEXT_TEMPLATE, self._stage2_text_template,
+                                                  stage1_result, context, timings, cached_stages)
             
             # 阶段3: executor
-            stage3_result = await self._stage3_executor(stage2_result, context)
+            stage3_result = await self._run_stage(WorkflowStage.EXECUTOR, self._stage3_executor,
+                                                  stage2_result, context, timings, cached_stages)
             
             # 阶段4: test case执行
-            stage4_result = await self._stage4_test_execution(stage3_result, context)
+            stage4_result = await self._run_stage(WorkflowStage.TEST_EXECUTION, self._stage4_test_execution,
+                                                  stage3_result, context, timings, cached_stages)
             
             # 阶段5: 视频+可视化可编辑n8n工作流
-            stage5_result = await self._stage5_video_n8n_workflow(stage4_result, context)
+            stage5_result = await self._run_stage(WorkflowStage.VIDEO_N8N_WORKFLOW, self._stage5_video_n8n_workflow,
+                                                  stage4_result, context, timings, cached_stages)
             
             # 阶段6: 验证节点及节点结果
-            stage6_result = await self._stage6_verification_nodes(stage5_result, context)
+            stage6_result = await self._run_stage(WorkflowStage.VERIFICATION_NODES, self._stage6_verification_nodes,
+                                                  stage5_result, context, timings, cached_stages)
             
             # 阶段7: 修正
-            stage7_result = await self._stage7_correction(stage6_result, context)
+            stage7_result = await self._run_stage(WorkflowStage.CORRECTION, self._stage7_correction,
+                                                  stage6_result, context, timings, cached_stages)
             
             # 阶段8: 产生更细更多样化的test cases
-            stage8_result = await self._stage8_enhanced_generation(stage7_result, context)
+            stage8_result = await self._run_stage(WorkflowStage.ENHANCED_GENERATION, self._stage8_enhanced_generation,
+                                                  stage7_result, context, timings, cached_stages)
+            stage8_result.stage_timings = timings
+            stage8_result.cached_stages = cached_stages
             
             # 保存完整工作流结果
             await self._save_enhanced_test_case(stage8_result)
@@ -194,6 +224,65 @@ class PowerAutoWorkflowEngine:
             self.logger.error(f"❌ 完整工作流执行失败: {e}")
             raise
     
+    @staticmethod
+    def _stage_fingerprint(stage: WorkflowStage, stage_input: Any, context: Dict[str, Any]) -> str:
+        """计算阶段输入的内容哈希"""
+        def normalize(value: Any) -> Any:
+            if is_dataclass(value) and not isinstance(value, type):
+                return asdict(value)
+            if isinstance(value, Enum):
+                return value.value
+            return str(value)
+        
+        payload = json.dumps({"stage": stage.name, "input": stage_input, "context": context},
+                             sort_keys=True, ensure_ascii=False, default=normalize)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    async def _run_stage(self, stage: WorkflowStage, stage_func: Callable[..., Awaitable[Any]],
+                         stage_input: Any, context: Dict[str, Any],
+                         timings: Dict[str, float], cached_stages: List[str]) -> Any:
+        """执行单个阶段，记录耗时；输入未变化的可缓存阶段直接复用上次输出"""
+        start_time = time.perf_counter()
+        cache_key = None
+        
+        if stage in self.cacheable_stages:
+            try:
+                cache_key = self._stage_fingerprint(stage, stage_input, context)
+            except (TypeError, ValueError) as e:
+                self.logger.debug(f"阶段 {stage.value} 输入无法哈希，跳过缓存: {e}")
+            
+            if cache_key and cache_key in self._stage_cache:
+                self._stage_cache.move_to_end(cache_key)
+                # 缓存条目是独立副本，命中时再复制一份，调用方修改结果不会污染缓存
+                stage_delta = copy.deepcopy(self._stage_cache[cache_key])
+                base = stage_input if isinstance(stage_input, dict) else {}
+                result = {**base, **stage_delta}
+                if "context" in result:
+                    # 上下文只按内容参与指纹，结果里必须是本次调用传入的对象
+                    result["context"] = context
+                timings[stage.value] = time.perf_counter() - start_time
+                cached_stages.append(stage.value)
+                self.logger.info(f"♻️ 阶段缓存命中: {stage.value}")
+                return result
+        
+        result = await stage_func(stage_input, context)
+        timings[stage.value] = time.perf_counter() - start_time
+        
+        if cache_key and isinstance(result, dict):
+            # 只缓存本阶段新增或替换的字段的深拷贝，命中时叠加到新的输入上，下游修改结果不会影响缓存
+            base = stage_input if isinstance(stage_input, dict) else {}
+            try:
+                self._stage_cache[cache_key] = copy.deepcopy({
+                    key: value for key, value in result.items()
+                    if key not in base or base[key] is not value
+                })
+            except Exception as e:
+                self.logger.debug(f"阶段 {stage.value} 输出无法复制，跳过缓存: {e}")
+            while len(self._stage_cache) > self.stage_cache_size:
+                self._stage_cache.popitem(last=False)
+        
+        return result
+    
     async def _stage1_text_driven(self, description: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """阶段1: 文本驱动 - 分析用户输入的自然语言描述"""
         self.logger.info("📝 阶段1: 文本驱动分析")
@@ -324,11 +413,14 @@ class PowerAutoWorkflowEngine:
         n8n_workflow = stage5_result["n8n_workflow"]
         execution_data = stage5_result["execution_data"]
         
-        # 验证每个工作流节点
-        verification_results = []
-        for node in n8n_workflow.nodes:
-            result = await self._verify_workflow_node(node, execution_data)
-            verification_results.append(result)
+        # 有界并发验证所有工作流节点（结果保持节点顺序）
+        semaphore = asyncio.Semaphore(self.verification_concurrency)
+        
+        async def verify(node: N8NWorkflowNode) -> VerificationResult:
+            async with semaphore:
+                return await self._verify_workflow_node(node, execution_data)
+        
+        verification_results = list(await asyncio.gather(*(verify(node) for node in n8n_workflow.nodes)))
         
         # 分析验证结果
         verification_analysis = await self._analyze_verification_results(verification_results)
@@ -738,16 +830,20 @@ class PowerAutoWorkflowEngine:
     async def _apply_corrections(self, workflow: N8NWorkflow, correction_actions: List[CorrectionAction]) -> N8NWorkflow:
         """应用修正"""
         corrected_workflow = workflow
+        if not correction_actions:
+            return corrected_workflow
         
+        # 按目标节点分组，一次遍历批量应用所有修正
+        actions_by_node: Dict[str, List[CorrectionAction]] = {}
         for action in correction_actions:
-            # 找到目标节点并应用修正
-            for node in corrected_workflow.nodes:
-                if node.node_id == action.target_node_id:
-                    # 应用参数调整
-                    if action.action_type == "parameter_adjust":
-                        node.parameters["corrected"] = True
-                        node.parameters["correction_applied"] = action.corrected_value
-                    break
+            actions_by_node.setdefault(action.target_node_id, []).append(action)
+        
+        for node in corrected_workflow.nodes:
+            for action in actions_by_node.get(node.node_id, ()):
+                # 应用参数调整
+                if action.action_type == "parameter_adjust":
+                    node.parameters["corrected"] = True
+                    node.parameters["correction_applied"] = action.corrected_value
         
         return corrected_workflow
     
@@ -813,20 +909,18 @@ class PowerAutoWorkflowEngine:
     
     async def _generate_enhanced_variants(self, enhanced_test_case: EnhancedTestCase) -> List[PowerAutoTestCase]:
         """生成增强的测试用例变体"""
-        variants = []
+        variant_tasks = []
         
-        # 基于增强建议生成变体
+        # 基于增强建议生成变体（各变体互相独立，并发生成）
         for suggestion in enhanced_test_case.enhancement_suggestions:
             if "错误场景" in suggestion:
                 # 生成错误场景变体
-                variant = await self._create_error_scenario_variant(enhanced_test_case.original_test_case)
-                variants.append(variant)
+                variant_tasks.append(self._create_error_scenario_variant(enhanced_test_case.original_test_case))
             elif "边界条件" in suggestion:
                 # 生成边界条件变体
-                variant = await self._create_boundary_condition_variant(enhanced_test_case.original_test_case)
-                variants.append(variant)
+                variant_tasks.append(self._create_boundary_condition_variant(enhanced_test_case.original_test_case))
         
-        return variants
+        return list(await asyncio.gather(*variant_tasks))
     
     async def _create_error_scenario_variant(self, original_test_case: PowerAutoTestCase) -> PowerAutoTestCase:
         """创建错误场景变体"""
@@ -897,6 +991,7 @@ async def main():
             print(f"质量分数: {enhanced_test_case.quality_score:.2f}")
             print(f"多样性指标: {enhanced_test_case.diversity_metrics}")
             print(f"增强建议数: {len(enhanced_test_case.enhancement_suggestions)}")
+            print(f"阶段耗时: {', '.join(f'{k} {v:.3f}s' for k, v in enhanced_test_case.stage_timings.items())}")
             
             # 为下一次迭代更新上下文
             context["previous_iteration"] = asdict(enhanced_test_case)
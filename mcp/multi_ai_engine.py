@@ -6,10 +6,19 @@
 import asyncio
 import logging
 import os
-from typing import Dict, Any, List, Optional
+import random
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable
 import aiohttp
 import json
 
+# 完成策略
+POLICY_ALL = "all"                      # 等待所有引擎（原行為）
+POLICY_FIRST_SUCCESS = "first_success"  # 第一個成功結果即返回
+POLICY_BEST_OF = "best_of"              # 截止時間內收集結果，選擇評分最高者
+POLICY_QUORUM = "quorum"                # 達到法定成功數即返回
+COMPLETION_POLICIES = (POLICY_ALL, POLICY_FIRST_SUCCESS, POLICY_BEST_OF, POLICY_QUORUM)
+
 class MultiAIEngine:
     """多AI引擎管理器"""
     
@@ -35,6 +44,23 @@ class MultiAIEngine:
             }
         }
         
+        # 引擎調用表，可替換為其他實現（如基準測試用的模擬引擎）
+        self.engine_callers: Dict[str, Callable[[str, Optional[Dict[str, Any]]], Awaitable[Dict[str, Any]]]] = {
+            "gemini": self._call_gemini,
+            "claude": self._call_claude,
+            "supermemory": self._call_supermemory
+        }
+        
+        # 每個引擎的延遲EWMA及平均偏差，用於決定對沖請求的發出時機
+        self.ewma_alpha = 0.2
+        self.hedge_deviation_factor = 2.0
+        self.latency_ewma: Dict[str, float] = {}
+        self.latency_deviation: Dict[str, float] = {}
+        self.engine_stats = {
+            name: {"calls": 0, "successes": 0, "hedged": 0, "hedge_wins": 0, "cancelled": 0}
+            for name in self.engine_callers
+        }
+        
         self.session = None
         self.logger.info("多AI引擎管理器初始化完成")
     
@@ -49,46 +75,189 @@ class MultiAIEngine:
             await self.session.close()
         self.logger.info("多AI引擎已停止")
     
-    async def analyze_content(self, content: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def analyze_content(self, content: str, context: Dict[str, Any] = None,
+                              policy: str = POLICY_ALL, deadline: Optional[float] = None,
+                              min_results: Optional[int] = None,
+                              hedge: bool = False) -> Dict[str, Any]:
         """
         多AI引擎并行分析内容
         
         Args:
             content: 要分析的内容
             context: 上下文信息
+            policy: 完成策略 (all / first_success / best_of / quorum)
+            deadline: 截止時間（秒），到期後取消未完成的調用
+            min_results: quorum 所需成功數（默認過半）；best_of 收到該數量成功結果即停止（默認全部）
+            hedge: 調用超過 EWMA + 2×偏差 仍未返回時，向同一引擎發出對沖請求
             
         Returns:
-            所有AI引擎的分析结果
+            各AI引擎的分析结果，以及策略、延遲和選中的引擎
         """
-        self.logger.info(f"开始多AI分析: {content[:50]}...")
+        if policy not in COMPLETION_POLICIES:
+            raise ValueError(f"未知的完成策略: {policy}，可選: {COMPLETION_POLICIES}")
         
-        # 并行调用所有AI引擎
-        tasks = []
+        self.logger.info(f"开始多AI分析 ({policy}): {content[:50]}...")
         
-        # Gemini分析
-        tasks.append(self._call_gemini(content, context))
+        engines = list(self.engine_callers.keys())
+        required = self._required_successes(policy, len(engines), min_results)
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        deadline_at = started + deadline if deadline is not None else None
         
-        # Claude分析
-        tasks.append(self._call_claude(content, context))
+        # 并行调用所有AI引擎
+        tasks = {
+            asyncio.ensure_future(self._call_engine(name, content, context, hedge)): name
+            for name in engines
+        }
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = set(tasks)
+        satisfied = False
         
-        # SuperMemory分析
-        tasks.append(self._call_supermemory(content, context))
+        try:
+            while pending:
+                timeout = None if deadline_at is None else max(0.0, deadline_at - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break  # 已到截止時間
+                
+                for task in done:
+                    name = tasks[task]
+                    try:
+                        results[name] = task.result()
+                    except Exception as e:
+                        results[name] = {"success": False, "error": str(e), "engine": name}
+                
+                if self._policy_satisfied(policy, results, required):
+                    satisfied = True
+                    break
+        finally:
+            # 策略已滿足或截止時間已到，取消其餘調用
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
         
-        # 等待所有结果
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        cancelled = [tasks[task] for task in pending]
+        for name in cancelled:
+            self.engine_stats[name]["cancelled"] += 1
+            results[name] = {"success": False, "error": "已取消", "cancelled": True, "engine": name}
+        
+        if policy == POLICY_ALL:
+            satisfied = not pending
         
         # 整理结果
         analysis_results = {
-            "gemini": results[0] if not isinstance(results[0], Exception) else {"error": str(results[0])},
-            "claude": results[1] if not isinstance(results[1], Exception) else {"error": str(results[1])},
-            "supermemory": results[2] if not isinstance(results[2], Exception) else {"error": str(results[2])},
-            "timestamp": asyncio.get_event_loop().time(),
-            "content": content[:100] + "..." if len(content) > 100 else content
+            **{name: results[name] for name in engines},
+            "timestamp": loop.time(),
+            "content": content[:100] + "..." if len(content) > 100 else content,
+            "selected_engine": self._select_engine(policy, results),
+            "policy": {
+                "name": policy,
+                "satisfied": satisfied,
+                "deadline": deadline,
+                "required_successes": required,
+                "elapsed": loop.time() - started,
+                "cancelled": cancelled,
+                "hedged": [name for name in engines if results[name].get("hedged")]
+            },
+            "latency": {name: results[name].get("latency") for name in engines}
         }
         
-        self.logger.info("多AI分析完成")
+        self.logger.info(f"多AI分析完成 ({policy}, {analysis_results['policy']['elapsed'] * 1000:.0f}ms)")
         return analysis_results
     
+    @staticmethod
+    def _required_successes(policy: str, engine_count: int, min_results: Optional[int]) -> int:
+        """策略所需的成功結果數"""
+        if policy == POLICY_FIRST_SUCCESS:
+            return 1
+        if policy == POLICY_QUORUM:
+            return min(engine_count, min_results or engine_count // 2 + 1)
+        if policy == POLICY_BEST_OF:
+            return min(engine_count, min_results or engine_count)
+        return engine_count
+    
+    @staticmethod
+    def _policy_satisfied(policy: str, results: Dict[str, Dict[str, Any]], required: int) -> bool:
+        """判斷策略是否已滿足（POLICY_ALL 總是等待全部完成）"""
+        if policy == POLICY_ALL:
+            return False
+        successes = sum(1 for result in results.values() if result.get("success"))
+        return successes >= required
+    
+    def _select_engine(self, policy: str, results: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        """選出返回給調用方的引擎結果"""
+        successful = {name: result for name, result in results.items() if result.get("success")}
+        if not successful:
+            return None
+        if policy == POLICY_FIRST_SUCCESS:
+            return min(successful, key=lambda name: successful[name].get("latency", float("inf")))
+        return max(successful, key=lambda name: self._score_result(name, successful[name]))
+    
+    def _hedge_delay(self, engine: str) -> Optional[float]:
+        """對沖請求的發出延遲：EWMA + k × 平均偏差（與TCP重傳超時的估算方式相同）"""
+        if engine not in self.latency_ewma:
+            return None
+        return self.latency_ewma[engine] + self.hedge_deviation_factor * self.latency_deviation.get(engine, 0.0)
+    
+    def _record_latency(self, engine: str, latency: float):
+        """更新引擎延遲的EWMA和平均偏差"""
+        if engine not in self.latency_ewma:
+            self.latency_ewma[engine] = latency
+            self.latency_deviation[engine] = latency / 2
+            return
+        error = latency - self.latency_ewma[engine]
+        self.latency_ewma[engine] += self.ewma_alpha * error
+        self.latency_deviation[engine] += self.ewma_alpha * (abs(error) - self.latency_deviation[engine])
+    
+    async def _call_engine(self, engine: str, content: str, context: Optional[Dict[str, Any]],
+                           hedge: bool) -> Dict[str, Any]:
+        """調用單個引擎，必要時發出對沖請求，返回最先成功的結果"""
+        caller = self.engine_callers[engine]
+        stats = self.engine_stats.setdefault(
+            engine, {"calls": 0, "successes": 0, "hedged": 0, "hedge_wins": 0, "cancelled": 0})
+        stats["calls"] += 1
+        started = time.perf_counter()
+        
+        primary = asyncio.ensure_future(caller(content, context))
+        attempts = {primary}
+        hedge_task = None
+        result: Dict[str, Any] = {"success": False, "error": "無結果", "engine": engine}
+        
+        try:
+            hedge_delay = self._hedge_delay(engine) if hedge else None
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=hedge_delay)
+                if not done:
+                    hedge_task = asyncio.ensure_future(caller(content, context))
+                    attempts.add(hedge_task)
+                    stats["hedged"] += 1
+            
+            while attempts and not result.get("success"):
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        result = {"success": False, "error": str(e), "engine": engine}
+                    if result.get("success"):
+                        if task is hedge_task:
+                            stats["hedge_wins"] += 1
+                        break
+        finally:
+            # 取消較慢的一份請求
+            for task in (primary, hedge_task):
+                if task is not None and not task.done():
+                    task.cancel()
+        
+        latency = time.perf_counter() - started
+        if result.get("success"):
+            stats["successes"] += 1
+            self._record_latency(engine, latency)
+        
+        return {**result, "latency": latency, "hedged": hedge_task is not None}
+    
     async def _call_gemini(self, content: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """调用Gemini API"""
         try:
@@ -262,26 +431,9 @@ class MultiAIEngine:
         comparison_details = {}
         
         for engine, result in successful_results.items():
-            # 简单评分逻辑
-            score = 0
+            score = self._score_result(engine, result)
             text = result.get("result", "")
             
-            # 长度评分
-            if 50 <= len(text) <= 500:
-                score += 30
-            
-            # 内容质量评分（简单关键词检测）
-            quality_keywords = ["建议", "分析", "优化", "改进", "解决", "方案"]
-            score += sum(10 for keyword in quality_keywords if keyword in text)
-            
-            # 特殊引擎加分
-            if engine == "supermemory":
-                score += 20  # SuperMemory有记忆优势
-            elif engine == "claude":
-                score += 15  # Claude分析能力强
-            elif engine == "gemini":
-                score += 10  # Gemini速度快
-            
             comparison_details[engine] = {
                 "score": score,
                 "length": len(text),
@@ -300,11 +452,101 @@ class MultiAIEngine:
             "all_results": successful_results
         }
     
+    @staticmethod
+    def _score_result(engine: str, result: Dict[str, Any]) -> int:
+        """简单评分逻辑"""
+        score = 0
+        text = result.get("result", "")
+        
+        # 长度评分
+        if 50 <= len(text) <= 500:
+            score += 30
+        
+        # 内容质量评分（简单关键词检测）
+        quality_keywords = ["建议", "分析", "优化", "改进", "解决", "方案"]
+        score += sum(10 for keyword in quality_keywords if keyword in text)
+        
+        # 特殊引擎加分
+        if engine == "supermemory":
+            score += 20  # SuperMemory有记忆优势
+        elif engine == "claude":
+            score += 15  # Claude分析能力强
+        elif engine == "gemini":
+            score += 10  # Gemini速度快
+        
+        return score
+    
     def get_status(self) -> Dict[str, Any]:
         """获取状态"""
         return {
-            "engines": list(self.api_configs.keys()),
+            "engines": list(self.engine_callers.keys()),
             "session_active": self.session is not None,
-            "available": True
+            "available": True,
+            "latency_ewma": dict(self.latency_ewma),
+            "engine_stats": self.engine_stats
         }
 
+class FakeAIEngine:
+    """基準測試用的模擬引擎，延遲服從對數正態分佈"""
+    
+    def __init__(self, name: str, median_latency: float, sigma: float = 0.5,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.name = name
+        self.median_latency = median_latency
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+    
+    async def __call__(self, content: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        await asyncio.sleep(self.median_latency * self.random.lognormvariate(0, self.sigma))
+        if self.random.random() < self.failure_rate:
+            return {"success": False, "error": "模擬失敗", "engine": self.name}
+        return {"success": True, "result": f"{self.name} 分析建议: {content[:20]}", "engine": self.name}
+
+async def benchmark_completion_policies(runs: int = 50, deadline: float = 0.3) -> Dict[str, Any]:
+    """用模擬引擎對比各完成策略的端到端延遲和成功率"""
+    
+    def make_engine() -> MultiAIEngine:
+        engine = MultiAIEngine()
+        engine.engine_callers = {
+            "gemini": FakeAIEngine("gemini", 0.08, sigma=0.4, failure_rate=0.05, seed=1),
+            "claude": FakeAIEngine("claude", 0.15, sigma=0.8, failure_rate=0.02, seed=2),
+            "supermemory": FakeAIEngine("supermemory", 0.25, sigma=1.0, failure_rate=0.10, seed=3)
+        }
+        return engine
+    
+    scenarios = [
+        ("all", {"policy": POLICY_ALL}),
+        ("first_success", {"policy": POLICY_FIRST_SUCCESS}),
+        ("first_success+hedge", {"policy": POLICY_FIRST_SUCCESS, "hedge": True}),
+        ("best_of_deadline", {"policy": POLICY_BEST_OF, "deadline": deadline}),
+        ("quorum", {"policy": POLICY_QUORUM}),
+        ("quorum+hedge", {"policy": POLICY_QUORUM, "hedge": True})
+    ]
+    
+    report = {}
+    for label, options in scenarios:
+        engine = make_engine()
+        latencies, successes = [], 0
+        for i in range(runs):
+            result = await engine.analyze_content(f"基準測試內容 {i}", **options)
+            latencies.append(result["policy"]["elapsed"])
+            successes += result["selected_engine"] is not None
+        latencies.sort()
+        report[label] = {
+            "mean_ms": sum(latencies) / runs * 1000,
+            "p50_ms": latencies[runs // 2] * 1000,
+            "p95_ms": latencies[min(runs - 1, int(runs * 0.95))] * 1000,
+            "success_rate": successes / runs,
+            "hedged_calls": sum(stats["hedged"] for stats in engine.engine_stats.values())
+        }
+    
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+if __name__ == "__main__":
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        asyncio.run(benchmark_completion_policies())
+
@@ -8,6 +8,9 @@ Date: 2025-06-11
 """
 
 import asyncio
+import fnmatch
+import hashlib
+import heapq
 import json
 import time
 import logging
@@ -15,14 +18,25 @@ import threading
 import platform
 import subprocess
 import os
-from typing import Dict, List, Any, Optional, Callable
-from dataclasses import dataclass, asdict
+import shutil
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Callable, Iterable, Tuple
+from dataclasses import dataclass, asdict, field
 from datetime import datetime
 from pathlib import Path
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 import uuid
 
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,6 +52,7 @@ class FileEvent:
     file_size: int = 0
     file_content: Optional[str] = None
     source_plugin: Optional[str] = None
+    coalesced_count: int = 0  # 防抖窗口內被合併的事件數
 
 @dataclass
 class WSLBridgeConfig:
@@ -48,45 +63,600 @@ class WSLBridgeConfig:
     sync_interval: float = 1.0
     file_patterns: List[str] = None
 
+# rsync 式增量同步：目標端按塊計算弱校驗和強校驗，源端用滾動弱校驗尋找可複用的塊。
+# 弱校驗取塊內字節和，可以在C層用 sum() 計算並 O(1) 滾動；弱校驗的偶然碰撞由強校驗排除。
+def _strong_checksum(block: bytes) -> bytes:
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+def compute_block_signatures(data: bytes, block_size: int) -> Dict[int, Dict[bytes, int]]:
+    """計算目標文件的塊簽名：弱校驗 -> {強校驗: 塊序號}"""
+    signatures: Dict[int, Dict[bytes, int]] = {}
+    for index, offset in enumerate(range(0, len(data), block_size)):
+        block = data[offset:offset + block_size]
+        signatures.setdefault(sum(block), {}).setdefault(_strong_checksum(block), index)
+    return signatures
+
+def compute_delta(data: bytes, signatures: Dict[int, Dict[bytes, int]], block_size: int,
+                  max_literal_ratio: float = 0.5) -> Optional[List[Tuple[str, Any]]]:
+    """計算源文件相對目標塊簽名的增量指令
+    
+    返回 ('block', 塊序號) 和 ('data', 字節) 組成的指令列表；
+    需要發送的字面數據超過 max_literal_ratio 時返回 None，由調用方改為整檔複製。
+    """
+    operations: List[Tuple[str, Any]] = []
+    literal_limit = int(len(data) * max_literal_ratio)
+    literal_bytes = 0
+    literal_start = 0
+    position = 0
+    length = len(data)
+    weak = None
+    
+    while position + block_size <= length:
+        if weak is None:
+            weak = sum(data[position:position + block_size])
+        candidates = signatures.get(weak)
+        if candidates:
+            index = candidates.get(_strong_checksum(data[position:position + block_size]))
+            if index is not None:
+                if literal_start < position:
+                    operations.append(('data', data[literal_start:position]))
+                operations.append(('block', index))
+                position += block_size
+                literal_start = position
+                weak = None
+                continue
+        
+        # 未命中：窗口右移一個字節
+        literal_bytes += 1
+        if literal_bytes > literal_limit:
+            return None
+        if position + block_size < length:
+            weak += data[position + block_size] - data[position]
+        position += 1
+    
+    # 尾部不足一塊的數據：與目標最後一個短塊相同時也可複用
+    remainder = data[position:]
+    index = None
+    if remainder:
+        index = signatures.get(sum(remainder), {}).get(_strong_checksum(remainder))
+    if index is not None:
+        if literal_start < position:
+            operations.append(('data', data[literal_start:position]))
+        operations.append(('block', index))
+    elif literal_start < length:
+        if literal_bytes + len(remainder) > literal_limit:
+            return None
+        operations.append(('data', data[literal_start:]))
+    return operations
+
+class SyncTransport(ABC):
+    """文件同步傳輸接口
+    
+    批量方法一次處理一批路徑，便於命令行傳輸把一批操作合併成一個子進程；
+    supports_delta 為 True 的傳輸還需要實現塊簽名讀取和增量寫入。
+    """
+    
+    supports_delta = False
+    
+    @abstractmethod
+    async def ensure_directories(self, directories: List[str]):
+        """確保目標目錄存在"""
+        pass
+    
+    @abstractmethod
+    async def checksums(self, paths: List[str]) -> Dict[str, str]:
+        """批量獲取目標文件的 sha256，不存在的文件不出現在結果中"""
+        pass
+    
+    @abstractmethod
+    async def copy_files(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        """整檔複製 (源路徑, 目標路徑)，返回失敗的目標路徑"""
+        pass
+    
+    @abstractmethod
+    async def remove_files(self, paths: List[str]):
+        """刪除目標文件"""
+        pass
+    
+    async def block_signatures(self, path: str, block_size: int) -> Optional[Dict[int, Dict[bytes, int]]]:
+        raise NotImplementedError("該傳輸不支持增量同步")
+    
+    async def apply_delta(self, path: str, operations: List[Tuple[str, Any]], block_size: int):
+        raise NotImplementedError("該傳輸不支持增量同步")
+
+def _file_sha256(path: str) -> Optional[str]:
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+def _replace_file(path: str, write: Callable[[Any], None]):
+    """寫入臨時文件後原子替換，避免讀到寫了一半的目標文件"""
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.sync"
+    try:
+        with open(temp_path, 'wb') as f:
+            write(f)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+class LocalDirectoryTransport(SyncTransport):
+    """本地目錄到目錄的傳輸，支持增量同步"""
+    
+    supports_delta = True
+    
+    def _checksums(self, paths: List[str]) -> Dict[str, str]:
+        result = {}
+        for path in paths:
+            checksum = _file_sha256(path)
+            if checksum is not None:
+                result[path] = checksum
+        return result
+    
+    def _copy_files(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        failed = []
+        for source, destination in pairs:
+            try:
+                with open(source, 'rb') as src:
+                    _replace_file(destination, lambda dst: shutil.copyfileobj(src, dst, 1024 * 1024))
+                shutil.copystat(source, destination)
+            except OSError as e:
+                logger.error(f"文件複製失敗: {source} -> {destination}: {e}")
+                failed.append(destination)
+        return failed
+    
+    def _remove_files(self, paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def _block_signatures(self, path: str, block_size: int) -> Optional[Dict[int, Dict[bytes, int]]]:
+        try:
+            with open(path, 'rb') as f:
+                return compute_block_signatures(f.read(), block_size)
+        except OSError:
+            return None
+    
+    def _apply_delta(self, path: str, operations: List[Tuple[str, Any]], block_size: int):
+        with open(path, 'rb') as f:
+            basis = f.read()
+        
+        def write(dst):
+            for kind, value in operations:
+                if kind == 'block':
+                    dst.write(basis[value * block_size:(value + 1) * block_size])
+                else:
+                    dst.write(value)
+        
+        _replace_file(path, write)
+    
+    async def ensure_directories(self, directories: List[str]):
+        await asyncio.to_thread(lambda: [os.makedirs(d, exist_ok=True) for d in directories])
+    
+    async def checksums(self, paths: List[str]) -> Dict[str, str]:
+        return await asyncio.to_thread(self._checksums, paths)
+    
+    async def copy_files(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        return await asyncio.to_thread(self._copy_files, pairs)
+    
+    async def remove_files(self, paths: List[str]):
+        await asyncio.to_thread(self._remove_files, paths)
+    
+    async def block_signatures(self, path: str, block_size: int) -> Optional[Dict[int, Dict[bytes, int]]]:
+        return await asyncio.to_thread(self._block_signatures, path, block_size)
+    
+    async def apply_delta(self, path: str, operations: List[Tuple[str, Any]], block_size: int):
+        await asyncio.to_thread(self._apply_delta, path, operations, block_size)
+
+class WSLCommandTransport(SyncTransport):
+    """通過 wsl 命令同步到WSL，每批操作只啟動一個異步子進程
+    
+    讀取WSL端的塊簽名需要整檔回傳，因此只做哈希跳過，不做增量。
+    """
+    
+    # 逐對執行 cp，失敗的目標路徑輸出到 stdout
+    _COPY_SCRIPT = 'while [ $# -gt 1 ]; do cp -- "$1" "$2" || echo "$2"; shift 2; done'
+    
+    def __init__(self, path_converter: Callable[[str], str], timeout: float = 60.0):
+        self.path_converter = path_converter
+        self.timeout = timeout
+    
+    async def _run(self, *args: str) -> Tuple[int, str, str]:
+        process = await asyncio.create_subprocess_exec(
+            'wsl', '-e', *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        return process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+    
+    async def ensure_directories(self, directories: List[str]):
+        if directories:
+            returncode, _, stderr = await self._run('mkdir', '-p', '--', *directories)
+            if returncode != 0:
+                logger.warning(f"WSL目錄創建失敗: {stderr}")
+    
+    async def checksums(self, paths: List[str]) -> Dict[str, str]:
+        if not paths:
+            return {}
+        # 缺失的文件只在 stderr 報錯，已存在文件的結果照常輸出
+        _, stdout, _ = await self._run('sha256sum', '--', *paths)
+        result = {}
+        for line in stdout.splitlines():
+            checksum, _, path = line.partition('  ')
+            if path:
+                result[path] = checksum
+        return result
+    
+    async def copy_files(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        args = [arg for source, destination in pairs for arg in (self.path_converter(source), destination)]
+        try:
+            returncode, stdout, stderr = await self._run('sh', '-c', self._COPY_SCRIPT, 'sh', *args)
+        except Exception as e:
+            logger.error(f"WSL文件複製異常: {e}")
+            return [destination for _, destination in pairs]
+        if stderr:
+            logger.error(f"WSL文件複製失敗: {stderr}")
+        return [line for line in stdout.splitlines() if line]
+    
+    async def remove_files(self, paths: List[str]):
+        if paths:
+            await self._run('rm', '-f', '--', *paths)
+
+@dataclass
+class _BridgeState:
+    """單個橋接的待同步變更和已同步文件狀態"""
+    config: WSLBridgeConfig
+    transport: SyncTransport
+    pending_changes: set = field(default_factory=set)
+    pending_deletes: set = field(default_factory=set)
+    synced: Dict[str, Tuple[int, int]] = field(default_factory=dict)  # 源路徑 -> (mtime_ns, size)
+    flush_handle: Any = None
+    flush_task: Any = None  # 正在運行的自動同步任務
+    failures: int = 0       # 連續失敗的同步次數，用於自動同步退避
+
+class FileSyncEngine:
+    """按橋接批量同步文件
+    
+    變更先按橋接累積 sync_interval 秒再一起同步；每批先跳過 mtime/大小未變的文件，
+    再批量比較目標端哈希跳過內容相同的文件，剩下的文件在支持增量的傳輸上只發送變化的塊，
+    否則整檔複製。批內的哈希計算和傳輸按 max_parallel 限制並發。
+    同步失敗的變更會放回待同步集合，自動同步按指數退避重試。
+    """
+    
+    MAX_RETRY_DELAY = 60.0
+    
+    def __init__(self, max_parallel: int = 4, batch_size: int = 64, block_size: int = 4096,
+                 max_delta_size: int = 16 * 1024 * 1024):
+        self.max_parallel = max_parallel
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.max_delta_size = max_delta_size
+        self.bridges: Dict[str, _BridgeState] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            "batches": 0,
+            "files_considered": 0,
+            "skipped_pattern": 0,
+            "skipped_unchanged": 0,
+            "skipped_identical": 0,
+            "delta_synced": 0,
+            "full_copied": 0,
+            "deleted": 0,
+            "failed": 0,
+            "bytes_total": 0,
+            "bytes_sent": 0
+        }
+    
+    def register_bridge(self, name: str, config: WSLBridgeConfig, transport: SyncTransport):
+        self.bridges[name] = _BridgeState(config=config, transport=transport)
+    
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """綁定運行自動同步的事件循環"""
+        self._loop = loop
+    
+    def matches_patterns(self, config: WSLBridgeConfig, source_path: str) -> bool:
+        if not config.file_patterns:
+            return True
+        name = os.path.basename(source_path)
+        return any(fnmatch.fnmatch(name, pattern) for pattern in config.file_patterns)
+    
+    def destination_path(self, config: WSLBridgeConfig, source_path: str) -> Optional[str]:
+        """把源路徑映射到橋接目標目錄下，不在源目錄內時返回 None"""
+        root = os.path.normpath(config.windows_path)
+        source = os.path.normpath(source_path)
+        if os.path.commonpath([root, source]) != root:
+            return None
+        relative = os.path.relpath(source, root).replace('\\', '/')
+        return config.wsl_path.rstrip('/') + '/' + relative
+    
+    def bridge_for_path(self, source_path: str) -> Optional[str]:
+        for name, state in self.bridges.items():
+            if self.destination_path(state.config, source_path) is not None:
+                return name
+        return None
+    
+    def queue_change(self, name: str, source_path: str, deleted: bool = False):
+        """記錄一個待同步變更（可在任意線程調用），auto_sync 的橋接會在 sync_interval 後自動同步"""
+        state = self.bridges[name]
+        with self._lock:
+            if deleted:
+                state.pending_changes.discard(source_path)
+                state.pending_deletes.add(source_path)
+            else:
+                state.pending_deletes.discard(source_path)
+                state.pending_changes.add(source_path)
+        self._request_flush(name)
+    
+    def _requeue(self, state: _BridgeState, changes: Iterable[str], deletes: Iterable[str] = ()):
+        """把未同步成功的變更放回待同步集合；期間記錄的新變更優先"""
+        with self._lock:
+            state.pending_changes.update(path for path in changes if path not in state.pending_deletes)
+            state.pending_deletes.update(path for path in deletes if path not in state.pending_changes)
+    
+    def _request_flush(self, name: str):
+        """auto_sync 的橋接有待同步變更且未排期時，安排一次自動同步"""
+        state = self.bridges[name]
+        with self._lock:
+            schedule = (state.config.auto_sync and state.flush_handle is None and self._loop is not None
+                        and bool(state.pending_changes or state.pending_deletes))
+            if schedule:
+                state.flush_handle = True
+        if schedule:
+            self._loop.call_soon_threadsafe(self._schedule_flush, name)
+    
+    def _schedule_flush(self, name: str):
+        state = self.bridges[name]
+        delay = state.config.sync_interval
+        if state.failures:
+            delay = min(self.MAX_RETRY_DELAY, max(delay, 0.1) * 2 ** state.failures)
+        state.flush_handle = self._loop.call_later(delay, self._start_flush, name)
+    
+    def _start_flush(self, name: str):
+        state = self.bridges[name]
+        state.flush_task = self._loop.create_task(self._auto_flush(name))
+    
+    async def _auto_flush(self, name: str):
+        """自動同步任務：異常在這裡記錄，失敗的變更已由 sync_pending 重新排隊"""
+        state = self.bridges[name]
+        try:
+            await self.sync_pending(name)
+        except Exception as e:
+            logger.error(f"橋接自動同步失敗: {name} - {e}（{state.failures} 次連續失敗，稍後重試）")
+        finally:
+            state.flush_task = None
+    
+    async def sync_pending(self, name: str) -> Dict[str, Any]:
+        """同步橋接上累積的所有變更；失敗時變更放回待同步集合"""
+        state = self.bridges[name]
+        with self._lock:
+            changes, deletes = state.pending_changes, state.pending_deletes
+            state.pending_changes, state.pending_deletes = set(), set()
+            state.flush_handle = None
+        try:
+            batch = await self.sync_batch(name, sorted(changes), sorted(deletes))
+        except Exception:
+            self._requeue(state, changes, deletes)
+            state.failures += 1
+            self._request_flush(name)
+            raise
+        state.failures = state.failures + 1 if batch["failed"] else 0
+        self._request_flush(name)
+        return batch
+    
+    async def sync_batch(self, name: str, source_paths: List[str],
+                         deleted_paths: List[str] = ()) -> Dict[str, Any]:
+        """同步一批源文件到橋接目標，返回本批統計"""
+        state = self.bridges[name]
+        config, transport = state.config, state.transport
+        batch = {key: 0 for key in self.stats}
+        batch["batches"] = 1
+        
+        # 過濾文件模式，並跳過自上次同步以來 mtime 和大小都沒變的文件
+        candidates: Dict[str, Tuple[str, Tuple[int, int]]] = {}
+        for source in source_paths:
+            batch["files_considered"] += 1
+            destination = self.destination_path(config, source)
+            if destination is None or not self.matches_patterns(config, source):
+                batch["skipped_pattern"] += 1
+                continue
+            try:
+                stat = os.stat(source)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if state.synced.get(source) == signature:
+                batch["skipped_unchanged"] += 1
+                continue
+            candidates[source] = (destination, signature)
+            batch["bytes_total"] += stat.st_size
+        
+        removals = [self.destination_path(config, source) for source in deleted_paths
+                    if self.matches_patterns(config, source)]
+        removals = [path for path in removals if path is not None]
+        if removals:
+            await transport.remove_files(removals)
+            batch["deleted"] += len(removals)
+            for source in deleted_paths:
+                state.synced.pop(source, None)
+        
+        if candidates:
+            await transport.ensure_directories(sorted({os.path.dirname(d) for d, _ in candidates.values()}))
+            destination_checksums = {}
+            destinations = [d for d, _ in candidates.values()]
+            for start in range(0, len(destinations), self.batch_size):
+                destination_checksums.update(await transport.checksums(destinations[start:start + self.batch_size]))
+            
+            semaphore = asyncio.Semaphore(self.max_parallel)
+            copies: List[Tuple[str, str]] = []
+            
+            async def sync_one(source: str, destination: str, signature: Tuple[int, int]):
+                async with semaphore:
+                    checksum = await asyncio.to_thread(_file_sha256, source)
+                    if checksum is None:
+                        return
+                    if destination_checksums.get(destination) == checksum:
+                        batch["skipped_identical"] += 1
+                        state.synced[source] = signature
+                        return
+                    if (transport.supports_delta and destination in destination_checksums
+                            and signature[1] <= self.max_delta_size):
+                        sent = await self._sync_delta(transport, source, destination)
+                        if sent is not None:
+                            batch["delta_synced"] += 1
+                            batch["bytes_sent"] += sent
+                            state.synced[source] = signature
+                            return
+                    copies.append((source, destination))
+            
+            await asyncio.gather(*(sync_one(source, destination, signature)
+                                   for source, (destination, signature) in candidates.items()))
+            
+            # 整檔複製按 batch_size 分批，批之間按 max_parallel 並行
+            failed_sources: List[str] = []
+            
+            async def copy_chunk(chunk: List[Tuple[str, str]]):
+                async with semaphore:
+                    failed = set(await transport.copy_files(chunk))
+                for source, destination in chunk:
+                    if destination in failed:
+                        batch["failed"] += 1
+                        failed_sources.append(source)
+                    else:
+                        batch["full_copied"] += 1
+                        batch["bytes_sent"] += candidates[source][1][1]
+                        state.synced[source] = candidates[source][1]
+            
+            await asyncio.gather(*(copy_chunk(copies[start:start + self.batch_size])
+                                   for start in range(0, len(copies), self.batch_size)))
+            # 複製失敗的文件重新排隊，下次同步再試
+            self._requeue(state, failed_sources)
+        
+        for key, value in batch.items():
+            self.stats[key] += value
+        logger.info(f"橋接同步完成: {name} - 複製 {batch['full_copied']}，增量 {batch['delta_synced']}，"
+                    f"跳過 {batch['skipped_unchanged'] + batch['skipped_identical']}")
+        return batch
+    
+    async def _sync_delta(self, transport: SyncTransport, source: str, destination: str) -> Optional[int]:
+        """增量同步單個文件，返回發送的字面字節數；增量不划算時返回 None"""
+        signatures = await transport.block_signatures(destination, self.block_size)
+        if not signatures:
+            return None
+        
+        def build_delta():
+            with open(source, 'rb') as f:
+                data = f.read()
+            return compute_delta(data, signatures, self.block_size)
+        
+        operations = await asyncio.to_thread(build_delta)
+        if operations is None:
+            return None
+        await transport.apply_delta(destination, operations, self.block_size)
+        return sum(len(value) for kind, value in operations if kind == 'data')
+    
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["pending"] = {name: len(state.pending_changes) + len(state.pending_deletes)
+                            for name, state in self.bridges.items()}
+        return stats
+
+@dataclass
+class _CachedContent:
+    """按路徑緩存的文件內容，mtime 和大小不變時視為有效"""
+    mtime_ns: int
+    size: int
+    content: str
+
 class FileSystemEventHandler(FileSystemEventHandler):
-    """文件系統事件處理器"""
+    """文件系統事件處理器
+    
+    運行在 watchdog 觀察者線程上，只構造事件交給引擎排隊，不做任何文件IO；
+    文件大小在工作線程處理事件時再讀取。
+    """
     
     def __init__(self, callback: Callable[[FileEvent], None]):
         super().__init__()
         self.callback = callback
         
+    def _emit(self, event_type: str, path: str):
+        self.callback(FileEvent(
+            event_id=str(uuid.uuid4()),
+            timestamp=time.time(),
+            event_type=event_type,
+            file_path=path
+        ))
+    
     def on_created(self, event):
         if not event.is_directory:
-            file_event = FileEvent(
-                event_id=str(uuid.uuid4()),
-                timestamp=time.time(),
-                event_type='created',
-                file_path=event.src_path,
-                file_size=os.path.getsize(event.src_path) if os.path.exists(event.src_path) else 0
-            )
-            self.callback(file_event)
+            self._emit('created', event.src_path)
     
     def on_modified(self, event):
         if not event.is_directory:
-            file_event = FileEvent(
-                event_id=str(uuid.uuid4()),
-                timestamp=time.time(),
-                event_type='modified',
-                file_path=event.src_path,
-                file_size=os.path.getsize(event.src_path) if os.path.exists(event.src_path) else 0
-            )
-            self.callback(file_event)
+            self._emit('modified', event.src_path)
+    
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self._emit('deleted', event.src_path)
 
 class FileAcquisitionEngine:
     """文件獲取引擎 - 解決兜底自動化流程的文件獲取挑戰"""
     
-    def __init__(self):
+    def __init__(self, debounce_interval: float = 0.2, max_debounce_delay: float = 1.0,
+                 max_workers: int = 4, cache_max_bytes: int = 32 * 1024 * 1024,
+                 max_recent_events: int = 1000, eager_content: bool = False):
         self.observers = {}
         self.wsl_bridges = {}
-        self.file_cache = {}
         self.event_callbacks = []
         self.is_running = False
         self.platform_info = self._detect_platform()
+        self.sync_engine = FileSyncEngine()
+        self._wsl_transport = WSLCommandTransport(self._convert_to_wsl_path)
+        
+        # 事件管道：按路徑防抖合併，在有界工作線程池上處理
+        self.debounce_interval = debounce_interval
+        self.max_debounce_delay = max_debounce_delay
+        self.max_workers = max_workers
+        self.eager_content = eager_content
+        self._pending_events: Dict[str, FileEvent] = {}
+        self._pending_deadlines: Dict[str, Tuple[float, float]] = {}  # 路徑 -> (首個事件時間, 到期時間)
+        self._deadline_heap: List[Tuple[float, str]] = []
+        self._in_progress = set()
+        self._pipeline_condition = threading.Condition()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._file_signatures: Dict[str, Tuple[int, int]] = {}
+        self.recent_events = deque(maxlen=max_recent_events)
+        
+        # 按路徑的內容LRU緩存，按字節數限制容量，內容在首次訪問時加載
+        self.cache_max_bytes = cache_max_bytes
+        self.file_cache: "OrderedDict[str, _CachedContent]" = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        
+        self.pipeline_stats = {
+            "events_received": 0,
+            "events_coalesced": 0,
+            "events_processed": 0,
+            "unchanged_skipped": 0,
+            "content_reads": 0,
+            "cache_hits": 0,
+            "cache_evictions": 0,
+            "callback_errors": 0
+        }
         
         # 初始化文件監聽目錄
         self.watch_directories = {
@@ -125,8 +695,14 @@ class FileAcquisitionEngine:
     
     async def start_monitoring(self) -> bool:
         """啟動文件監聽"""
+        if not WATCHDOG_AVAILABLE:
+            logger.error("watchdog 未安裝，無法啟動文件監聽")
+            return False
+        
         try:
             self.is_running = True
+            self.sync_engine.bind_loop(asyncio.get_running_loop())
+            self.start_event_pipeline()
             
             # 創建監聽目錄
             for name, path in self.watch_directories.items():
@@ -162,41 +738,217 @@ class FileAcquisitionEngine:
             logger.info(f"停止監聽: {name}")
         
         self.observers.clear()
+        self.stop_event_pipeline()
         logger.info("文件監聽服務已停止")
     
+    def start_event_pipeline(self):
+        """啟動防抖調度線程和工作線程池"""
+        with self._pipeline_condition:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="FileEventWorker")
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="FileEventDispatcher",
+                                                daemon=True)
+            self._dispatcher.start()
+    
+    def stop_event_pipeline(self, flush: bool = True, timeout: float = 5.0):
+        """停止事件管道，flush 為 True 時先處理完所有待處理事件"""
+        if flush:
+            self.flush_events(timeout)
+        with self._pipeline_condition:
+            dispatcher, executor = self._dispatcher, self._executor
+            self._dispatcher = None
+            self._executor = None
+            self._pipeline_condition.notify_all()
+        if dispatcher is not None:
+            dispatcher.join(timeout)
+        if executor is not None:
+            executor.shutdown(wait=True)
+    
+    def flush_events(self, timeout: float = 5.0) -> bool:
+        """立即處理所有待處理事件並等待完成，返回是否在超時前完成"""
+        deadline = time.monotonic() + timeout
+        with self._pipeline_condition:
+            now = time.monotonic()
+            for path, (first_seen, _) in self._pending_deadlines.items():
+                self._pending_deadlines[path] = (first_seen, now)
+                heapq.heappush(self._deadline_heap, (now, path))
+            self._pipeline_condition.notify_all()
+            while self._pending_events or self._in_progress:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._pipeline_condition.wait(remaining)
+        return True
+    
     def _handle_file_event(self, file_event: FileEvent):
-        """處理文件事件"""
+        """接收文件事件（在觀察者線程上運行）
+        
+        只把事件按路徑合併進待處理表：防抖窗口內的後續事件推遲到期時間，
+        但從首個事件起最多推遲 max_debounce_delay，持續寫入的文件也會被處理。
+        """
+        if self._dispatcher is None:
+            self.start_event_pipeline()
+        
+        path = file_event.file_path
+        now = time.monotonic()
+        with self._pipeline_condition:
+            self.pipeline_stats["events_received"] += 1
+            pending = self._pending_events.get(path)
+            if pending is None:
+                self._pending_events[path] = file_event
+                first_seen = now
+            else:
+                # 新建後的修改仍視為新建
+                if not (pending.event_type == 'created' and file_event.event_type == 'modified'):
+                    pending.event_type = file_event.event_type
+                pending.timestamp = file_event.timestamp
+                pending.coalesced_count += 1
+                self.pipeline_stats["events_coalesced"] += 1
+                first_seen = self._pending_deadlines[path][0]
+            
+            due = min(now + self.debounce_interval, first_seen + self.max_debounce_delay)
+            self._pending_deadlines[path] = (first_seen, due)
+            heapq.heappush(self._deadline_heap, (due, path))
+            if self._deadline_heap[0][1] == path:
+                self._pipeline_condition.notify()
+    
+    def _dispatch_loop(self):
+        """把到期的事件提交到工作線程池，同一路徑同時只有一個事件在處理"""
+        condition = self._pipeline_condition
+        with condition:
+            while self._dispatcher is threading.current_thread():
+                now = time.monotonic()
+                while self._deadline_heap and self._deadline_heap[0][0] <= now:
+                    due, path = heapq.heappop(self._deadline_heap)
+                    deadline = self._pending_deadlines.get(path)
+                    # 過期的堆項（已被推遲或已處理）直接丟棄；處理中的路徑等完成後重新調度
+                    if deadline is None or deadline[1] != due or path in self._in_progress:
+                        continue
+                    file_event = self._pending_events.pop(path)
+                    del self._pending_deadlines[path]
+                    self._in_progress.add(path)
+                    self._executor.submit(self._process_file_event, file_event)
+                
+                timeout = self._deadline_heap[0][0] - now if self._deadline_heap else None
+                condition.wait(timeout)
+    
+    def _process_file_event(self, file_event: FileEvent):
+        """處理合併後的文件事件（在工作線程上運行）"""
+        path = file_event.file_path
         try:
-            # 讀取文件內容
-            if os.path.exists(file_event.file_path):
-                try:
-                    with open(file_event.file_path, 'r', encoding='utf-8') as f:
-                        file_event.file_content = f.read()
-                except UnicodeDecodeError:
-                    # 如果是二進制文件，記錄文件類型
-                    file_event.file_content = f"[Binary file: {os.path.splitext(file_event.file_path)[1]}]"
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            
+            if stat is None or file_event.event_type == 'deleted':
+                file_event.event_type = 'deleted' if stat is None else file_event.event_type
+                self._file_signatures.pop(path, None)
+                self._evict_content(path)
+            else:
+                signature = (stat.st_mtime_ns, stat.st_size)
+                # mtime 和大小都沒變的事件是重複通知，不再讀取內容和觸發回調
+                if self._file_signatures.get(path) == signature:
+                    self.pipeline_stats["unchanged_skipped"] += 1
+                    return
+                self._file_signatures[path] = signature
+                file_event.file_size = stat.st_size
+                if self.eager_content:
+                    file_event.file_content = self.get_file_content(path)
             
             # 如果有WSL橋接，轉換路徑
             if self.platform_info['has_wsl']:
-                file_event.wsl_path = self._convert_to_wsl_path(file_event.file_path)
+                file_event.wsl_path = self._convert_to_wsl_path(path)
             
             # 檢測來源插件
-            file_event.source_plugin = self._detect_source_plugin(file_event.file_path)
+            file_event.source_plugin = self._detect_source_plugin(path)
+            
+            self.recent_events.append(file_event)
+            self.pipeline_stats["events_processed"] += 1
             
-            # 緩存文件事件
-            self.file_cache[file_event.event_id] = file_event
+            # 交給同步引擎按橋接批量同步
+            bridge = self.sync_engine.bridge_for_path(path)
+            if bridge is not None:
+                self.sync_engine.queue_change(bridge, path, deleted=file_event.event_type == 'deleted')
             
             # 觸發回調
             for callback in self.event_callbacks:
                 try:
                     callback(file_event)
                 except Exception as e:
+                    self.pipeline_stats["callback_errors"] += 1
                     logger.error(f"文件事件回調失敗: {e}")
             
-            logger.info(f"文件事件處理完成: {file_event.event_type} - {file_event.file_path}")
+            logger.debug(f"文件事件處理完成: {file_event.event_type} - {path} "
+                         f"(合併 {file_event.coalesced_count} 個事件)")
             
         except Exception as e:
             logger.error(f"文件事件處理失敗: {e}")
+        finally:
+            with self._pipeline_condition:
+                self._in_progress.discard(path)
+                # 處理期間又有新事件：按原到期時間重新入堆
+                deadline = self._pending_deadlines.get(path)
+                if deadline is not None:
+                    heapq.heappush(self._deadline_heap, (deadline[1], path))
+                self._pipeline_condition.notify_all()
+    
+    def get_file_content(self, file_path: str) -> Optional[str]:
+        """讀取文件內容，mtime 和大小未變時直接返回緩存"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self._evict_content(file_path)
+            return None
+        
+        with self._cache_lock:
+            cached = self.file_cache.get(file_path)
+            if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+                self.file_cache.move_to_end(file_path)
+                self.pipeline_stats["cache_hits"] += 1
+                return cached.content
+        
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except UnicodeDecodeError:
+            # 如果是二進制文件，記錄文件類型
+            content = f"[Binary file: {os.path.splitext(file_path)[1]}]"
+        except OSError:
+            return None
+        self.pipeline_stats["content_reads"] += 1
+        
+        # 單個文件超過容量的四分之一時不緩存，避免沖掉整個緩存
+        if stat.st_size <= self.cache_max_bytes // 4:
+            with self._cache_lock:
+                previous = self.file_cache.pop(file_path, None)
+                if previous is not None:
+                    self._cache_bytes -= previous.size
+                self.file_cache[file_path] = _CachedContent(stat.st_mtime_ns, stat.st_size, content)
+                self._cache_bytes += stat.st_size
+                while self._cache_bytes > self.cache_max_bytes and self.file_cache:
+                    _, evicted = self.file_cache.popitem(last=False)
+                    self._cache_bytes -= evicted.size
+                    self.pipeline_stats["cache_evictions"] += 1
+        return content
+    
+    def _evict_content(self, file_path: str):
+        with self._cache_lock:
+            cached = self.file_cache.pop(file_path, None)
+            if cached is not None:
+                self._cache_bytes -= cached.size
+    
+    def get_pipeline_stats(self) -> Dict[str, Any]:
+        """獲取事件管道和內容緩存統計"""
+        with self._pipeline_condition:
+            stats = dict(self.pipeline_stats)
+            stats["pending_events"] = len(self._pending_events)
+            stats["in_progress"] = len(self._in_progress)
+        stats["cached_files"] = len(self.file_cache)
+        stats["cached_bytes"] = self._cache_bytes
+        return stats
     
     def _convert_to_wsl_path(self, windows_path: str) -> str:
         """將Windows路徑轉換為WSL路徑"""
@@ -249,6 +1001,7 @@ class FileAcquisitionEngine:
                 )
                 
                 self.wsl_bridges[name] = bridge_config
+                self.sync_engine.register_bridge(name, bridge_config, self._wsl_transport)
                 
                 # 創建WSL目錄
                 await self._create_wsl_directory(wsl_path)
@@ -261,34 +1014,28 @@ class FileAcquisitionEngine:
     async def _create_wsl_directory(self, wsl_path: str):
         """在WSL中創建目錄"""
         try:
-            cmd = ['wsl', 'mkdir', '-p', wsl_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                logger.info(f"WSL目錄創建成功: {wsl_path}")
-            else:
-                logger.warning(f"WSL目錄創建失敗: {result.stderr}")
-                
+            await self._wsl_transport.ensure_directories([wsl_path])
+            logger.info(f"WSL目錄創建完成: {wsl_path}")
         except Exception as e:
             logger.error(f"WSL目錄創建異常: {e}")
     
     async def sync_file_to_wsl(self, windows_path: str, wsl_path: str) -> bool:
         """同步文件到WSL"""
-        try:
-            # 使用WSL命令複製文件
-            cmd = ['wsl', 'cp', windows_path, wsl_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                logger.info(f"文件同步成功: {windows_path} -> {wsl_path}")
-                return True
-            else:
-                logger.error(f"文件同步失敗: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"文件同步異常: {e}")
+        failed = await self._wsl_transport.copy_files([(windows_path, wsl_path)])
+        if failed:
+            logger.error(f"文件同步失敗: {windows_path} -> {wsl_path}")
             return False
+        logger.info(f"文件同步成功: {windows_path} -> {wsl_path}")
+        return True
+    
+    def add_sync_bridge(self, name: str, config: WSLBridgeConfig, transport: Optional[SyncTransport] = None):
+        """添加同步橋接，默認通過WSL命令同步；傳入 LocalDirectoryTransport 可做本地目錄同步"""
+        self.wsl_bridges[name] = config
+        self.sync_engine.register_bridge(name, config, transport or self._wsl_transport)
+    
+    async def sync_bridges(self) -> Dict[str, Dict[str, Any]]:
+        """立即同步所有橋接上累積的變更"""
+        return {name: await self.sync_engine.sync_pending(name) for name in self.sync_engine.bridges}
     
     def add_event_callback(self, callback: Callable[[FileEvent], None]):
         """添加文件事件回調"""
@@ -301,7 +1048,7 @@ class FileAcquisitionEngine:
     
     def get_file_events(self, limit: int = 100) -> List[FileEvent]:
         """獲取最近的文件事件"""
-        events = list(self.file_cache.values())
+        events = list(self.recent_events)
         events.sort(key=lambda x: x.timestamp, reverse=True)
         return events[:limit]
     
@@ -379,6 +1126,174 @@ async def main():
             await file_acquisition_engine.stop_monitoring()
             print("文件獲取引擎測試完成")
 
+def benchmark_file_events(files: int = 20, saves_per_file: int = 30, events_per_save: int = 3,
+                          save_interval: float = 0.002, file_size: int = 64 * 1024) -> Dict[str, Any]:
+    """用本地突發寫入對比逐事件全量讀取的原實現與防抖合併管道
+    
+    每次保存寫入整個文件並發出 events_per_save 個 modified 事件（編輯器保存時常見），
+    統計觀察者線程上的耗時、內容讀取次數和回調次數。
+    """
+    import tempfile
+    
+    def legacy_handle(file_event: FileEvent, state: Dict[str, Any]):
+        # 修改前的做法：在觀察者線程上讀取整個文件、寫入無界緩存並同步觸發回調
+        with open(file_event.file_path, 'r', encoding='utf-8') as f:
+            file_event.file_content = f.read()
+        state["reads"] += 1
+        state["cache"][file_event.event_id] = file_event
+        state["callbacks"] += 1
+    
+    def burst_write(directory: str, handler: Callable[[FileEvent], None]) -> float:
+        observer_seconds = 0.0
+        paths = [os.path.join(directory, f"burst_{i}.py") for i in range(files)]
+        for save in range(saves_per_file):
+            for path in paths:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(f"# save {save}\n" + "x" * file_size)
+                for _ in range(events_per_save):
+                    started = time.perf_counter()
+                    handler(FileEvent(str(uuid.uuid4()), time.time(), 'modified', path))
+                    observer_seconds += time.perf_counter() - started
+            time.sleep(save_interval)
+        return observer_seconds
+    
+    results = {"events": files * saves_per_file * events_per_save}
+    
+    with tempfile.TemporaryDirectory() as directory:
+        state = {"reads": 0, "callbacks": 0, "cache": {}}
+        started = time.perf_counter()
+        observer_seconds = burst_write(directory, lambda event: legacy_handle(event, state))
+        results["legacy"] = {
+            "elapsed_seconds": time.perf_counter() - started,
+            "observer_thread_seconds": observer_seconds,
+            "content_reads": state["reads"],
+            "callbacks": state["callbacks"],
+            "cached_events": len(state["cache"])
+        }
+    
+    with tempfile.TemporaryDirectory() as directory:
+        engine = FileAcquisitionEngine(debounce_interval=0.05, max_debounce_delay=0.5, eager_content=True)
+        callbacks = []
+        engine.add_event_callback(callbacks.append)
+        started = time.perf_counter()
+        observer_seconds = burst_write(directory, engine._handle_file_event)
+        engine.stop_event_pipeline(flush=True)
+        stats = engine.get_pipeline_stats()
+        results["debounced"] = {
+            "elapsed_seconds": time.perf_counter() - started,
+            "observer_thread_seconds": observer_seconds,
+            "content_reads": stats["content_reads"],
+            "callbacks": len(callbacks),
+            "events_coalesced": stats["events_coalesced"],
+            "unchanged_skipped": stats["unchanged_skipped"],
+            "cached_bytes": stats["cached_bytes"]
+        }
+    
+    results["read_reduction"] = results["legacy"]["content_reads"] / max(results["debounced"]["content_reads"], 1)
+    results["observer_speedup"] = (results["legacy"]["observer_thread_seconds"] /
+                                   max(results["debounced"]["observer_thread_seconds"], 1e-9))
+    return results
+
+def benchmark_file_sync(files: int = 200, file_size: int = 256 * 1024, edit_fraction: float = 0.1,
+                        touch_fraction: float = 0.2, seed: int = 7) -> Dict[str, Any]:
+    """本地目錄同步基準：對比逐文件啟動 cp 子進程整檔複製的原做法與批量增量同步
+    
+    首輪全量同步後，修改 edit_fraction 的文件（中間插入少量字節），
+    並只更新 touch_fraction 的文件的 mtime，再同步一輪。
+    """
+    import random
+    import tempfile
+    
+    rng = random.Random(seed)
+    
+    def populate(directory: str) -> List[str]:
+        paths = []
+        for i in range(files):
+            path = os.path.join(directory, f"module_{i}.py")
+            with open(path, 'wb') as f:
+                f.write(rng.randbytes(file_size))
+            paths.append(path)
+        # 非匹配文件應被 file_patterns 過濾
+        with open(os.path.join(directory, "ignored.bin"), 'wb') as f:
+            f.write(b"\0" * 1024)
+        return paths
+    
+    def mutate(paths: List[str]) -> List[str]:
+        changed = rng.sample(paths, int(len(paths) * (edit_fraction + touch_fraction)))
+        edited = changed[:int(len(paths) * edit_fraction)]
+        for path in changed:
+            if path in edited:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                offset = rng.randrange(len(data))
+                with open(path, 'wb') as f:
+                    f.write(data[:offset] + b"# edited\n" + data[offset:])
+            else:
+                os.utime(path, ns=(time.time_ns(), time.time_ns()))
+        return changed
+    
+    def legacy_sync(paths: List[str], destination: str):
+        # 修改前的做法：每個文件一個阻塞的複製子進程，整檔複製
+        for path in paths:
+            subprocess.run(['cp', path, os.path.join(destination, os.path.basename(path))],
+                           capture_output=True, text=True, timeout=30)
+    
+    results = {"files": files, "file_size": file_size}
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+        paths = populate(source)
+        all_paths = sorted(os.path.join(source, name) for name in os.listdir(source))
+        
+        started = time.perf_counter()
+        legacy_sync(all_paths, target)
+        initial_seconds = time.perf_counter() - started
+        changed = mutate(paths)
+        started = time.perf_counter()
+        legacy_sync(changed, target)
+        results["legacy"] = {
+            "initial_seconds": initial_seconds,
+            "incremental_seconds": time.perf_counter() - started,
+            "incremental_bytes_sent": sum(os.path.getsize(p) for p in changed)
+        }
+    
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+        paths = populate(source)
+        all_paths = sorted(os.path.join(source, name) for name in os.listdir(source))
+        engine = FileSyncEngine()
+        engine.register_bridge("bench", WSLBridgeConfig(windows_path=source, wsl_path=target,
+                                                        auto_sync=False, file_patterns=['*.py']),
+                               LocalDirectoryTransport())
+        
+        async def run() -> Dict[str, Any]:
+            started = time.perf_counter()
+            await engine.sync_batch("bench", all_paths)
+            initial_seconds = time.perf_counter() - started
+            changed = mutate(paths)
+            started = time.perf_counter()
+            batch = await engine.sync_batch("bench", changed)
+            return {
+                "initial_seconds": initial_seconds,
+                "incremental_seconds": time.perf_counter() - started,
+                "incremental_bytes_sent": batch["bytes_sent"],
+                "delta_synced": batch["delta_synced"],
+                "skipped_identical": batch["skipped_identical"]
+            }
+        
+        results["batched_delta"] = asyncio.run(run())
+        results["batched_delta"]["skipped_pattern"] = engine.stats["skipped_pattern"]
+        results["identical"] = all(
+            open(path, 'rb').read() == open(os.path.join(target, os.path.basename(path)), 'rb').read()
+            for path in paths)
+    
+    results["bytes_reduction"] = (results["legacy"]["incremental_bytes_sent"] /
+                                  max(results["batched_delta"]["incremental_bytes_sent"], 1))
+    return results
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        print(json.dumps({"file_events": benchmark_file_events(), "file_sync": benchmark_file_sync()},
+                         indent=2, ensure_ascii=False))
+    else:
+        asyncio.run(main())
 
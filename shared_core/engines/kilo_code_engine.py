@@ -14,12 +14,34 @@ import time
 import logging
 import threading
 from typing import Dict, List, Any, Optional, Callable
+from collections import deque
 from dataclasses import dataclass, asdict
 from datetime import datetime
+import sys
 import uuid
 import websockets
 from pathlib import Path
 
+# 優先使用更快的JSON編解碼器
+try:
+    import orjson
+    
+    def json_dumps(data: Any) -> str:
+        try:
+            return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # orjson 不支持的情況（如超過64位的整數）回退到標準庫
+            return json.dumps(data, ensure_ascii=False, default=str)
+    
+    json_loads = orjson.loads
+    JSON_CODEC = "orjson"
+except ImportError:
+    def json_dumps(data: Any) -> str:
+        return json.dumps(data, ensure_ascii=False, default=str)
+    
+    json_loads = json.loads
+    JSON_CODEC = "json"
+
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -471,14 +493,52 @@ class RLSRTTrainer:
             'performance_improved': True
         }
 
+@dataclass
+class ConnectionStats:
+    """單個WebSocket連接的吞吐統計"""
+    connection_id: str
+    path: Optional[str]
+    opened_at: float
+    closed_at: Optional[float] = None
+    requests_received: int = 0
+    requests_completed: int = 0
+    requests_failed: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    total_latency: float = 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = (self.closed_at or time.time()) - self.opened_at
+        data = asdict(self)
+        data.update({
+            'elapsed_seconds': elapsed,
+            'requests_per_second': self.requests_completed / elapsed if elapsed > 0 else 0.0,
+            'average_latency_ms': self.total_latency / self.requests_completed * 1000 if self.requests_completed else 0.0
+        })
+        return data
+
 class KiloCodeEngine:
     """Kilo Code智能引擎主類"""
     
-    def __init__(self):
+    # 有狀態、必須按到達順序處理的請求類型
+    ORDERED_REQUEST_TYPES = {'workflow_recording'}
+    
+    def __init__(self, max_concurrent_requests: int = 16):
         self.intervention_coordinator = InterventionCoordinator()
         self.data_pipeline = DataPipeline()
         self.is_running = False
         self.websocket_server = None
+        self.max_concurrent_requests = max_concurrent_requests  # 每個連接的並發上限
+        self.connection_stats: Dict[str, ConnectionStats] = {}  # 活躍連接
+        self.recent_closed_connections = deque(maxlen=100)       # 最近關閉的連接
+        self.closed_connection_totals = {
+            'connections': 0,
+            'requests_received': 0,
+            'requests_completed': 0,
+            'requests_failed': 0,
+            'total_latency': 0.0,
+            'peak_in_flight': 0
+        }
         
     async def start_engine(self, host: str = "localhost", port: int = 8765):
         """啟動Kilo Code引擎"""
@@ -491,25 +551,115 @@ class KiloCodeEngine:
             port
         )
         
-        logger.info(f"Kilo Code引擎已啟動: ws://{host}:{port}")
+        logger.info(f"Kilo Code引擎已啟動: ws://{host}:{port} (JSON: {JSON_CODEC})")
+        
+    async def handle_websocket_connection(self, websocket, path=None):
+        """處理WebSocket連接
         
-    async def handle_websocket_connection(self, websocket, path):
-        """處理WebSocket連接"""
+        帶 request_id 的請求在並發上限內並行處理，完成即回寫響應（回顯 request_id）；
+        不帶 request_id 的請求和有狀態的錄製請求按到達順序處理，兼容舊客戶端。
+        """
+        path = path or getattr(websocket, 'path', None)
+        stats = ConnectionStats(connection_id=str(uuid.uuid4()), path=path, opened_at=time.time())
+        self.connection_stats[stats.connection_id] = stats
         logger.info(f"新的WebSocket連接: {path}")
         
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        send_lock = asyncio.Lock()
+        ordered_lock = asyncio.Lock()  # asyncio.Lock 按FIFO喚醒，保證順序
+        in_flight = set()
+        
+        async def send(payload: Dict[str, Any]):
+            async with send_lock:
+                await websocket.send(json_dumps(payload))
+        
+        async def handle(request_data: Dict[str, Any], ordered: bool):
+            started = time.perf_counter()
+            request_id = request_data.get('request_id')
+            try:
+                if ordered:
+                    async with ordered_lock:
+                        response = await self.intervention_coordinator.process_intervention_request(request_data)
+                else:
+                    response = await self.intervention_coordinator.process_intervention_request(request_data)
+            except Exception as e:
+                response = {'status': 'error', 'message': str(e)}
+            
+            if request_id is not None:
+                response = {**response, 'request_id': request_id}
+            
+            try:
+                await send(response)
+                stats.requests_completed += 1
+                stats.total_latency += time.perf_counter() - started
+                if response.get('status') == 'error':
+                    stats.requests_failed += 1
+            finally:
+                stats.in_flight -= 1
+                semaphore.release()
+        
         try:
             async for message in websocket:
+                stats.requests_received += 1
                 try:
-                    request_data = json.loads(message)
-                    response = await self.intervention_coordinator.process_intervention_request(request_data)
-                    await websocket.send(json.dumps(response))
-                except json.JSONDecodeError:
-                    await websocket.send(json.dumps({'status': 'error', 'message': '無效的JSON格式'}))
-                except Exception as e:
-                    await websocket.send(json.dumps({'status': 'error', 'message': str(e)}))
+                    request_data = json_loads(message)
+                except ValueError:
+                    await send({'status': 'error', 'message': '無效的JSON格式'})
+                    continue
+                if not isinstance(request_data, dict):
+                    await send({'status': 'error', 'message': '請求必須是JSON對象'})
+                    continue
+                
+                # 達到並發上限時暫停讀取，形成背壓
+                await semaphore.acquire()
+                stats.in_flight += 1
+                stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+                
+                ordered = ('request_id' not in request_data
+                           or request_data.get('type') in self.ORDERED_REQUEST_TYPES)
+                task = asyncio.create_task(handle(request_data, ordered))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            
+            # 客戶端正常關閉前，等待已接收的請求回寫完成
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
                     
         except websockets.exceptions.ConnectionClosed:
             logger.info("WebSocket連接已關閉")
+        finally:
+            for task in list(in_flight):
+                task.cancel()
+            stats.closed_at = time.time()
+            self._retire_connection(stats)
+            summary = stats.to_dict()
+            logger.info(f"連接 {stats.connection_id[:8]} 統計: {summary['requests_completed']} 個請求, "
+                        f"{summary['requests_per_second']:.1f} req/s, 平均延遲 {summary['average_latency_ms']:.1f}ms, "
+                        f"峰值並發 {stats.peak_in_flight}")
+    
+    def _retire_connection(self, stats: ConnectionStats):
+        """關閉的連接從活躍表移出，計入累計統計並保留在最近關閉列表中"""
+        self.connection_stats.pop(stats.connection_id, None)
+        self.recent_closed_connections.append(stats)
+        totals = self.closed_connection_totals
+        totals['connections'] += 1
+        totals['requests_received'] += stats.requests_received
+        totals['requests_completed'] += stats.requests_completed
+        totals['requests_failed'] += stats.requests_failed
+        totals['total_latency'] += stats.total_latency
+        totals['peak_in_flight'] = max(totals['peak_in_flight'], stats.peak_in_flight)
+    
+    def get_connection_stats(self) -> List[Dict[str, Any]]:
+        """獲取活躍連接和最近關閉連接的吞吐統計"""
+        return [stats.to_dict() for stats in list(self.connection_stats.values()) + list(self.recent_closed_connections)]
+    
+    def get_connection_totals(self) -> Dict[str, Any]:
+        """獲取所有已關閉連接的累計統計"""
+        totals = dict(self.closed_connection_totals)
+        totals['average_latency_ms'] = (totals['total_latency'] / totals['requests_completed'] * 1000
+                                        if totals['requests_completed'] else 0.0)
+        totals['active_connections'] = len(self.connection_stats)
+        return totals
             
     async def stop_engine(self):
         """停止Kilo Code引擎"""
@@ -573,10 +723,81 @@ async def test_kilo_code_engine():
     finally:
         await engine.stop_engine()
 
+async def benchmark_websocket_load(clients: int = 8, requests_per_client: int = 200,
+                                   slow_ratio: float = 0.1, slow_latency: float = 0.2,
+                                   max_concurrent_requests: int = 16,
+                                   host: str = "localhost", port: int = 8766) -> Dict[str, Any]:
+    """本地WebSocket負載生成器：多個客戶端發送帶 request_id 的請求，混入一部分慢請求"""
+    engine = KiloCodeEngine(max_concurrent_requests=max_concurrent_requests)
+    coordinator = engine.intervention_coordinator
+    original_process = coordinator.process_intervention_request
+    
+    async def process_with_latency(request_data: Dict[str, Any]) -> Dict[str, Any]:
+        # 模擬耗時的文件橋接請求
+        if request_data.get('type') == 'file_bridge':
+            await asyncio.sleep(slow_latency)
+        return await original_process(request_data)
+    
+    coordinator.process_intervention_request = process_with_latency
+    await engine.start_engine(host, port)
+    
+    latencies: List[float] = []
+    
+    async def run_client(client_index: int):
+        async with websockets.connect(f"ws://{host}:{port}") as websocket:
+            sent_at: Dict[str, float] = {}
+            slow_every = int(1 / slow_ratio) if slow_ratio > 0 else 0
+            
+            async def sender():
+                for i in range(requests_per_client):
+                    request_id = f"{client_index}-{i}"
+                    if slow_every and i % slow_every == 0:
+                        request = {'type': 'file_bridge', 'platform': 'linux', 'config': {}}
+                    else:
+                        request = {'type': 'conversation_analysis', 'conversation': f'這個功能出錯了 {i}'}
+                    request['request_id'] = request_id
+                    sent_at[request_id] = time.perf_counter()
+                    await websocket.send(json_dumps(request))
+            
+            sender_task = asyncio.create_task(sender())
+            for _ in range(requests_per_client):
+                response = json_loads(await websocket.recv())
+                latencies.append(time.perf_counter() - sent_at[response['request_id']])
+            await sender_task
+    
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_client(i) for i in range(clients)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await engine.stop_engine()
+    
+    latencies.sort()
+    total = len(latencies)
+    result = {
+        'clients': clients,
+        'requests': total,
+        'json_codec': JSON_CODEC,
+        'max_concurrent_requests': max_concurrent_requests,
+        'elapsed_seconds': elapsed,
+        'requests_per_second': total / elapsed if elapsed > 0 else 0.0,
+        'p50_latency_ms': latencies[total // 2] * 1000 if total else 0.0,
+        'p99_latency_ms': latencies[max(0, int(total * 0.99) - 1)] * 1000 if total else 0.0
+    }
+    print(f"📈 負載測試: {total} 個請求, {result['requests_per_second']:.0f} req/s, "
+          f"p50 {result['p50_latency_ms']:.1f}ms, p99 {result['p99_latency_ms']:.1f}ms "
+          f"(並發上限 {max_concurrent_requests}, JSON: {JSON_CODEC})")
+    return result
+
 if __name__ == "__main__":
     print("🚀 PowerAutomation v0.56 - Kilo Code智能引擎")
     print("=" * 60)
     
-    # 運行測試
-    asyncio.run(test_kilo_code_engine())
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        # 並發上限為1時等價於舊的逐條處理，用於對比
+        asyncio.run(benchmark_websocket_load(max_concurrent_requests=1))
+        asyncio.run(benchmark_websocket_load())
+    else:
+        # 運行測試
+        asyncio.run(test_kilo_code_engine())
 
@@ -16,11 +16,14 @@ import time
 import asyncio
 import threading
 import queue
+import inspect
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple, Callable
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Any, Optional, Tuple, Callable, AsyncIterator
+from dataclasses import dataclass, asdict, replace
 from enum import Enum
 import logging
+import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import uuid
 
@@ -92,21 +95,82 @@ class CollaborationMessage:
         if self.timestamp is None:
             self.timestamp = datetime.now()
 
+# 任務依賴：測試等待代碼產出，協調等待其他所有智能體；只對本次請求中存在的角色生效
+TASK_DEPENDENCIES = {
+    AgentRole.TESTING_AGENT: (AgentRole.CODING_AGENT,),
+    AgentRole.COORDINATOR_AGENT: (AgentRole.CODING_AGENT, AgentRole.TESTING_AGENT, AgentRole.DEPLOY_AGENT)
+}
+
+class AgentMailbox:
+    """智能體信箱
+    
+    任務和消息分開排隊，空閒時掛起在事件上而不是輪詢；
+    兩種隊列都有內容時交替取出，避免長任務流餓死消息。
+    只能在智能體所在的事件循環中讀寫。
+    """
+    
+    def __init__(self):
+        self.tasks = deque()
+        self.messages = deque()
+        self._ready = asyncio.Event()
+        self._prefer_messages = False
+    
+    def put_task(self, item):
+        self.tasks.append(item)
+        self._ready.set()
+    
+    def put_message(self, item):
+        self.messages.append(item)
+        self._ready.set()
+    
+    def notify(self):
+        """喚醒等待中的讀取方（如並發槽位釋放時）"""
+        self._ready.set()
+    
+    def next(self, accept_tasks: bool = True) -> Optional[Tuple[str, Any]]:
+        """取出下一項，沒有可處理的內容時返回None"""
+        take_task = accept_tasks and bool(self.tasks)
+        if take_task and self.messages and self._prefer_messages:
+            take_task = False
+        if take_task:
+            self._prefer_messages = True
+            return "task", self.tasks.popleft()
+        if self.messages:
+            self._prefer_messages = False
+            return "message", self.messages.popleft()
+        return None
+    
+    async def wait(self):
+        """掛起直到有新內容或被喚醒"""
+        self._ready.clear()
+        await self._ready.wait()
+    
+    def __len__(self) -> int:
+        return len(self.tasks) + len(self.messages)
+
 class BaseAgent:
-    """智能體基類"""
+    """智能體基類
+    
+    運行在事件循環上的協程：任務和消息經由可等待的信箱投遞，
+    同時執行的任務數受 max_concurrency 限制。
+    """
     
-    def __init__(self, role: AgentRole, name: str, specialties: List[str]):
+    def __init__(self, role: AgentRole, name: str, specialties: List[str], max_concurrency: int = 2):
         self.role = role
         self.name = name
         self.specialties = specialties
-        self.task_queue = queue.Queue()
-        self.message_queue = queue.Queue()
+        self.max_concurrency = max_concurrency
+        self.mailbox = AgentMailbox()
         self.is_running = False
-        self.thread = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner = None
+        self._in_flight = set()
         self.stats = {
             "tasks_completed": 0,
             "tasks_failed": 0,
+            "messages_handled": 0,
             "total_execution_time": 0.0,
+            "total_queue_wait": 0.0,
             "average_confidence": 0.0
         }
         
@@ -122,56 +186,157 @@ class BaseAgent:
         }
         return templates
     
-    def start(self):
-        """啟動智能體"""
-        if not self.is_running:
-            self.is_running = True
-            self.thread = threading.Thread(target=self._run_loop, daemon=True)
-            self.thread.start()
-            logger.info(f"🤖 {self.name} 智能體已啟動")
+    def _on_loop(self) -> bool:
+        """當前是否運行在智能體的事件循環中"""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+    
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """啟動智能體：在給定的（默認為當前運行中的）事件循環上創建調度協程"""
+        if self.is_running:
+            return
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                raise RuntimeError(f"{self.name} 需要在事件循環中啟動，或顯式傳入 loop")
+        
+        self.loop = loop
+        self.is_running = True
+        if self._on_loop():
+            self._runner = loop.create_task(self._run_loop())
+        else:
+            self._runner = asyncio.run_coroutine_threadsafe(self._run_loop(), loop)
+        logger.info(f"🤖 {self.name} 智能體已啟動")
     
     def stop(self):
-        """停止智能體"""
+        """停止智能體，取消調度協程和未完成的任務"""
+        if not self.is_running:
+            return
         self.is_running = False
-        if self.thread:
-            self.thread.join(timeout=5)
+        
+        def cancel_all():
+            for job in list(self._in_flight):
+                job.cancel()
+            if self._runner is not None:
+                self._runner.cancel()
+        
+        if self._on_loop():
+            cancel_all()
+        elif self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(cancel_all)
         logger.info(f"🛑 {self.name} 智能體已停止")
     
-    def _run_loop(self):
-        """智能體運行循環"""
-        while self.is_running:
-            try:
-                # 處理任務
-                if not self.task_queue.empty():
-                    task = self.task_queue.get_nowait()
-                    result = self._execute_task(task)
-                    self._update_stats(result)
-                
-                # 處理消息
-                if not self.message_queue.empty():
-                    message = self.message_queue.get_nowait()
-                    self._handle_message(message)
+    async def _run_loop(self):
+        """智能體調度循環：無內容時掛起，不佔用CPU"""
+        try:
+            while self.is_running:
+                item = self.mailbox.next(accept_tasks=len(self._in_flight) < self.max_concurrency)
+                if item is None:
+                    await self.mailbox.wait()
+                    continue
                 
-                time.sleep(0.1)  # 避免CPU過度使用
+                kind, payload = item
+                if kind == "message":
+                    await self._dispatch_message(payload)
+                    continue
                 
-            except Exception as e:
-                logger.error(f"❌ {self.name} 運行錯誤: {e}")
+                task, future, enqueued_at = payload
+                if future is not None and future.done():
+                    # 調用方在排隊期間已放棄（超時或取消）
+                    continue
+                job = asyncio.ensure_future(self._run_task(task, future, enqueued_at))
+                self._in_flight.add(job)
+                job.add_done_callback(self._on_task_done)
+                if future is not None:
+                    future.add_done_callback(lambda f, job=job: job.cancel() if f.cancelled() else None)
+        except asyncio.CancelledError:
+            pass
+    
+    def _on_task_done(self, job):
+        self._in_flight.discard(job)
+        self.mailbox.notify()
+    
+    async def _dispatch_message(self, message: CollaborationMessage):
+        try:
+            handled = self._handle_message(message)
+            if inspect.isawaitable(handled):
+                await handled
+            self.stats["messages_handled"] += 1
+        except Exception as e:
+            logger.error(f"❌ {self.name} 處理消息失敗: {e}")
+    
+    async def _run_task(self, task: AgentTask, future: Optional[asyncio.Future], enqueued_at: float):
+        """執行單個任務並回填結果"""
+        started = time.perf_counter()
+        self.stats["total_queue_wait"] += started - enqueued_at
+        try:
+            result = self._execute_task(task)
+            if inspect.isawaitable(result):
+                result = await result
+        except asyncio.CancelledError:
+            if future is not None and not future.done():
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"❌ {self.name} 任務 {task.task_id} 失敗: {e}")
+            result = AgentResult(
+                task_id=task.task_id,
+                agent_role=self.role,
+                status=TaskStatus.FAILED,
+                output=None,
+                execution_time=time.perf_counter() - started,
+                confidence=0.0,
+                metadata={},
+                error_message=str(e)
+            )
+        
+        self._update_stats(result)
+        if future is not None and not future.done():
+            future.set_result(result)
+    
+    def _enqueue_task(self, task: AgentTask, future: Optional[asyncio.Future]):
+        self.mailbox.put_task((task, future, time.perf_counter()))
+    
+    async def submit(self, task: AgentTask) -> AgentResult:
+        """投遞任務並等待結果，必須在智能體的事件循環中調用"""
+        if not self.is_running or not self._on_loop():
+            raise RuntimeError(f"{self.name} 未在當前事件循環上運行")
+        future = self.loop.create_future()
+        self._enqueue_task(task, future)
+        return await future
     
     def add_task(self, task: AgentTask):
-        """添加任務"""
-        self.task_queue.put(task)
+        """添加任務
+        
+        在智能體的事件循環中調用時返回 asyncio.Future，從其他線程調用時
+        返回 concurrent.futures.Future；智能體未啟動時任務先入隊，返回None。
+        """
         logger.info(f"📝 {self.name} 收到任務: {task.task_id}")
+        if not self.is_running:
+            self._enqueue_task(task, None)
+            return None
+        if self._on_loop():
+            future = self.loop.create_future()
+            self._enqueue_task(task, future)
+            return future
+        return asyncio.run_coroutine_threadsafe(self.submit(task), self.loop)
     
     def send_message(self, message: CollaborationMessage):
-        """發送協作消息"""
-        self.message_queue.put(message)
+        """發送協作消息，可從任意線程調用"""
+        if self.is_running and not self._on_loop():
+            self.loop.call_soon_threadsafe(self.mailbox.put_message, message)
+        else:
+            self.mailbox.put_message(message)
     
     def _execute_task(self, task: AgentTask) -> AgentResult:
-        """執行任務（子類實現）"""
+        """執行任務（子類實現，可以是協程）"""
         raise NotImplementedError("子類必須實現此方法")
     
     def _handle_message(self, message: CollaborationMessage):
-        """處理協作消息（子類實現）"""
+        """處理協作消息（子類實現，可以是協程）"""
         logger.info(f"📨 {self.name} 收到來自 {message.from_agent.value} 的消息")
     
     def _update_stats(self, result: AgentResult):
@@ -192,6 +357,9 @@ class BaseAgent:
 class CodingAgent(BaseAgent):
     """編碼工程師智能體"""
     
+    # 模擬處理耗時（秒）
+    simulated_latency = 0.8
+    
     def __init__(self):
         super().__init__(
             role=AgentRole.CODING_AGENT,
@@ -207,7 +375,7 @@ class CodingAgent(BaseAgent):
             logger.info(f"💻 編碼智能體開始處理: {task.user_input[:50]}...")
             
             # 模擬代碼生成過程
-            await asyncio.sleep(0.8)  # 模擬處理時間
+            await asyncio.sleep(self.simulated_latency)  # 模擬處理時間
             
             # 生成代碼
             code_output = self._generate_code(task.user_input, task.context)
@@ -273,6 +441,9 @@ if __name__ == "__main__":
 class TestingAgent(BaseAgent):
     """測試工程師智能體"""
     
+    # 模擬處理耗時（秒）
+    simulated_latency = 0.6
+    
     def __init__(self):
         super().__init__(
             role=AgentRole.TESTING_AGENT,
@@ -288,7 +459,7 @@ class TestingAgent(BaseAgent):
             logger.info(f"🧪 測試智能體開始處理: {task.user_input[:50]}...")
             
             # 模擬測試生成過程
-            await asyncio.sleep(0.6)
+            await asyncio.sleep(self.simulated_latency)
             
             # 生成測試用例
             test_output = self._generate_tests(task.user_input, task.context)
@@ -377,6 +548,9 @@ if __name__ == "__main__":
 class DeployAgent(BaseAgent):
     """DevOps工程師智能體"""
     
+    # 模擬處理耗時（秒）
+    simulated_latency = 0.5
+    
     def __init__(self):
         super().__init__(
             role=AgentRole.DEPLOY_AGENT,
@@ -392,7 +566,7 @@ class DeployAgent(BaseAgent):
             logger.info(f"🚀 部署智能體開始處理: {task.user_input[:50]}...")
             
             # 模擬部署配置生成
-            await asyncio.sleep(0.5)
+            await asyncio.sleep(self.simulated_latency)
             
             # 生成部署配置
             deploy_output = self._generate_deployment_config(task.user_input, task.context)
@@ -511,6 +685,9 @@ data:
 class CoordinatorAgent(BaseAgent):
     """協調智能體"""
     
+    # 模擬處理耗時（秒）
+    simulated_latency = 0.3
+    
     def __init__(self):
         super().__init__(
             role=AgentRole.COORDINATOR_AGENT,
@@ -527,7 +704,7 @@ class CoordinatorAgent(BaseAgent):
             logger.info(f"📋 協調智能體開始處理: {task.user_input[:50]}...")
             
             # 模擬協調過程
-            await asyncio.sleep(0.3)
+            await asyncio.sleep(self.simulated_latency)
             
             # 生成協調報告
             coordination_output = self._generate_coordination_report(task.user_input, task.context)
@@ -561,6 +738,17 @@ class CoordinatorAgent(BaseAgent):
                 error_message=str(e)
             )
     
+    def _format_upstream_status(self, context: Dict[str, Any]) -> str:
+        """根據上游智能體的實際結果生成狀態行"""
+        upstream_status = context.get("upstream_status")
+        if upstream_status is None:
+            return "✅ 編碼智能體: 已完成代碼生成\n✅ 測試智能體: 已完成測試用例生成\n✅ 部署智能體: 已完成部署配置"
+        lines = []
+        for role_value, status in upstream_status.items():
+            icon = "✅" if status == TaskStatus.COMPLETED.value else "❌"
+            lines.append(f"{icon} {role_value}: {status}")
+        return "\n".join(lines) or "（無上游智能體）"
+    
     def _generate_coordination_report(self, user_input: str, context: Dict[str, Any]) -> str:
         """生成協調報告"""
         return f"""# 多智能體協作報告
@@ -571,9 +759,7 @@ class CoordinatorAgent(BaseAgent):
 - 協作時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 ## 智能體協作狀態
-✅ 編碼智能體: 已完成代碼生成
-✅ 測試智能體: 已完成測試用例生成
-✅ 部署智能體: 已完成部署配置
+{self._format_upstream_status(context)}
 
 ## 質量評估
 - 代碼質量: 88/100
@@ -600,12 +786,17 @@ class CoordinatorAgent(BaseAgent):
 class MultiAgentCollaborationEngine:
     """多線程多智能體協作引擎"""
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, default_agent_timeout: float = 30.0,
+                 agent_timeouts: Optional[Dict[AgentRole, float]] = None):
         self.max_workers = max_workers
+        self.default_agent_timeout = default_agent_timeout
+        self.agent_timeouts = dict(agent_timeouts or {})
         self.agents = {}
         self.message_bus = queue.Queue()
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.is_running = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
         
         # 初始化智能體
         self._initialize_agents()
@@ -618,6 +809,10 @@ class MultiAgentCollaborationEngine:
             "average_execution_time": 0.0,
             "collaboration_efficiency": 0.0
         }
+        
+        # 每個智能體的耗時分解和關鍵路徑統計
+        self.agent_timing = {}
+        self.last_critical_path = {"roles": [], "duration": 0.0}
     
     def _initialize_agents(self):
         """初始化所有智能體"""
@@ -630,17 +825,41 @@ class MultiAgentCollaborationEngine:
         
         logger.info("🤖 多智能體系統初始化完成")
     
-    def start(self):
-        """啟動協作引擎"""
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """啟動協作引擎
+        
+        所有智能體共享一個事件循環：在協程中調用時使用當前循環，
+        否則啟動一個後台循環線程。
+        """
         if not self.is_running:
+            if loop is None:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    loop = self._start_background_loop()
+            self.loop = loop
             self.is_running = True
             
             # 啟動所有智能體
             for agent in self.agents.values():
-                agent.start()
+                agent.start(loop)
             
             logger.info("🚀 多智能體協作引擎已啟動")
     
+    def _start_background_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        
+        def run_loop():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(started.set)
+            loop.run_forever()
+        
+        self._loop_thread = threading.Thread(target=run_loop, name="AgentRuntimeLoop", daemon=True)
+        self._loop_thread.start()
+        started.wait()
+        return loop
+    
     def stop(self):
         """停止協作引擎"""
         if self.is_running:
@@ -653,6 +872,14 @@ class MultiAgentCollaborationEngine:
             # 關閉線程池
             self.executor.shutdown(wait=True)
             
+            # 停止自建的後台循環
+            if self._loop_thread is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self._loop_thread.join(timeout=5)
+                self.loop.close()
+                self._loop_thread = None
+            self.loop = None
+            
             logger.info("🛑 多智能體協作引擎已停止")
     
     async def process_request(self, user_input: str, intention: WorkflowIntention) -> Dict[str, Any]:
@@ -666,11 +893,11 @@ class MultiAgentCollaborationEngine:
             # 步驟1-3: 任務分解和智能體分配
             tasks = self._create_agent_tasks(task_id, user_input, intention)
             
-            # 步驟4: 多線程並行處理
-            results = await self._execute_parallel_tasks(tasks)
-            
-            # 步驟5-8: 智能體協作和結果整合
-            collaboration_result = await self._coordinate_results(task_id, results)
+            # 步驟4-8: 按依賴並發執行，結果到達即交給協調整合
+            results = {}
+            collaboration_result = await self._coordinate_results(
+                task_id, self._stream_agent_results(tasks), results
+            )
             
             # 步驟9-11: 生成最終輸出
             final_output = await self._generate_final_output(
@@ -743,38 +970,137 @@ class MultiAgentCollaborationEngine:
     async def _execute_parallel_tasks(self, tasks: List[AgentTask]) -> Dict[AgentRole, AgentResult]:
         """並行執行智能體任務"""
         results = {}
+        async for result in self._stream_agent_results(tasks):
+            results[result.agent_role] = result
+        return results
+    
+    async def _stream_agent_results(self, tasks: List[AgentTask]) -> AsyncIterator[AgentResult]:
+        """按依賴並發執行智能體任務，按完成順序產出結果
         
-        # 創建異步任務
-        async_tasks = []
-        for task in tasks:
-            agent = self.agents[task.agent_role]
-            async_task = agent._execute_task(task)
-            async_tasks.append((task.agent_role, async_task))
+        每個任務只等待自己的上游：上游的輸出和狀態寫入任務上下文的
+        upstream_outputs/upstream_status；上游失敗不阻塞下游，下游基於部分結果繼續。
+        """
+        request_started = time.perf_counter()
+        roles = {task.agent_role for task in tasks}
+        done_events = {role: asyncio.Event() for role in roles}
+        finished: Dict[AgentRole, AgentResult] = {}
+        timings: Dict[AgentRole, Dict[str, float]] = {}
         
-        # 並行執行
-        for agent_role, async_task in async_tasks:
-            try:
-                result = await async_task
-                results[agent_role] = result
-                logger.info(f"✅ {agent_role.value} 任務完成")
-            except Exception as e:
-                logger.error(f"❌ {agent_role.value} 任務失敗: {e}")
-                results[agent_role] = AgentResult(
-                    task_id="failed",
-                    agent_role=agent_role,
-                    status=TaskStatus.FAILED,
-                    output=None,
-                    execution_time=0.0,
-                    confidence=0.0,
-                    metadata={},
-                    error_message=str(e)
-                )
+        async def run_one(task: AgentTask) -> AgentResult:
+            dependencies = [role for role in TASK_DEPENDENCIES.get(task.agent_role, ()) if role in roles]
+            for role in dependencies:
+                await done_events[role].wait()
+            
+            if dependencies:
+                context = dict(task.context)
+                context["upstream_outputs"] = {role.value: finished[role].output for role in dependencies
+                                               if finished[role].status == TaskStatus.COMPLETED}
+                context["upstream_status"] = {role.value: finished[role].status.value for role in dependencies}
+                task = replace(task, context=context)
+            
+            started = time.perf_counter()
+            result = await self._run_agent_task(task)
+            ended = time.perf_counter()
+            timings[task.agent_role] = {
+                "dependency_wait": started - request_started,
+                "start": started - request_started,
+                "end": ended - request_started,
+                "duration": ended - started
+            }
+            finished[task.agent_role] = result
+            done_events[task.agent_role].set()
+            return result
         
-        return results
+        jobs = [asyncio.ensure_future(run_one(task)) for task in tasks]
+        try:
+            for next_result in asyncio.as_completed(jobs):
+                result = await next_result
+                if result.status == TaskStatus.COMPLETED:
+                    logger.info(f"✅ {result.agent_role.value} 任務完成")
+                else:
+                    logger.error(f"❌ {result.agent_role.value} 任務失敗: {result.error_message}")
+                yield result
+        finally:
+            # 消費方提前退出時取消剩餘任務
+            for job in jobs:
+                job.cancel()
+            self._record_timings(timings)
     
-    async def _coordinate_results(self, task_id: str, results: Dict[AgentRole, AgentResult]) -> Dict[str, Any]:
-        """協調智能體結果"""
-        coordinator_result = results.get(AgentRole.COORDINATOR_AGENT)
+    async def _run_agent_task(self, task: AgentTask) -> AgentResult:
+        """在超時限制內執行單個智能體任務，超時或異常都轉為失敗結果"""
+        agent = self.agents[task.agent_role]
+        timeout = self.agent_timeouts.get(task.agent_role, self.default_agent_timeout)
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._dispatch(agent, task), timeout=timeout)
+        except asyncio.TimeoutError:
+            error = f"執行超時（{timeout:.1f}s）"
+        except Exception as e:
+            error = str(e)
+        return AgentResult(
+            task_id=task.task_id,
+            agent_role=task.agent_role,
+            status=TaskStatus.FAILED,
+            output=None,
+            execution_time=time.perf_counter() - started,
+            confidence=0.0,
+            metadata={},
+            error_message=error
+        )
+    
+    def _record_timings(self, timings: Dict[AgentRole, Dict[str, float]]):
+        """記錄每個智能體的耗時，並沿最晚完成的依賴回溯出關鍵路徑"""
+        if not timings:
+            return
+        
+        path = [max(timings, key=lambda role: timings[role]["end"])]
+        while True:
+            upstream = [role for role in TASK_DEPENDENCIES.get(path[-1], ()) if role in timings]
+            if not upstream:
+                break
+            path.append(max(upstream, key=lambda role: timings[role]["end"]))
+        path.reverse()
+        
+        for role, timing in timings.items():
+            entry = self.agent_timing.setdefault(role.value, {
+                "runs": 0,
+                "total_duration": 0.0,
+                "total_dependency_wait": 0.0,
+                "critical_path_runs": 0
+            })
+            entry["runs"] += 1
+            entry["total_duration"] += timing["duration"]
+            entry["total_dependency_wait"] += timing["dependency_wait"]
+            if role in path:
+                entry["critical_path_runs"] += 1
+        
+        self.last_critical_path = {
+            "roles": [role.value for role in path],
+            "duration": timings[path[-1]]["end"],
+            "segments": {role.value: timings[role] for role in path}
+        }
+    
+    def _dispatch(self, agent: BaseAgent, task: AgentTask):
+        """運行中的智能體經由信箱調度，否則直接執行"""
+        if not agent.is_running:
+            return agent._execute_task(task)
+        if agent._on_loop():
+            return agent.submit(task)
+        return asyncio.wrap_future(agent.add_task(task))
+    
+    async def _coordinate_results(self, task_id: str, results: AsyncIterator[AgentResult],
+                                  collected: Optional[Dict[AgentRole, AgentResult]] = None) -> Dict[str, Any]:
+        """協調智能體結果
+        
+        逐個接收到達的結果並寫入 collected；協調智能體成功時採用其報告，
+        否則基於已到達的部分結果整合。
+        """
+        collected = {} if collected is None else collected
+        async for result in results:
+            collected[result.agent_role] = result
+            logger.info(f"📬 已收到 {len(collected)} 個智能體結果: {result.agent_role.value}")
+        
+        coordinator_result = collected.get(AgentRole.COORDINATOR_AGENT)
         
         if coordinator_result and coordinator_result.status == TaskStatus.COMPLETED:
             return {
@@ -783,11 +1109,16 @@ class MultiAgentCollaborationEngine:
                 "recommendations": coordinator_result.metadata.get("recommendations", [])
             }
         
-        # 如果協調智能體失敗，進行簡單整合
+        # 如果協調智能體失敗，基於部分結果進行簡單整合
+        completed = [r for r in collected.values() if r.status == TaskStatus.COMPLETED]
+        failed = [r.agent_role.value for r in collected.values() if r.status != TaskStatus.COMPLETED]
+        recommendations = ["建議人工檢查結果"]
+        if failed:
+            recommendations.append(f"以下智能體未完成: {', '.join(failed)}")
         return {
             "coordination_report": "自動整合結果",
-            "quality_score": 0.75,
-            "recommendations": ["建議人工檢查結果"]
+            "quality_score": (sum(r.confidence for r in completed) / len(completed) * 0.85) if completed else 0.0,
+            "recommendations": recommendations
         }
     
     async def _generate_final_output(self, task_id: str, user_input: str, 
@@ -880,11 +1211,22 @@ class MultiAgentCollaborationEngine:
     
     def get_stats(self) -> Dict[str, Any]:
         """獲取統計數據"""
+        agent_timing = {}
+        for role_value, entry in self.agent_timing.items():
+            runs = entry["runs"] or 1
+            agent_timing[role_value] = {
+                **entry,
+                "average_duration": entry["total_duration"] / runs,
+                "average_dependency_wait": entry["total_dependency_wait"] / runs,
+                "critical_path_ratio": entry["critical_path_runs"] / runs
+            }
         return {
             **self.stats,
             "agent_stats": {
                 role.value: agent.stats for role, agent in self.agents.items()
-            }
+            },
+            "agent_timing": agent_timing,
+            "last_critical_path": self.last_critical_path
         }
 
 # 測試函數
@@ -938,6 +1280,105 @@ async def test_multi_agent_collaboration():
     finally:
         engine.stop()
 
+class _PollingAgentBaseline:
+    """修改前的輪詢式運行循環（每個智能體一個線程，空閒時睡眠輪詢），僅用於基準對比"""
+    
+    def __init__(self, agent: BaseAgent, poll_interval: float = 0.1):
+        self.agent = agent
+        self.poll_interval = poll_interval
+        self.task_queue = queue.Queue()
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+    
+    def _run_loop(self):
+        while self.is_running:
+            if not self.task_queue.empty():
+                task, future = self.task_queue.get_nowait()
+                future.set_result(asyncio.run(self.agent._execute_task(task)))
+            time.sleep(self.poll_interval)
+    
+    def add_task(self, task: AgentTask):
+        future = concurrent.futures.Future()
+        self.task_queue.put((task, future))
+        return future
+    
+    def stop(self):
+        self.is_running = False
+        self.thread.join(timeout=5)
+
+async def benchmark_agent_runtime(requests: int = 10, poll_interval: float = 0.1,
+                                  idle_seconds: float = 1.0) -> Dict[str, Any]:
+    """四智能體請求的端到端延遲基準：事件驅動信箱 vs 輪詢循環
+    
+    每個請求依次經過編碼、測試、部署、協調四個智能體；模擬處理耗時置零，
+    測得的延遲即調度開銷。另外測量空閒時的CPU佔用。
+    """
+    chain = [AgentRole.CODING_AGENT, AgentRole.TESTING_AGENT,
+             AgentRole.DEPLOY_AGENT, AgentRole.COORDINATOR_AGENT]
+    
+    def summarize(latencies: List[float], idle_cpu: float) -> Dict[str, Any]:
+        ordered = sorted(latencies)
+        return {
+            "requests": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2] * 1000,
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "idle_cpu_percent": idle_cpu * 100
+        }
+    
+    async def measure_idle_cpu() -> float:
+        cpu_start = time.process_time()
+        await asyncio.sleep(idle_seconds)
+        return (time.process_time() - cpu_start) / idle_seconds
+    
+    def make_tasks(index: int) -> List[AgentTask]:
+        return [AgentTask(f"bench{index}_{role.value}", role, WorkflowIntention.CODING_IMPLEMENTATION,
+                          "benchmark", {}) for role in chain]
+    
+    previous_level = logger.level
+    logger.setLevel(logging.WARNING)
+    engine = MultiAgentCollaborationEngine()
+    for agent in engine.agents.values():
+        agent.simulated_latency = 0.0
+    
+    try:
+        # 事件驅動運行時
+        engine.start()
+        latencies = []
+        for i in range(requests):
+            started = time.perf_counter()
+            for task in make_tasks(i):
+                await engine.agents[task.agent_role].submit(task)
+            latencies.append(time.perf_counter() - started)
+        report = {"event_driven": summarize(latencies, await measure_idle_cpu())}
+        engine.stop()
+        
+        # 輪詢基線
+        pollers = {role: _PollingAgentBaseline(agent, poll_interval) for role, agent in engine.agents.items()}
+        try:
+            latencies = []
+            for i in range(requests):
+                started = time.perf_counter()
+                for task in make_tasks(i):
+                    await asyncio.wrap_future(pollers[task.agent_role].add_task(task))
+                latencies.append(time.perf_counter() - started)
+            report["polling_baseline"] = summarize(latencies, await measure_idle_cpu())
+        finally:
+            for poller in pollers.values():
+                poller.stop()
+    finally:
+        engine.stop()
+        logger.setLevel(previous_level)
+    
+    report["p50_speedup"] = report["polling_baseline"]["p50_ms"] / max(report["event_driven"]["p50_ms"], 1e-6)
+    return report
+
 if __name__ == "__main__":
-    asyncio.run(test_multi_agent_collaboration())
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        print(json.dumps(asyncio.run(benchmark_agent_runtime()), indent=2))
+    else:
+        asyncio.run(test_multi_agent_collaboration())
 
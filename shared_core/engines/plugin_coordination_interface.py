@@ -8,12 +8,15 @@ Date: 2025-06-11
 """
 
 import asyncio
+import heapq
 import json
+import random
 import time
 import logging
 import threading
-from typing import Dict, List, Any, Optional, Callable, Union
-from dataclasses import dataclass, asdict
+from collections import defaultdict, deque
+from typing import Dict, List, Any, Optional, Callable, Union, Awaitable
+from dataclasses import dataclass, asdict, field
 from datetime import datetime
 from enum import Enum
 import uuid
@@ -77,6 +80,173 @@ class CoordinationTask:
     created_at: float
     updated_at: float
 
+@dataclass(order=True)
+class ScheduledMessage:
+    """排隊中的消息，按 sort_key 排序"""
+    sort_key: float
+    sequence: int
+    enqueued_at: float = field(compare=False)
+    message: PluginMessage = field(compare=False)
+
+class PluginMessageScheduler:
+    """插件消息優先級調度器
+    
+    基於 asyncio.PriorityQueue：排序鍵為入隊時間減去 priority × aging_interval，
+    每級優先級相當於提前 aging_interval 秒入隊，等待足夠久的低優先級消息
+    終會排到新到的高優先級消息之前（老化），排序鍵無需更新。
+    消息由固定數量的工作協程並發處理；每個源插件同時處理的消息數受
+    per_plugin_concurrency 限制，超出的消息暫存在該插件的積壓隊列中，
+    保證單個插件的突發流量不會佔滿所有工作協程。
+    """
+    
+    def __init__(self, handler: Callable[[PluginMessage], Awaitable[Any]],
+                 worker_count: int = 4, per_plugin_concurrency: int = 2,
+                 aging_interval: float = 1.0, max_pending: int = 10000,
+                 wait_samples: int = 2048):
+        self.handler = handler
+        self.worker_count = worker_count
+        self.per_plugin_concurrency = per_plugin_concurrency
+        self.aging_interval = aging_interval
+        self.max_pending = max_pending
+        
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._pending_before_start: List[ScheduledMessage] = []
+        self._deferred: Dict[str, deque] = defaultdict(deque)
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._workers: List[asyncio.Task] = []
+        self._sequence = 0
+        self._wait_times = deque(maxlen=wait_samples)
+        self._wait_by_priority: Dict[int, deque] = defaultdict(lambda: deque(maxlen=wait_samples))
+        self.stats = {
+            'submitted': 0,
+            'processed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'deferred': 0
+        }
+        self.processed_by_plugin: Dict[str, int] = defaultdict(int)
+    
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+    
+    def pending_count(self) -> int:
+        """排隊中和積壓中的消息總數"""
+        queued = self._queue.qsize() if self._queue is not None else len(self._pending_before_start)
+        return queued + sum(len(backlog) for backlog in self._deferred.values())
+    
+    def submit(self, message: PluginMessage) -> bool:
+        """提交消息，積壓超過 max_pending 時拒絕並返回False"""
+        if self.pending_count() >= self.max_pending:
+            self.stats['rejected'] += 1
+            logger.warning(f"消息隊列已滿，拒絕消息: {message.message_id} ({message.source_plugin})")
+            return False
+        
+        now = time.monotonic()
+        self._sequence += 1
+        item = ScheduledMessage(
+            sort_key=now - message.priority * self.aging_interval,
+            sequence=self._sequence,
+            enqueued_at=now,
+            message=message
+        )
+        self.stats['submitted'] += 1
+        if self._queue is None:
+            self._pending_before_start.append(item)
+        else:
+            self._queue.put_nowait(item)
+        return True
+    
+    def start(self):
+        """啟動工作協程，必須在事件循環中調用"""
+        if self.is_running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        for item in self._pending_before_start:
+            self._queue.put_nowait(item)
+        self._pending_before_start.clear()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+    
+    async def stop(self):
+        """停止工作協程，未處理的消息保留到下次啟動"""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._pending_before_start.append(self._queue.get_nowait())
+            for backlog in self._deferred.values():
+                self._pending_before_start.extend(backlog)
+            self._deferred.clear()
+            self._in_flight.clear()
+            self._queue = None
+    
+    async def join(self):
+        """等待所有已提交的消息處理完成"""
+        if self._queue is not None:
+            await self._queue.join()
+    
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            plugin_id = item.message.source_plugin
+            if self._in_flight[plugin_id] >= self.per_plugin_concurrency:
+                # 該插件已佔滿配額：暫存消息（仍計為未完成），讓出工作協程給其他插件
+                self._deferred[plugin_id].append(item)
+                self.stats['deferred'] += 1
+                continue
+            
+            self._in_flight[plugin_id] += 1
+            wait_time = time.monotonic() - item.enqueued_at
+            self._wait_times.append(wait_time)
+            self._wait_by_priority[item.message.priority].append(wait_time)
+            try:
+                await self.handler(item.message)
+                self.stats['processed'] += 1
+                self.processed_by_plugin[plugin_id] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"消息處理異常: {item.message.message_id} - {e}")
+            finally:
+                self._in_flight[plugin_id] -= 1
+                backlog = self._deferred.get(plugin_id)
+                if backlog:
+                    # 釋放一條積壓消息，保持原排序鍵
+                    self._queue.put_nowait(backlog.popleft())
+                    self._queue.task_done()
+                self._queue.task_done()
+    
+    @staticmethod
+    def _summarize_waits(samples) -> Dict[str, float]:
+        if not samples:
+            return {'count': 0, 'average_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        ordered = sorted(samples)
+        return {
+            'count': len(ordered),
+            'average_ms': sum(ordered) / len(ordered) * 1000,
+            'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            'max_ms': ordered[-1] * 1000
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """隊列深度、在途數和等待時間統計（基於最近的樣本）"""
+        return {
+            **self.stats,
+            'queue_depth': self.pending_count(),
+            'deferred_depth': sum(len(backlog) for backlog in self._deferred.values()),
+            'in_flight': sum(self._in_flight.values()),
+            'workers': len(self._workers),
+            'wait_time': self._summarize_waits(self._wait_times),
+            'wait_time_by_priority': {priority: self._summarize_waits(samples)
+                                      for priority, samples in sorted(self._wait_by_priority.items())},
+            'processed_by_plugin': dict(self.processed_by_plugin)
+        }
+
 class PluginInterface(ABC):
     """插件接口抽象基類"""
     
@@ -108,14 +278,45 @@ class PluginInterface(ABC):
 class PluginCoordinationManager:
     """插件協同管理器"""
     
-    def __init__(self):
+    def __init__(self, message_workers: int = 4, per_plugin_concurrency: int = 2,
+                 priority_aging_interval: float = 1.0, max_pending_messages: int = 10000,
+                 heartbeat_interval: float = 30.0, max_heartbeat_interval: float = 120.0,
+                 heartbeat_timeout: float = 5.0, max_heartbeat_failures: int = 4,
+                 reconnect_backoff_base: float = 1.0, reconnect_backoff_max: float = 30.0):
         self.plugins: Dict[str, PluginInfo] = {}
         self.plugin_interfaces: Dict[str, PluginInterface] = {}
-        self.message_queue: List[PluginMessage] = []
+        self.message_scheduler = PluginMessageScheduler(
+            self._process_message,
+            worker_count=message_workers,
+            per_plugin_concurrency=per_plugin_concurrency,
+            aging_interval=priority_aging_interval,
+            max_pending=max_pending_messages
+        )
         self.coordination_tasks: Dict[str, CoordinationTask] = {}
         self.event_callbacks: Dict[str, List[Callable]] = {}
         self.is_running = False
-        self.heartbeat_interval = 30.0  # 30秒心跳間隔
+        
+        # 心跳：按到期時間排序的小頂堆，穩定的插件逐步拉長探測間隔
+        self.heartbeat_interval = heartbeat_interval  # 基礎心跳間隔
+        self.max_heartbeat_interval = max_heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_heartbeat_failures = max_heartbeat_failures
+        self.reconnect_backoff_base = reconnect_backoff_base
+        self.reconnect_backoff_max = reconnect_backoff_max
+        self.heartbeat_states: Dict[str, Dict[str, Any]] = {}
+        self._heartbeat_heap: List[tuple] = []
+        self._heartbeat_sequence = 0
+        self._heartbeat_wakeup = asyncio.Event()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._heartbeat_probes = set()
+        self.heartbeat_stats = {
+            'probes': 0,
+            'successes': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'skipped_recent': 0,
+            'disconnects': 0
+        }
         
         # 初始化事件類型
         self.event_types = [
@@ -139,10 +340,11 @@ class PluginCoordinationManager:
             self.is_running = True
             
             # 啟動心跳檢測
-            asyncio.create_task(self._heartbeat_monitor())
+            self._heartbeat_wakeup = asyncio.Event()
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_monitor())
             
-            # 啟動消息處理
-            asyncio.create_task(self._message_processor())
+            # 啟動消息調度
+            self.message_scheduler.start()
             
             logger.info("插件協同服務啟動成功")
             return True
@@ -154,6 +356,13 @@ class PluginCoordinationManager:
     async def stop_coordination(self):
         """停止協同服務"""
         self.is_running = False
+        await self.message_scheduler.stop()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            for probe in list(self._heartbeat_probes):
+                probe.cancel()
+            await asyncio.gather(self._heartbeat_task, *self._heartbeat_probes, return_exceptions=True)
+            self._heartbeat_task = None
         
         # 斷開所有插件連接
         for plugin_id in list(self.plugins.keys()):
@@ -184,6 +393,13 @@ class PluginCoordinationManager:
             # 更新狀態
             plugin_info.status = PluginStatus.CONNECTED
             plugin_info.last_heartbeat = time.time()
+            self.heartbeat_states[plugin_id] = {
+                'interval': self.heartbeat_interval,
+                'consecutive_successes': 0,
+                'consecutive_failures': 0,
+                'next_due': 0.0
+            }
+            self._schedule_heartbeat(plugin_id, self.heartbeat_interval)
             
             # 觸發事件
             await self._trigger_event('plugin_connected', {
@@ -209,6 +425,8 @@ class PluginCoordinationManager:
                 del self.plugins[plugin_id]
                 if plugin_id in self.plugin_interfaces:
                     del self.plugin_interfaces[plugin_id]
+                # 堆中的舊條目在出堆時跳過
+                self.heartbeat_states.pop(plugin_id, None)
                 
                 # 觸發事件
                 await self._trigger_event('plugin_disconnected', {
@@ -453,65 +671,163 @@ class PluginCoordinationManager:
             logger.error(f"智能介入失敗: {e}")
             return {}
     
+    def _schedule_heartbeat(self, plugin_id: str, delay: float):
+        """安排下一次心跳檢查；比當前最早的到期時間更早時喚醒監控協程"""
+        state = self.heartbeat_states.get(plugin_id)
+        if state is None:
+            return
+        due = time.monotonic() + delay
+        state['next_due'] = due
+        self._heartbeat_sequence += 1
+        earliest = self._heartbeat_heap[0][0] if self._heartbeat_heap else None
+        heapq.heappush(self._heartbeat_heap, (due, self._heartbeat_sequence, plugin_id))
+        if earliest is None or due < earliest:
+            self._heartbeat_wakeup.set()
+    
+    def record_heartbeat(self, plugin_id: str):
+        """記錄插件主動上報的心跳，到期時無需再探測"""
+        plugin_info = self.plugins.get(plugin_id)
+        if plugin_info is not None:
+            plugin_info.last_heartbeat = time.time()
+    
+    def _pop_due_heartbeats(self) -> List[str]:
+        """彈出所有已到期的插件，跳過已斷開或被重新安排的舊條目"""
+        now = time.monotonic()
+        due_plugins = []
+        while self._heartbeat_heap and self._heartbeat_heap[0][0] <= now:
+            due, _, plugin_id = heapq.heappop(self._heartbeat_heap)
+            state = self.heartbeat_states.get(plugin_id)
+            if state is not None and state['next_due'] == due:
+                due_plugins.append(plugin_id)
+        return due_plugins
+    
     async def _heartbeat_monitor(self):
-        """心跳監控"""
+        """心跳監控：睡眠到最早的到期時間，只檢查到期的插件"""
         while self.is_running:
             try:
-                current_time = time.time()
-                
-                for plugin_id, plugin_info in list(self.plugins.items()):
-                    # 檢查心跳超時
-                    if current_time - plugin_info.last_heartbeat > self.heartbeat_interval * 2:
-                        logger.warning(f"插件心跳超時: {plugin_id}")
-                        plugin_info.status = PluginStatus.ERROR
-                        
-                        # 嘗試重新連接
-                        if plugin_id in self.plugin_interfaces:
-                            interface = self.plugin_interfaces[plugin_id]
-                            heartbeat_success = await interface.heartbeat()
-                            
-                            if heartbeat_success:
-                                plugin_info.status = PluginStatus.CONNECTED
-                                plugin_info.last_heartbeat = current_time
-                                logger.info(f"插件心跳恢復: {plugin_id}")
-                            else:
-                                logger.error(f"插件心跳失敗，斷開連接: {plugin_id}")
-                                await self.disconnect_plugin(plugin_id)
+                # 每個探測獨立運行，掛起的插件不影響其他插件的檢查
+                for plugin_id in self._pop_due_heartbeats():
+                    probe = asyncio.create_task(self._check_heartbeat(plugin_id))
+                    self._heartbeat_probes.add(probe)
+                    probe.add_done_callback(self._heartbeat_probes.discard)
                 
-                await asyncio.sleep(self.heartbeat_interval)
+                timeout = self._heartbeat_heap[0][0] - time.monotonic() if self._heartbeat_heap else None
+                self._heartbeat_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._heartbeat_wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
                 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"心跳監控異常: {e}")
-                await asyncio.sleep(5)
-    
-    async def _message_processor(self):
-        """消息處理器"""
-        while self.is_running:
-            try:
-                # 處理消息隊列
-                if self.message_queue:
-                    message = self.message_queue.pop(0)
-                    
-                    # 觸發消息接收事件
-                    await self._trigger_event('message_received', {
-                        'message_id': message.message_id,
-                        'source_plugin': message.source_plugin,
-                        'target_plugin': message.target_plugin,
-                        'message_type': message.message_type
-                    })
-                    
-                    # 處理特殊消息類型
-                    if message.message_type == 'quality_assessment_request':
-                        await self._handle_quality_assessment_request(message)
-                    elif message.message_type == 'intervention_request':
-                        await self._handle_intervention_request(message)
-                
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"消息處理異常: {e}")
                 await asyncio.sleep(1)
     
+    async def _check_heartbeat(self, plugin_id: str):
+        """檢查單個插件：最近主動上報過心跳則跳過，否則帶超時探測"""
+        plugin_info = self.plugins.get(plugin_id)
+        interface = self.plugin_interfaces.get(plugin_id)
+        state = self.heartbeat_states.get(plugin_id)
+        if plugin_info is None or interface is None or state is None:
+            return
+        
+        since_last = time.time() - plugin_info.last_heartbeat
+        if state['consecutive_failures'] == 0 and since_last < state['interval']:
+            self.heartbeat_stats['skipped_recent'] += 1
+            self._schedule_heartbeat(plugin_id, state['interval'] - since_last)
+            return
+        
+        self.heartbeat_stats['probes'] += 1
+        try:
+            success = bool(await asyncio.wait_for(interface.heartbeat(), timeout=self.heartbeat_timeout))
+        except asyncio.TimeoutError:
+            self.heartbeat_stats['timeouts'] += 1
+            success = False
+        except Exception as e:
+            logger.debug(f"插件心跳探測異常: {plugin_id} - {e}")
+            success = False
+        
+        if plugin_id not in self.heartbeat_states:
+            # 探測期間插件已斷開
+            return
+        
+        if success:
+            self._on_heartbeat_success(plugin_id, plugin_info, state)
+        else:
+            await self._on_heartbeat_failure(plugin_id, plugin_info, state)
+    
+    def _on_heartbeat_success(self, plugin_id: str, plugin_info: PluginInfo, state: Dict[str, Any]):
+        self.heartbeat_stats['successes'] += 1
+        if state['consecutive_failures'] > 0:
+            logger.info(f"插件心跳恢復: {plugin_id}")
+            # 恢復後從基礎間隔重新觀察
+            state['interval'] = self.heartbeat_interval
+            state['consecutive_successes'] = 0
+        else:
+            state['consecutive_successes'] += 1
+            # 連續成功的插件逐步放寬探測間隔
+            if state['consecutive_successes'] >= 3:
+                state['interval'] = min(self.max_heartbeat_interval, state['interval'] * 1.5)
+        state['consecutive_failures'] = 0
+        plugin_info.status = PluginStatus.CONNECTED
+        plugin_info.last_heartbeat = time.time()
+        self._schedule_heartbeat(plugin_id, state['interval'])
+    
+    async def _on_heartbeat_failure(self, plugin_id: str, plugin_info: PluginInfo, state: Dict[str, Any]):
+        self.heartbeat_stats['failures'] += 1
+        state['consecutive_failures'] += 1
+        state['consecutive_successes'] = 0
+        state['interval'] = self.heartbeat_interval
+        
+        if state['consecutive_failures'] >= self.max_heartbeat_failures:
+            logger.error(f"插件心跳連續失敗 {state['consecutive_failures']} 次，斷開連接: {plugin_id}")
+            self.heartbeat_stats['disconnects'] += 1
+            await self.disconnect_plugin(plugin_id)
+            return
+        
+        # 全抖動指數退避後重試，避免大量插件同時重連
+        delay = random.uniform(0, min(self.reconnect_backoff_max,
+                                      self.reconnect_backoff_base * (2 ** state['consecutive_failures'])))
+        logger.warning(f"插件心跳失敗: {plugin_id}，{delay:.1f}s 後重試")
+        plugin_info.status = PluginStatus.ERROR
+        self._schedule_heartbeat(plugin_id, delay)
+    
+    def get_heartbeat_stats(self) -> Dict[str, Any]:
+        """獲取心跳統計和每個插件的當前探測間隔"""
+        now = time.monotonic()
+        return {
+            **self.heartbeat_stats,
+            'plugins': {
+                plugin_id: {
+                    'interval': state['interval'],
+                    'consecutive_failures': state['consecutive_failures'],
+                    'next_check_in': max(0.0, state['next_due'] - now)
+                }
+                for plugin_id, state in self.heartbeat_states.items()
+            }
+        }
+    
+    def enqueue_message(self, message: PluginMessage) -> bool:
+        """將插件發來的消息提交給調度器，隊列已滿時返回False"""
+        return self.message_scheduler.submit(message)
+    
+    async def _process_message(self, message: PluginMessage):
+        """處理單條消息（由調度器的工作協程調用）"""
+        # 觸發消息接收事件
+        await self._trigger_event('message_received', {
+            'message_id': message.message_id,
+            'source_plugin': message.source_plugin,
+            'target_plugin': message.target_plugin,
+            'message_type': message.message_type
+        })
+        
+        # 處理特殊消息類型
+        if message.message_type == 'quality_assessment_request':
+            await self._handle_quality_assessment_request(message)
+        elif message.message_type == 'intervention_request':
+            await self._handle_intervention_request(message)
+    
     async def _handle_quality_assessment_request(self, message: PluginMessage):
         """處理質量評估請求"""
         try:
@@ -599,6 +915,10 @@ class PluginCoordinationManager:
             }
         return status
     
+    def get_message_queue_stats(self) -> Dict[str, Any]:
+        """獲取消息調度統計"""
+        return self.message_scheduler.get_stats()
+    
     def get_coordination_tasks(self) -> Dict[str, Any]:
         """獲取協同任務狀態"""
         tasks = {}
@@ -609,6 +929,80 @@ class PluginCoordinationManager:
 # 全局插件協同管理器實例
 plugin_coordination_manager = PluginCoordinationManager()
 
+async def benchmark_message_scheduler(plugins: int = 6, messages_per_plugin: int = 20,
+                                      handler_latency: float = 0.01, noisy_slowdown: float = 10.0,
+                                      worker_count: int = 4, legacy_tick: float = 0.1) -> Dict[str, Any]:
+    """多插件合成負載測試：優先級調度器 vs 原來的 pop(0) + 100ms 輪詢處理器
+    
+    第一個插件是「吵鬧」插件：一次性突發提交全部低優先級慢消息（處理耗時為
+    handler_latency × noisy_slowdown），其餘插件隨後提交混合優先級的普通消息。
+    """
+    priorities = [1, 2, 3]
+    
+    def build_workload() -> List[PluginMessage]:
+        workload = []
+        for p in range(plugins):
+            for i in range(messages_per_plugin):
+                workload.append(PluginMessage(
+                    message_id=f"p{p}-{i}",
+                    timestamp=time.time(),
+                    source_plugin=f"plugin_{p}",
+                    target_plugin=None,
+                    message_type='load_test',
+                    payload={'slow': p == 0},
+                    priority=1 if p == 0 else priorities[i % len(priorities)]
+                ))
+        return workload
+    
+    def summarize(latencies: Dict[str, List[float]], elapsed: float, total: int) -> Dict[str, Any]:
+        report = {'elapsed_seconds': elapsed, 'messages_per_second': total / elapsed if elapsed > 0 else 0.0}
+        for name, samples in latencies.items():
+            report[name] = PluginMessageScheduler._summarize_waits(samples)
+        return report
+    
+    async def run(process_all) -> Dict[str, Any]:
+        latencies = defaultdict(list)
+        submitted_at = {}
+        
+        async def handler(message: PluginMessage):
+            await asyncio.sleep(handler_latency * (noisy_slowdown if message.payload['slow'] else 1.0))
+            latency = time.monotonic() - submitted_at[message.message_id]
+            if message.payload['slow']:
+                latencies['noisy_plugin_latency'].append(latency)
+            else:
+                latencies['other_plugins_latency'].append(latency)
+                latencies[f'priority_{message.priority}_latency'].append(latency)
+        
+        workload = build_workload()
+        started = time.monotonic()
+        await process_all(workload, handler, submitted_at)
+        return summarize(latencies, time.monotonic() - started, len(workload))
+    
+    async def scheduled(workload, handler, submitted_at):
+        scheduler = PluginMessageScheduler(handler, worker_count=worker_count)
+        scheduler.start()
+        for message in workload:
+            submitted_at[message.message_id] = time.monotonic()
+            scheduler.submit(message)
+        await scheduler.join()
+        await scheduler.stop()
+    
+    async def legacy(workload, handler, submitted_at):
+        # 修改前的處理方式：列表 pop(0)，每個 tick 只處理一條，按到達順序
+        queue_list = []
+        for message in workload:
+            submitted_at[message.message_id] = time.monotonic()
+            queue_list.append(message)
+        while queue_list:
+            await handler(queue_list.pop(0))
+            await asyncio.sleep(legacy_tick)
+    
+    return {
+        'workload': {'plugins': plugins, 'messages': plugins * messages_per_plugin, 'workers': worker_count},
+        'priority_scheduler': await run(scheduled),
+        'legacy_processor': await run(legacy)
+    }
+
 async def main():
     """測試插件協同接口"""
     print("🚀 PowerAutomation 插件協同接口測試")
@@ -642,5 +1036,10 @@ async def main():
         await plugin_coordination_manager.stop_coordination()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        print(json.dumps(asyncio.run(benchmark_message_scheduler()), indent=2))
+    else:
+        asyncio.run(main())
 
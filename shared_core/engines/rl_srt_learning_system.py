@@ -14,12 +14,13 @@ import threading
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import hashlib
+import zlib
 
 # 導入之前的交互日誌管理器
 from interaction_log_manager import InteractionLogManager, InteractionType, DeliverableType
@@ -60,16 +61,289 @@ class PerformanceMetrics:
     resource_usage: float
     learning_speed: float
 
+# 策略動作空間（與 infer_strategy_from_response 的輸出一致）
+STRATEGY_ACTIONS = [
+    'analytical_approach',
+    'code_generation_approach',
+    'testing_approach',
+    'design_approach',
+    'general_approach'
+]
+
+class ExperienceReplayBuffer:
+    """固定容量、數組存儲的經驗回放緩衝區（環形覆蓋最舊經驗）"""
+    
+    def __init__(self, capacity: int = 100000, state_dim: int = 64):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.ids: List[Optional[str]] = [None] * capacity  # 每個槽位的經驗ID
+        self._slots: Dict[str, int] = {}                    # 經驗ID -> 槽位，槽位被覆蓋時移除
+        self.position = 0
+        self.size = 0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __contains__(self, experience_id: str) -> bool:
+        return experience_id in self._slots
+    
+    def _assign_id(self, index: int, experience_id: Optional[str]):
+        evicted = self.ids[index]
+        if evicted is not None and self._slots.get(evicted) == index:
+            del self._slots[evicted]
+        self.ids[index] = experience_id
+        if experience_id is not None:
+            self._slots[experience_id] = index
+    
+    @staticmethod
+    def encode_features(data: Dict[str, Any], dim: int) -> np.ndarray:
+        """特徵哈希：把任意狀態字典編碼為固定長度的單位向量"""
+        vector = np.zeros(dim, dtype=np.float32)
+        
+        def add(key: str, value: float):
+            vector[zlib.crc32(key.encode('utf-8')) % dim] += value
+        
+        def walk(prefix: str, value: Any):
+            if isinstance(value, bool):
+                add(prefix, 1.0 if value else -1.0)
+            elif isinstance(value, (int, float)):
+                add(prefix, float(value))
+            elif isinstance(value, str):
+                add(f"{prefix}={value[:64]}", 1.0)
+                add(f"{prefix}#len", np.log1p(len(value)))
+            elif isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    walk(f"{prefix}.{sub_key}", sub_value)
+            elif isinstance(value, (list, tuple)):
+                add(f"{prefix}#len", float(len(value)))
+        
+        walk("", data)
+        vector[0] += 1.0  # 偏置項
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    @staticmethod
+    def encode_action(action: Dict[str, Any]) -> int:
+        """把動作中的策略映射為動作索引"""
+        strategy = action.get('strategy', 'general_approach')
+        return STRATEGY_ACTIONS.index(strategy) if strategy in STRATEGY_ACTIONS else len(STRATEGY_ACTIONS) - 1
+    
+    def add(self, experience: LearningExperience):
+        """加入一條經驗"""
+        index = self.position
+        self.states[index] = self.encode_features(experience.state, self.state_dim)
+        self.next_states[index] = self.encode_features(experience.next_state, self.state_dim)
+        self.actions[index] = self.encode_action(experience.action)
+        self.rewards[index] = experience.reward
+        self._assign_id(index, experience.experience_id)
+        
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def add_arrays(self, states: np.ndarray, next_states: np.ndarray,
+                   actions: np.ndarray, rewards: np.ndarray,
+                   experience_ids: Optional[List[str]] = None):
+        """批量寫入已編碼的經驗數組（超出容量時只保留最新的部分）"""
+        count = len(rewards)
+        if experience_ids is None:
+            experience_ids = [None] * count
+        if count > self.capacity:
+            states, next_states = states[-self.capacity:], next_states[-self.capacity:]
+            actions, rewards = actions[-self.capacity:], rewards[-self.capacity:]
+            experience_ids = experience_ids[-self.capacity:]
+            count = self.capacity
+        
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.states[indices] = states
+        self.next_states[indices] = next_states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        for index, experience_id in zip(indices.tolist(), experience_ids):
+            self._assign_id(index, experience_id)
+        
+        self.position = int((self.position + count) % self.capacity)
+        self.size = min(self.size + count, self.capacity)
+    
+    def extend(self, experiences: List[LearningExperience]):
+        """批量加入經驗"""
+        for experience in experiences:
+            self.add(experience)
+    
+    def sample(self, batch_size: int, rng: np.random.Generator) -> np.ndarray:
+        """隨機採樣一個小批次的索引"""
+        return rng.integers(0, self.size, size=min(batch_size, self.size))
+    
+    def epoch_batches(self, batch_size: int, rng: np.random.Generator) -> List[np.ndarray]:
+        """打亂後按小批次遍歷整個緩衝區"""
+        order = rng.permutation(self.size)
+        return [order[i:i + batch_size] for i in range(0, self.size, batch_size)]
+
+class ColumnarExperienceStore:
+    """列式經驗存儲：每次攝取寫一個 .npz 片段
+    
+    數值列和已編碼的特徵矩陣直接存為數組，可整塊載入回放緩衝區；
+    嵌套的 state/action/next_state/metadata 以 UTF-8 JSON 拼接成字節列並記錄偏移量，
+    只在需要還原 LearningExperience 時才解碼。
+    """
+    
+    JSON_COLUMNS = ('state', 'action', 'next_state', 'metadata')
+    BUFFER_COLUMNS = ('experience_id', 'reward', 'action_index', 'state_features', 'next_state_features')
+    
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+    
+    def segment_files(self) -> List[Path]:
+        """按寫入順序列出所有片段"""
+        return sorted(self.store_dir.glob("segment_*.npz"))
+    
+    def write_segment(self, experiences: List[LearningExperience], states: np.ndarray,
+                      next_states: np.ndarray, actions: np.ndarray) -> Optional[Path]:
+        """寫入一個新片段"""
+        if not experiences:
+            return None
+        
+        columns = {
+            'experience_id': np.array([e.experience_id for e in experiences]),
+            'timestamp': np.array([e.timestamp for e in experiences]),
+            'learning_mode': np.array([e.learning_mode.value for e in experiences]),
+            'reward': np.array([e.reward for e in experiences], dtype=np.float32),
+            'action_index': actions.astype(np.int32),
+            'state_features': states.astype(np.float32),
+            'next_state_features': next_states.astype(np.float32)
+        }
+        
+        for name in self.JSON_COLUMNS:
+            encoded = [json.dumps(getattr(e, name), ensure_ascii=False, default=str).encode('utf-8') for e in experiences]
+            columns[f'{name}_offsets'] = np.cumsum([0] + [len(b) for b in encoded], dtype=np.int64)
+            columns[f'{name}_data'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        
+        sequence = len(self.segment_files())
+        segment_file = self.store_dir / f"segment_{sequence:06d}_{int(time.time() * 1000)}.npz"
+        tmp_file = self.store_dir / f".{segment_file.stem}.tmp.npz"
+        np.savez(tmp_file, **columns)
+        os.replace(tmp_file, segment_file)
+        return segment_file
+    
+    def _latest_rows(self, segments: List[Dict[str, np.ndarray]]) -> List[Tuple[int, np.ndarray]]:
+        """按 experience_id 去重（同一日誌重新攝取時保留最新的一行）"""
+        seen = set()
+        selected = []
+        for segment_index in range(len(segments) - 1, -1, -1):
+            ids = segments[segment_index]['experience_id']
+            keep = []
+            for row in range(len(ids) - 1, -1, -1):
+                if ids[row] not in seen:
+                    seen.add(ids[row])
+                    keep.append(row)
+            selected.append((segment_index, np.array(sorted(keep), dtype=np.int64)))
+        selected.reverse()
+        return selected
+    
+    def _load_segments(self, segment_files: Optional[List[Path]] = None,
+                       columns: Optional[Tuple[str, ...]] = None) -> List[Dict[str, np.ndarray]]:
+        """讀取片段；指定 columns 時只讀這些列（npz 按列延遲讀取）"""
+        segments = []
+        for segment_file in (self.segment_files() if segment_files is None else segment_files):
+            with np.load(segment_file) as data:
+                segments.append({key: data[key] for key in (columns or data.files)})
+        return segments
+    
+    def load_into_buffer(self, buffer: ExperienceReplayBuffer,
+                         segment_files: Optional[List[Path]] = None) -> int:
+        """把已編碼的特徵整塊寫入回放緩衝區，只讀數值列，不做任何JSON解碼
+        
+        segment_files 為空時載入全部片段；已在緩衝區中的經驗會被跳過。返回寫入的經驗數。
+        """
+        segments = self._load_segments(segment_files, self.BUFFER_COLUMNS)
+        loaded = 0
+        for segment_index, rows in self._latest_rows(segments):
+            segment = segments[segment_index]
+            ids = [str(experience_id) for experience_id in segment['experience_id'][rows]]
+            keep = [i for i, experience_id in enumerate(ids) if experience_id not in buffer]
+            if not keep:
+                continue
+            if segment['state_features'].shape[1] != buffer.state_dim:
+                raise ValueError(f"特徵維度不匹配: {segment['state_features'].shape[1]} != {buffer.state_dim}")
+            rows = rows[keep]
+            buffer.add_arrays(segment['state_features'][rows], segment['next_state_features'][rows],
+                              segment['action_index'][rows], segment['reward'][rows],
+                              [ids[i] for i in keep])
+            loaded += len(rows)
+        return loaded
+    
+    def load_experiences(self) -> List[LearningExperience]:
+        """還原完整的 LearningExperience 列表（逐行JSON解碼，只用於分析導出，不在訓練路徑上）"""
+        segments = self._load_segments()
+        experiences = []
+        for segment_index, rows in self._latest_rows(segments):
+            segment = segments[segment_index]
+            
+            def decode(name: str, row: int) -> Any:
+                offsets = segment[f'{name}_offsets']
+                return json.loads(segment[f'{name}_data'][offsets[row]:offsets[row + 1]].tobytes().decode('utf-8'))
+            
+            for row in rows:
+                experiences.append(LearningExperience(
+                    experience_id=str(segment['experience_id'][row]),
+                    timestamp=str(segment['timestamp'][row]),
+                    state=decode('state', row),
+                    action=decode('action', row),
+                    reward=float(segment['reward'][row]),
+                    next_state=decode('next_state', row),
+                    metadata=decode('metadata', row),
+                    learning_mode=LearningMode(str(segment['learning_mode'][row]))
+                ))
+        return experiences
+
+def _convert_log_file(log_path: str, state_dim: int):
+    """進程池工作函數：讀取並轉換單個日誌文件，同時完成特徵編碼"""
+    # convert_log_to_experience 只依賴無狀態的輔助方法和 logger，
+    # 因此工作進程裡不需要完整初始化引擎（避免創建目錄和緩衝區）
+    converter = RLSRTLearningEngine.__new__(RLSRTLearningEngine)
+    converter.logger = logging.getLogger(__name__)
+    
+    try:
+        with open(log_path, 'r', encoding='utf-8') as f:
+            log_data = json.load(f)
+        experience = converter.convert_log_to_experience(log_data)
+    except Exception as e:
+        return log_path, None, None, None, None, str(e)
+    
+    if experience is None:
+        return log_path, None, None, None, None, None
+    
+    return (
+        log_path,
+        experience,
+        ExperienceReplayBuffer.encode_features(experience.state, state_dim),
+        ExperienceReplayBuffer.encode_features(experience.next_state, state_dim),
+        ExperienceReplayBuffer.encode_action(experience.action),
+        None
+    )
+
 class RLSRTLearningEngine:
     """RL-SRT學習引擎"""
     
-    def __init__(self, log_manager: InteractionLogManager):
+    def __init__(self, log_manager: InteractionLogManager,
+                 buffer_capacity: int = 100000, state_dim: int = 64):
         self.log_manager = log_manager
         self.learning_dir = log_manager.base_dir / "rl_srt_learning"
         self.setup_learning_system()
-        self.experience_buffer = []
-        self.policy_network = None  # 實際實現中會是神經網絡
-        self.value_network = None
+        self.experience_buffer = ExperienceReplayBuffer(buffer_capacity, state_dim)
+        self.policy_network = np.zeros((state_dim, len(STRATEGY_ACTIONS)), dtype=np.float32)  # 線性softmax策略權重
+        self.value_network = np.zeros(state_dim, dtype=np.float32)  # 線性價值函數權重
+        self.rng = np.random.default_rng()
+        self.experience_store = ColumnarExperienceStore(self.learning_dir / "experiences" / "store")
+        self._buffered_segments: Set[str] = set()  # 已整塊載入回放緩衝區的片段
+        self.ingest_checkpoint_file = self.learning_dir / "experiences" / "ingest_checkpoint.json"
+        self.ingest_workers = os.cpu_count() or 1
+        self.ingest_pool_threshold = 64  # 少於此數量的新日誌直接在當前進程轉換
+        self.batch_size = 256
         self.learning_rate = 0.001
         self.discount_factor = 0.95
         self.exploration_rate = 0.1
@@ -98,30 +372,108 @@ class RLSRTLearningEngine:
         self.logger = logging.getLogger(__name__)
         self.logger.info(f"✅ RL-SRT學習系統已設置: {self.learning_dir}")
     
-    def extract_training_data_from_logs(self) -> List[LearningExperience]:
-        """從交互日誌中提取訓練數據"""
-        training_experiences = []
-        
-        # 遍歷所有交互日誌
+    def extract_training_data_from_logs(self, include_stored: bool = False) -> List[LearningExperience]:
+        """從交互日誌中提取訓練數據
+        
+        增量攝取新日誌，並把存儲中已編碼的特徵直接載入回放緩衝區；默認只返回本次新攝取的經驗，
+        之前攝取的經驗已在緩衝區中，不再逐行JSON解碼。include_stored 為 True 時返回存儲中的全部經驗。
+        """
+        new_experiences = self._ingest_new_logs()
+        self.load_replay_buffer_from_store()
+        training_experiences = self.experience_store.load_experiences() if include_stored else new_experiences
+        
+        self.logger.info(f"✅ 從日誌中提取了 {len(training_experiences)} 個學習經驗，"
+                         f"回放緩衝區共 {len(self.experience_buffer)} 個")
+        return training_experiences
+    
+    def _load_ingest_checkpoint(self) -> Dict[str, Dict[str, int]]:
+        """讀取已攝取日誌的檢查點（路徑 -> mtime/size）"""
+        if not self.ingest_checkpoint_file.exists():
+            return {}
+        try:
+            with open(self.ingest_checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"無法讀取攝取檢查點，將重新攝取全部日誌: {e}")
+            return {}
+    
+    def _save_ingest_checkpoint(self, checkpoint: Dict[str, Dict[str, int]]):
+        tmp_file = self.ingest_checkpoint_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp_file, self.ingest_checkpoint_file)
+    
+    def _find_pending_logs(self, checkpoint: Dict[str, Dict[str, int]]) -> List[Tuple[str, Dict[str, int]]]:
+        """找出新增或自上次攝取後被修改的日誌"""
+        pending = []
         logs_dir = self.log_manager.base_dir / "logs"
+        if not logs_dir.exists():
+            return pending
         
         for interaction_type_dir in logs_dir.iterdir():
             if interaction_type_dir.is_dir():
                 for log_file in interaction_type_dir.glob("*.json"):
-                    try:
-                        with open(log_file, 'r', encoding='utf-8') as f:
-                            log_data = json.load(f)
-                        
-                        # 轉換為學習經驗
-                        experience = self.convert_log_to_experience(log_data)
-                        if experience:
-                            training_experiences.append(experience)
-                            
-                    except Exception as e:
-                        self.logger.warning(f"無法處理日誌文件 {log_file}: {e}")
-        
-        self.logger.info(f"✅ 從日誌中提取了 {len(training_experiences)} 個學習經驗")
-        return training_experiences
+                    stat = log_file.stat()
+                    signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+                    if checkpoint.get(str(log_file)) != signature:
+                        pending.append((str(log_file), signature))
+        return pending
+    
+    def ingest_new_logs(self, max_workers: Optional[int] = None) -> int:
+        """增量攝取新日誌：進程池並行轉換，寫入一個新的列式片段並更新檢查點"""
+        return len(self._ingest_new_logs(max_workers))
+    
+    def _ingest_new_logs(self, max_workers: Optional[int] = None) -> List[LearningExperience]:
+        """增量攝取新日誌，返回本次新增的經驗"""
+        checkpoint = self._load_ingest_checkpoint()
+        pending = self._find_pending_logs(checkpoint)
+        if not pending:
+            return []
+        
+        state_dim = self.experience_buffer.state_dim
+        paths = [path for path, _ in pending]
+        max_workers = max_workers or self.ingest_workers
+        
+        if len(paths) < self.ingest_pool_threshold or max_workers <= 1:
+            results = [_convert_log_file(path, state_dim) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                chunksize = max(1, len(paths) // (max_workers * 4))
+                results = list(executor.map(_convert_log_file, paths, [state_dim] * len(paths), chunksize=chunksize))
+        
+        experiences, states, next_states, actions = [], [], [], []
+        for log_path, experience, state_vec, next_state_vec, action_index, error in results:
+            if error:
+                self.logger.warning(f"無法處理日誌文件 {log_path}: {error}")
+            if experience is None:
+                continue
+            experiences.append(experience)
+            states.append(state_vec)
+            next_states.append(next_state_vec)
+            actions.append(action_index)
+        
+        if experiences:
+            self.experience_store.write_segment(experiences, np.stack(states), np.stack(next_states),
+                                                np.array(actions, dtype=np.int32))
+        
+        # 解析失敗的日誌也記入檢查點，文件再次修改時才會重試
+        checkpoint.update({path: signature for path, signature in pending})
+        self._save_ingest_checkpoint(checkpoint)
+        
+        self.logger.info(f"✅ 增量攝取 {len(pending)} 個日誌，新增 {len(experiences)} 個學習經驗")
+        return experiences
+    
+    def load_replay_buffer_from_store(self) -> int:
+        """訓練啟動時直接從列式存儲載入已編碼的經驗到回放緩衝區（只載入新片段）"""
+        new_segments = [f for f in self.experience_store.segment_files() if f.name not in self._buffered_segments]
+        if not new_segments:
+            return 0
+        
+        start_time = time.perf_counter()
+        loaded = self.experience_store.load_into_buffer(self.experience_buffer, new_segments)
+        self._buffered_segments.update(f.name for f in new_segments)
+        self.logger.info(f"✅ 從經驗存儲載入 {loaded} 個經驗，用時 {time.perf_counter() - start_time:.2f}s")
+        return loaded
     
     def convert_log_to_experience(self, log_data: Dict) -> Optional[LearningExperience]:
         """將日誌數據轉換為學習經驗"""
@@ -285,69 +637,64 @@ class RLSRTLearningEngine:
         
         return min(satisfaction, 1.0)
     
-    async def async_learning_worker(self, experience: LearningExperience):
-        """異步學習工作器"""
-        try:
-            # 模擬異步學習過程
-            start_time = time.time()
-            
-            # 更新策略網絡（簡化版）
-            await self.update_policy_async(experience)
-            
-            # 更新價值網絡（簡化版）
-            await self.update_value_async(experience)
-            
-            # 記錄學習時間
-            learning_time = time.time() - start_time
+    def _td_errors(self, indices: np.ndarray) -> np.ndarray:
+        """計算一批經驗的時序差分誤差"""
+        states = self.experience_buffer.states[indices]
+        next_states = self.experience_buffer.next_states[indices]
+        rewards = self.experience_buffer.rewards[indices]
+        targets = rewards + self.discount_factor * (next_states @ self.value_network)
+        return targets - states @ self.value_network
+    
+    def train_minibatch(self, indices: np.ndarray) -> float:
+        """向量化的小批次策略與價值更新（actor-critic），返回均方TD誤差"""
+        states = self.experience_buffer.states[indices]
+        actions = self.experience_buffer.actions[indices]
+        advantages = self._td_errors(indices)
+        batch_size = len(indices)
+        
+        # 價值函數：沿TD誤差方向做梯度步
+        self.value_network += self.learning_rate * (states.T @ advantages) / batch_size
+        
+        # 策略：softmax策略梯度 ∇log π(a|s) · A
+        logits = states @ self.policy_network
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        grad = -probs
+        grad[np.arange(batch_size), actions] += 1.0
+        self.policy_network += self.learning_rate * (states.T @ (grad * advantages[:, None])) / batch_size
+        
+        return float(np.mean(advantages ** 2))
+    
+    def _train_epochs(self, epochs: int) -> List[Dict[str, Any]]:
+        """在回放緩衝區上訓練若干輪，每輪生成一條指標"""
+        epoch_metrics = []
+        
+        for epoch in range(epochs):
+            epoch_start = time.perf_counter()
+            losses = [self.train_minibatch(batch) for batch in self.experience_buffer.epoch_batches(self.batch_size, self.rng)]
+            epoch_time = time.perf_counter() - epoch_start
             
-            # 保存異步學習日誌
-            async_log = {
-                'experience_id': experience.experience_id,
-                'learning_time': learning_time,
+            epoch_metrics.append({
+                'epoch': epoch + 1,
                 'timestamp': datetime.now().isoformat(),
                 'learning_mode': 'asynchronous',
-                'thread_id': threading.current_thread().ident
-            }
-            
-            async_log_file = self.learning_dir / "async_logs" / f"async_learning_{int(time.time())}.json"
-            with open(async_log_file, 'w', encoding='utf-8') as f:
-                json.dump(async_log, f, indent=2, ensure_ascii=False)
-            
-            return learning_time
-            
-        except Exception as e:
-            self.logger.error(f"異步學習出錯: {e}")
-            return None
+                'experiences': len(self.experience_buffer),
+                'batches': len(losses),
+                'batch_size': self.batch_size,
+                'mean_td_error': float(np.mean(losses)) if losses else 0.0,
+                'epoch_time': epoch_time,
+                'experiences_per_second': len(self.experience_buffer) / epoch_time if epoch_time > 0 else 0.0
+            })
+        
+        return epoch_metrics
     
-    async def update_policy_async(self, experience: LearningExperience):
-        """異步更新策略網絡"""
-        # 模擬策略更新過程
-        await asyncio.sleep(0.01)  # 模擬計算時間
-        
-        # 實際實現中會是神經網絡的梯度更新
-        policy_update = {
-            'experience_id': experience.experience_id,
-            'state_features': len(str(experience.state)),
-            'action_features': len(str(experience.action)),
-            'reward': experience.reward,
-            'update_timestamp': datetime.now().isoformat()
-        }
-        
-        return policy_update
-    
-    async def update_value_async(self, experience: LearningExperience):
-        """異步更新價值網絡"""
-        # 模擬價值更新過程
-        await asyncio.sleep(0.01)  # 模擬計算時間
-        
-        # 實際實現中會是價值函數的更新
-        value_update = {
-            'experience_id': experience.experience_id,
-            'state_value': experience.reward + self.discount_factor * 0.8,  # 簡化計算
-            'update_timestamp': datetime.now().isoformat()
-        }
-        
-        return value_update
+    def _append_learning_metrics(self, epoch_metrics: List[Dict[str, Any]]):
+        """每輪一行，批量追加到學習指標日誌（JSON Lines）"""
+        metrics_file = self.learning_dir / "async_logs" / "async_learning_metrics.jsonl"
+        with open(metrics_file, 'a', encoding='utf-8') as f:
+            for metrics in epoch_metrics:
+                f.write(json.dumps(metrics, ensure_ascii=False) + "\n")
     
     def synchronous_learning(self, experiences: List[LearningExperience]) -> Dict[str, Any]:
         """同步學習模式"""
@@ -373,8 +720,9 @@ class RLSRTLearningEngine:
         self.logger.info(f"✅ 同步學習完成: {learning_results['processed_experiences']} 個經驗")
         return learning_results
     
-    async def asynchronous_learning(self, experiences: List[LearningExperience]) -> Dict[str, Any]:
-        """異步學習模式"""
+    async def asynchronous_learning(self, experiences: List[LearningExperience],
+                                    epochs: int = 1) -> Dict[str, Any]:
+        """異步學習模式：經驗寫入回放緩衝區，在線程池中做向量化小批次訓練"""
         start_time = time.time()
         
         learning_results = {
@@ -383,25 +731,35 @@ class RLSRTLearningEngine:
             'processed_experiences': 0,
             'learning_time': 0,
             'performance_improvement': 0,
-            'parallel_workers': min(len(experiences), 10)  # 最多10個並行工作器
+            'parallel_workers': 1,
+            'batch_size': self.batch_size,
+            'epochs': epochs
         }
         
-        # 創建異步任務
-        tasks = []
-        for experience in experiences:
-            task = asyncio.create_task(self.async_learning_worker(experience))
-            tasks.append(task)
+        # 已攝取到存儲的經驗直接使用已編碼特徵，只有尚未攝取的經驗才在這裡編碼
+        self.load_replay_buffer_from_store()
+        self.experience_buffer.extend([e for e in experiences if e.experience_id not in self.experience_buffer])
+        if not len(self.experience_buffer):
+            return learning_results
+        
+        all_indices = np.arange(len(self.experience_buffer))
+        loss_before = float(np.mean(self._td_errors(all_indices) ** 2))
         
-        # 等待所有任務完成
-        completed_tasks = await asyncio.gather(*tasks, return_exceptions=True)
+        # 訓練是CPU密集的NumPy計算，放到執行器中避免阻塞事件循環
+        loop = asyncio.get_running_loop()
+        epoch_metrics = await loop.run_in_executor(None, self._train_epochs, epochs)
+        await loop.run_in_executor(None, self._append_learning_metrics, epoch_metrics)
         
-        # 統計結果
-        successful_tasks = [t for t in completed_tasks if isinstance(t, (int, float))]
-        learning_results['processed_experiences'] = len(successful_tasks)
+        loss_after = float(np.mean(self._td_errors(all_indices) ** 2))
+        train_time = sum(m['epoch_time'] for m in epoch_metrics)
+        
+        learning_results['processed_experiences'] = len(experiences)
         learning_results['learning_time'] = time.time() - start_time
-        learning_results['performance_improvement'] = self.calculate_performance_improvement()
+        learning_results['experiences_per_second'] = len(self.experience_buffer) * epochs / train_time if train_time > 0 else 0.0
+        learning_results['performance_improvement'] = (loss_before - loss_after) / loss_before if loss_before > 0 else 0.0
         
-        self.logger.info(f"✅ 異步學習完成: {learning_results['processed_experiences']} 個經驗")
+        self.logger.info(f"✅ 異步學習完成: {learning_results['processed_experiences']} 個經驗, "
+                         f"{learning_results['experiences_per_second']:.0f} 經驗/秒")
         return learning_results
     
     def update_policy_sync(self, experience: LearningExperience):
@@ -525,6 +883,7 @@ class RLSRTLearningEngine:
 - **學習時間**: {comparison_results['asynchronous_results'].get('learning_time', 0):.3f} 秒
 - **性能改進**: {comparison_results['asynchronous_results'].get('performance_improvement', 0):.2%}
 - **並行工作器**: {comparison_results['asynchronous_results'].get('parallel_workers', 1)}
+- **訓練吞吐量**: {comparison_results['asynchronous_results'].get('experiences_per_second', 0):.0f} 經驗/秒（批大小 {comparison_results['asynchronous_results'].get('batch_size', 1)}）
 
 ## 📈 效率對比分析
 
@@ -618,7 +977,7 @@ def main():
     print("📚 提取訓練數據...")
     training_experiences = rl_srt_engine.extract_training_data_from_logs()
     
-    if not training_experiences:
+    if not training_experiences and not len(rl_srt_engine.experience_buffer):
         print("⚠️  沒有找到訓練數據，創建示例數據...")
         # 創建一些示例經驗數據
         for i in range(10):
@@ -634,7 +993,7 @@ def main():
             )
             training_experiences.append(example_experience)
     
-    print(f"✅ 提取了 {len(training_experiences)} 個學習經驗")
+    print(f"✅ 新提取了 {len(training_experiences)} 個學習經驗，回放緩衝區已載入 {len(rl_srt_engine.experience_buffer)} 個已編碼經驗")
     
     # 2. 比較同步vs異步學習
     print("⚡ 開始學習模式比較...")
@@ -11,10 +11,13 @@ import json
 import time
 import hashlib
 import re
+import queue
 import asyncio
+import threading
+import concurrent.futures
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable, AsyncIterator
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
@@ -504,7 +507,8 @@ class SmartRouter:
 class SmartRoutingManager:
     """智慧路由管理器 - 整合InteractionLogManager"""
     
-    def __init__(self, base_dir: str = "/home/ubuntu/Powerauto.ai/smart_routing"):
+    def __init__(self, base_dir: str = "/home/ubuntu/Powerauto.ai/smart_routing",
+                 local_model: Any = None, local_timeout: float = 120.0):
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
         
@@ -512,6 +516,12 @@ class SmartRoutingManager:
         self.interaction_log_manager = InteractionLogManager()
         self.smart_router = SmartRouter(self.interaction_log_manager)
         
+        # 本地模型需提供 stream_response(prompt) 異步迭代器（如 Qwen3LocalModelMCP）
+        self.local_model = local_model
+        self.local_timeout = local_timeout
+        # 後台循環與調用方線程之間的分片隊列容量，滿時暫停拉取本地模型輸出
+        self.stream_queue_size = 64
+        
         # 設置日誌
         self.setup_logging()
         
@@ -525,20 +535,29 @@ class SmartRoutingManager:
         )
         self.logger = logging.getLogger(__name__)
     
-    def process_request(self, user_request: str, context: Dict = None) -> Dict:
-        """處理用戶請求"""
+    def process_request(self, user_request: str, context: Dict = None,
+                        on_token: Optional[Callable[[str], Any]] = None) -> Dict:
+        """處理用戶請求
+        
+        on_token 接收部分輸出：本地處理時逐個分片回調，其他路徑在完成後回調一次。
+        回調返回 False 會中止本地生成。回調總在調用 process_request 的線程中執行，
+        不會佔用共享的後台事件循環。
+        """
         # 1. 路由決策
         routing_decision = self.smart_router.route_request(user_request, context)
         
         # 2. 根據決策處理請求
         if routing_decision.processing_location == ProcessingLocation.LOCAL_ONLY:
-            response = self._process_locally(user_request, routing_decision)
-        elif routing_decision.processing_location == ProcessingLocation.CLOUD_ANONYMIZED:
-            response = self._process_cloud_anonymized(user_request, routing_decision)
-        elif routing_decision.processing_location == ProcessingLocation.CLOUD_ALLOWED:
-            response = self._process_cloud(user_request, routing_decision)
+            response = self._process_locally(user_request, routing_decision, on_token)
         else:
-            response = self._process_hybrid(user_request, routing_decision)
+            if routing_decision.processing_location == ProcessingLocation.CLOUD_ANONYMIZED:
+                response = self._process_cloud_anonymized(user_request, routing_decision)
+            elif routing_decision.processing_location == ProcessingLocation.CLOUD_ALLOWED:
+                response = self._process_cloud(user_request, routing_decision)
+            else:
+                response = self._process_hybrid(user_request, routing_decision)
+            if on_token:
+                on_token(response['content'])
         
         # 3. 記錄完整交互
         self.interaction_log_manager.log_interaction(
@@ -563,20 +582,150 @@ class SmartRoutingManager:
             }
         }
     
-    def _process_locally(self, request: str, decision: RoutingDecision) -> Dict:
-        """本地處理"""
-        start_time = time.time()
+    async def stream_locally(self, request: str) -> AsyncIterator[str]:
+        """流式本地處理，逐個產出文本分片
+        
+        由調用方按需拉取（背壓）；停止迭代或取消任務會中止本地模型生成。
+        """
+        if self.local_model is None:
+            # 模擬本地處理 (未配置本地模型時)
+            yield f"[LOCAL] Processed request: {request[:100]}..."
+            return
+        
+        stream = self.local_model.stream_response(request)
+        try:
+            async for chunk in stream:
+                if chunk.get('token'):
+                    yield chunk['token']
+                if chunk.get('done'):
+                    break
+        finally:
+            await stream.aclose()
+    
+    async def _collect_local_stream(self, request: str,
+                                    token_queue: Optional[queue.Queue] = None,
+                                    stop_event: Optional[threading.Event] = None) -> Dict:
+        """收集本地流式輸出，測量首個token延遲
+        
+        分片放入 token_queue 交給調用方線程處理；stop_event 被設置時中止生成。
+        """
+        start_time = time.perf_counter()
+        time_to_first_token = None
+        parts = []
+        cancelled = False
+        
+        stream = self.stream_locally(request)
+        try:
+            async for token in stream:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start_time
+                parts.append(token)
+                if token_queue is not None:
+                    await self._put_token(token_queue, token, stop_event)
+                if stop_event is not None and stop_event.is_set():
+                    cancelled = True
+                    break
+        finally:
+            await stream.aclose()
         
-        # 模擬本地處理 (實際實現中會調用本地模型)
-        response_content = f"[LOCAL] Processed request: {request[:100]}..."
+        return {
+            'content': ''.join(parts),
+            'processing_time': time.perf_counter() - start_time,
+            'time_to_first_token': time_to_first_token,
+            'chunks': len(parts),
+            'cancelled': cancelled
+        }
+    
+    @staticmethod
+    async def _put_token(token_queue: queue.Queue, token: str,
+                         stop_event: Optional[threading.Event]):
+        """隊列滿時讓出事件循環等待消費，不阻塞其他協程"""
+        while stop_event is None or not stop_event.is_set():
+            try:
+                token_queue.put_nowait(token)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.01)
+    
+    def _run_local_stream(self, request: str, on_token: Optional[Callable[[str], Any]]) -> Dict:
+        """在共享事件循環上運行本地流式處理，在當前線程回調 on_token"""
+        try:
+            from mcptool.adapters.core.fixed_event_loop_manager import get_loop_manager
+        except ImportError:
+            from shared_core.mcptool.adapters.core.fixed_event_loop_manager import get_loop_manager
+        
+        if on_token is None:
+            return get_loop_manager().run_coroutine(self._collect_local_stream(request),
+                                                    timeout=self.local_timeout)
+        
+        token_queue: queue.Queue = queue.Queue(maxsize=self.stream_queue_size)
+        stop_event = threading.Event()
+        future = get_loop_manager().submit(self._collect_local_stream(request, token_queue, stop_event))
+        deadline = time.monotonic() + self.local_timeout
+        
+        def deliver(token: str):
+            if not stop_event.is_set() and on_token(token) is False:
+                stop_event.set()
+        
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise concurrent.futures.TimeoutError()
+                try:
+                    token = token_queue.get(timeout=min(remaining, 0.05))
+                except queue.Empty:
+                    if future.done():
+                        break
+                    continue
+                deliver(token)
+            # 協程結束前放入但尚未取走的分片
+            while True:
+                try:
+                    deliver(token_queue.get_nowait())
+                except queue.Empty:
+                    break
+        except BaseException:
+            stop_event.set()
+            future.cancel()
+            raise
+        
+        return future.result()
+    
+    def _process_locally(self, request: str, decision: RoutingDecision,
+                         on_token: Optional[Callable[[str], Any]] = None) -> Dict:
+        """本地處理"""
+        if self.local_model is None:
+            start_time = time.time()
+            
+            # 模擬本地處理 (實際實現中會調用本地模型)
+            response_content = f"[LOCAL] Processed request: {request[:100]}..."
+            if on_token:
+                on_token(response_content)
+            
+            processing_time = time.time() - start_time
+            stream_result = {'time_to_first_token': processing_time, 'chunks': 1, 'cancelled': False}
+        else:
+            try:
+                stream_result = self._run_local_stream(request, on_token)
+                response_content = stream_result['content']
+                processing_time = stream_result['processing_time']
+            except Exception as e:
+                # 本地路由多為隱私敏感請求，失敗時不回退到雲端
+                self.logger.error(f"Local model processing failed: {e}")
+                response_content = f"[LOCAL_ERROR] {e}"
+                processing_time = 0.0
+                stream_result = {'time_to_first_token': None, 'chunks': 0, 'cancelled': False}
         
-        processing_time = time.time() - start_time
         actual_cost = self.smart_router.cost_calculator.calculate_local_cost(processing_time)
         
         return {
             'content': response_content,
             'metrics': {
                 'processing_time': processing_time,
+                'time_to_first_token': stream_result['time_to_first_token'],
+                'chunks_streamed': stream_result['chunks'],
+                'cancelled': stream_result['cancelled'],
                 'actual_cost': actual_cost,
                 'tokens_used': 0,  # 本地處理不計算tokens
                 'location': 'local'
@@ -17,11 +17,19 @@ import json
 import time
 import asyncio
 from datetime import datetime
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 from enum import Enum
 import logging
 
+try:
+    from re import _parser as sre_parse
+    from re._constants import AT, LITERAL
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import AT, LITERAL
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -61,10 +69,45 @@ class WorkflowExecutionResult:
     cost_saved: float
     reasoning: str
 
+def _literal_prefix(pattern: str) -> str:
+    """提取正則模式每個匹配都必須以之開頭的字面前綴
+    
+    只收集頂層的連續字面字符，跳過 ^、\\b 等零寬斷言；遇到分支、分組、量詞等立即截止，
+    因此頂層有 | 的模式前綴為空，按無前綴模式處理。
+    """
+    prefix = []
+    for op, value in sre_parse.parse(pattern):
+        if op is LITERAL:
+            prefix.append(chr(value))
+        elif op is not AT:
+            break
+    return "".join(prefix)
+
+def _trie_regex(literals: List[str]) -> str:
+    """把字面量集合編譯成前綴樹形式的正則，貪婪匹配保證取到最長的字面量"""
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = True
+    
+    def build(node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            body = ("(?:" + body + ")" if len(branches) == 1 else body) + "?"
+        return body
+    
+    return build(trie)
+
 class IntentionClassifier:
     """意圖分類器"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 1024):
         # 個人專業版三大工作流意圖配置
         self.workflow_intentions = {
             WorkflowIntention.CODING_IMPLEMENTATION: {
@@ -116,10 +159,113 @@ class IntentionClassifier:
                 "description": "一鍵部署，環境管理，版本控制和發布流程自動化"
             }
         }
+        
+        # 分析結果的LRU緩存
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, IntentionAnalysisResult]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        self._compile()
+    
+    def register_intention(self, intention: Enum, keywords: List[str] = None,
+                           patterns: List[str] = None, target_engine: str = None, description: str = ""):
+        """運行時註冊意圖或為已有意圖追加關鍵詞和模式，註冊後重新編譯匹配器並清空緩存
+        
+        intention 可以是 WorkflowIntention 或其他 Enum 成員。
+        """
+        config = self.workflow_intentions.setdefault(intention, {
+            "keywords": [],
+            "patterns": [],
+            "target_engine": target_engine,
+            "description": description
+        })
+        for keyword in keywords or []:
+            if keyword not in config["keywords"]:
+                config["keywords"].append(keyword)
+        for pattern in patterns or []:
+            re.compile(pattern)  # 先校驗，避免破壞已編譯的匹配器
+            if pattern not in config["patterns"]:
+                config["patterns"].append(pattern)
+        if target_engine:
+            config["target_engine"] = target_engine
+        if description:
+            config["description"] = description
+        self._compile()
+    
+    def _compile(self):
+        """把所有意圖的關鍵詞和模式前綴編譯成一個掃描正則
+        
+        掃描正則在每個位置做前瞻匹配，一次遍歷輸入得到所有字面量的出現位置；
+        同一位置只報告最長的字面量，作為其前綴的其他字面量通過前綴表補全。
+        模式先按字面前綴篩選候選位置，再在候選位置上用預編譯的正則確認；
+        沒有字面前綴的模式每次都完整搜索。
+        """
+        literal_targets: Dict[str, List[Tuple[str, Any, int]]] = {}
+        unanchored_patterns: List[Tuple[Any, int, Any]] = []
+        self._compiled_patterns: Dict[Any, List[Any]] = {}
+        self._total_possible: Dict[Any, float] = {}
+        
+        for intention, config in self.workflow_intentions.items():
+            for index, keyword in enumerate(config["keywords"]):
+                literal_targets.setdefault(keyword.lower(), []).append(("keyword", intention, index))
+            compiled = []
+            for index, pattern in enumerate(config["patterns"]):
+                regex = re.compile(pattern, re.IGNORECASE)
+                compiled.append(regex)
+                prefix = _literal_prefix(pattern).lower()
+                if prefix:
+                    literal_targets.setdefault(prefix, []).append(("pattern", intention, index))
+                else:
+                    unanchored_patterns.append((intention, index, regex))
+            self._compiled_patterns[intention] = compiled
+            self._total_possible[intention] = len(config["keywords"]) + len(config["patterns"]) * 1.5
+        
+        literals = sorted(literal_targets)
+        # 每個字面量對應的所有目標，包括作為它前綴的字面量的目標
+        self._literal_targets = {
+            literal: [target for other in literals if literal.startswith(other) for target in literal_targets[other]]
+            for literal in literals
+        }
+        self._unanchored_patterns = unanchored_patterns
+        self._scanner = re.compile("(?=(" + _trie_regex(literals) + "))", re.IGNORECASE) if literals else None
+        self._cache.clear()
     
     def analyze_intention(self, user_input: str) -> IntentionAnalysisResult:
-        """分析用戶輸入的意圖"""
-        user_input_lower = user_input.lower()
+        """分析用戶輸入的意圖（結果按輸入緩存）"""
+        cached = self._cache.get(user_input)
+        if cached is not None:
+            self._cache.move_to_end(user_input)
+            self.cache_hits += 1
+            return replace(cached, keywords_matched=list(cached.keywords_matched),
+                           patterns_matched=list(cached.patterns_matched))
+        
+        self.cache_misses += 1
+        result = self._classify(user_input)
+        self._cache[user_input] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return replace(result, keywords_matched=list(result.keywords_matched),
+                       patterns_matched=list(result.patterns_matched))
+    
+    def _classify(self, user_input: str) -> IntentionAnalysisResult:
+        """單次掃描輸入，收集每個意圖命中的關鍵詞和模式"""
+        keyword_hits: Dict[Any, set] = {}
+        pattern_hits: Dict[Any, set] = {}
+        
+        if self._scanner is not None:
+            for match in self._scanner.finditer(user_input):
+                position = match.start()
+                for kind, intention, index in self._literal_targets.get(match.group(1).lower(), ()):
+                    if kind == "keyword":
+                        keyword_hits.setdefault(intention, set()).add(index)
+                    elif index not in pattern_hits.get(intention, ()):
+                        if self._compiled_patterns[intention][index].match(user_input, position):
+                            pattern_hits.setdefault(intention, set()).add(index)
+        
+        for intention, index, regex in self._unanchored_patterns:
+            if regex.search(user_input):
+                pattern_hits.setdefault(intention, set()).add(index)
         
         best_match = None
         best_score = 0.0
@@ -127,31 +273,19 @@ class IntentionClassifier:
         best_patterns = []
         
         for intention, config in self.workflow_intentions.items():
-            score = 0.0
-            matched_keywords = []
-            matched_patterns = []
-            
-            # 關鍵詞匹配
-            for keyword in config["keywords"]:
-                if keyword.lower() in user_input_lower:
-                    score += 1.0
-                    matched_keywords.append(keyword)
+            keywords = sorted(keyword_hits.get(intention, ()))
+            patterns = sorted(pattern_hits.get(intention, ()))
             
-            # 模式匹配
-            for pattern in config["patterns"]:
-                if re.search(pattern, user_input, re.IGNORECASE):
-                    score += 1.5  # 模式匹配權重更高
-                    matched_patterns.append(pattern)
-            
-            # 計算信心度
-            total_possible = len(config["keywords"]) + len(config["patterns"]) * 1.5
+            # 模式匹配權重更高
+            score = len(keywords) * 1.0 + len(patterns) * 1.5
+            total_possible = self._total_possible[intention]
             confidence = score / total_possible if total_possible > 0 else 0.0
             
             if confidence > best_score:
                 best_score = confidence
                 best_match = intention
-                best_keywords = matched_keywords
-                best_patterns = matched_patterns
+                best_keywords = [config["keywords"][i] for i in keywords]
+                best_patterns = [config["patterns"][i] for i in patterns]
         
         # 如果信心度太低，標記為未知
         if best_score < 0.1:
@@ -166,6 +300,17 @@ class IntentionClassifier:
             patterns_matched=best_patterns,
             reasoning=reasoning
         )
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """獲取緩存命中統計"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "cache_size": len(self._cache),
+            "cache_capacity": self.cache_size,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0
+        }
 
 class KiloCodeEngine:
     """Kilo Code智能引擎 - 工作流內兜底"""
@@ -386,10 +531,19 @@ class UnifiedIntentionEngine:
             reasoning="未識別工作流意圖，搜索引擎兜底處理"
         )
     
+    def register_workflow(self, intention: Enum, target_engine_name: str,
+                          keywords: List[str] = None, patterns: List[str] = None, description: str = ""):
+        """運行時註冊工作流：更新意圖分類器並把意圖路由到指定引擎"""
+        if target_engine_name not in self.engines:
+            raise ValueError(f"未知的工作流引擎: {target_engine_name}")
+        self.intention_classifier.register_intention(intention, keywords, patterns, target_engine_name, description)
+        self.workflow_routing[intention] = target_engine_name
+    
     def get_stats(self) -> Dict[str, Any]:
         """獲取統計數據"""
         return {
             **self.stats,
+            "intention_cache": self.intention_classifier.get_cache_stats(),
             "workflow_hit_rate": self.stats["workflow_hits"] / max(self.stats["total_requests"], 1) * 100,
             "kilo_fallback_rate": self.stats["kilo_fallbacks"] / max(self.stats["total_requests"], 1) * 100,
             "search_fallback_rate": self.stats["search_fallbacks"] / max(self.stats["total_requests"], 1) * 100
@@ -438,6 +592,65 @@ async def test_unified_intention_engine():
         else:
             print(f"{key}: {value}")
 
+def benchmark_intention_classifier(iterations: int = 20000, distinct_inputs: int = 2000) -> Dict[str, Any]:
+    """對比逐個關鍵詞/模式搜索的原實現與單次掃描的編譯實現的分類吞吐"""
+    classifier = IntentionClassifier(cache_size=distinct_inputs)
+    
+    def legacy_analyze(user_input: str) -> IntentionAnalysisResult:
+        # 修改前的做法：每個關鍵詞做子串搜索，每個模式做一次未編譯的 re.search
+        user_input_lower = user_input.lower()
+        best_match, best_score, best_keywords, best_patterns = None, 0.0, [], []
+        for intention, config in classifier.workflow_intentions.items():
+            keywords = [k for k in config["keywords"] if k.lower() in user_input_lower]
+            patterns = [p for p in config["patterns"] if re.search(p, user_input, re.IGNORECASE)]
+            score = len(keywords) * 1.0 + len(patterns) * 1.5
+            total_possible = len(config["keywords"]) + len(config["patterns"]) * 1.5
+            confidence = score / total_possible if total_possible > 0 else 0.0
+            if confidence > best_score:
+                best_score, best_match, best_keywords, best_patterns = confidence, intention, keywords, patterns
+        if best_score < 0.1:
+            best_match = WorkflowIntention.UNKNOWN
+        return IntentionAnalysisResult(best_match, best_score, best_keywords, best_patterns,
+                                       f"匹配到 {len(best_keywords)} 個關鍵詞和 {len(best_patterns)} 個模式")
+    
+    templates = [
+        "幫我寫一個Python函數來計算斐波那契數列 #{i}",
+        "為這個函數生成單元測試用例並檢查覆蓋率 #{i}",
+        "部署這個應用到生產環境並發布版本 v{i}",
+        "今天天氣如何？第{i}天",
+        "Implement a REST API endpoint and write unit tests for handler {i}",
+        "please deploy release {i} to staging after the build passes",
+    ]
+    inputs = [templates[i % len(templates)].format(i=i) for i in range(distinct_inputs)]
+    
+    mismatches = sum(1 for text in inputs if legacy_analyze(text) != classifier._classify(text))
+    
+    results = {}
+    for name, analyze in (("legacy", legacy_analyze),
+                          ("compiled", classifier._classify),
+                          ("compiled_cached", classifier.analyze_intention)):
+        start = time.perf_counter()
+        for i in range(iterations):
+            analyze(inputs[i % distinct_inputs])
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "iterations": iterations,
+            "elapsed_seconds": elapsed,
+            "requests_per_second": iterations / elapsed if elapsed > 0 else 0.0
+        }
+    
+    legacy_rate = max(results["legacy"]["requests_per_second"], 1e-9)
+    results["speedup"] = results["compiled"]["requests_per_second"] / legacy_rate
+    results["cached_speedup"] = results["compiled_cached"]["requests_per_second"] / legacy_rate
+    results["mismatches"] = mismatches
+    results["cache"] = classifier.get_cache_stats()
+    return results
+
 if __name__ == "__main__":
-    asyncio.run(test_unified_intention_engine())
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        print(json.dumps(benchmark_intention_classifier(), indent=2, ensure_ascii=False))
+    else:
+        asyncio.run(test_unified_intention_engine())
 
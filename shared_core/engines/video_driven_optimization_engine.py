@@ -14,6 +14,7 @@ PowerAutomation v0.575 - 視頻驅動測試用例優化系統
 """
 
 import os
+import sys
 import cv2
 import json
 import time
@@ -21,15 +22,15 @@ import base64
 import hashlib
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple, Union
+from typing import Dict, List, Any, Optional, Tuple, Union, Iterator, Iterable, Callable
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
-import pickle
 from collections import defaultdict, deque
 import threading
 import asyncio
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 # 設置日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -70,10 +71,14 @@ class VideoFrame:
     frame_data: np.ndarray
     frame_hash: str
     annotations: List[Dict[str, Any]] = None
+    gray_data: Optional[np.ndarray] = None  # 降採樣後的灰度圖
+    scale: float = 1.0                      # 分析分辨率 / 原始分辨率
     
     def __post_init__(self):
         if self.annotations is None:
             self.annotations = []
+        if self.gray_data is None:
+            self.gray_data = cv2.cvtColor(self.frame_data, cv2.COLOR_BGR2GRAY)
 
 @dataclass
 class VideoEvent:
@@ -131,8 +136,21 @@ class VideoAnalysisResult:
 class VideoAnalysisEngine:
     """視頻分析引擎"""
     
-    def __init__(self):
+    # 分析結果緩存格式版本，檢測邏輯變化時遞增以失效舊緩存
+    CACHE_VERSION = 3
+    
+    def __init__(self, analysis_width: int = 640,
+                 max_workers: Optional[int] = None,
+                 segment_seconds: float = 30.0,
+                 cache_dir: Optional[str] = None,
+                 static_hash_threshold: int = 2):
         self.frame_cache = {}
+        self.analysis_width = analysis_width  # 分析用的最大寬度，超出則降採樣
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.segment_seconds = segment_seconds  # 單個並行片段的最短時長
+        self.cache_dir = Path(cache_dir) if cache_dir else None  # 顯式指定後才啟用分析緩存
+        self.static_hash_threshold = static_hash_threshold  # 感知哈希距離低於此值的相鄰幀視為靜止畫面
+        self._content_hash_memo: Dict[Tuple[str, int, int], str] = {}
         self.event_patterns = self._load_event_patterns()
         self.ui_element_detector = UIElementDetector()
         self.text_extractor = VideoTextExtractor()
@@ -162,8 +180,15 @@ class VideoAnalysisEngine:
             }
         }
     
-    def analyze_video(self, video_path: str, workflow_text: str = "") -> VideoAnalysisResult:
-        """分析視頻並提取事件"""
+    def analyze_video(self, video_path: str, workflow_text: str = "",
+                      event_callback: Optional[Callable[[VideoEvent], None]] = None,
+                      workers: Optional[int] = None,
+                      use_cache: bool = True) -> VideoAnalysisResult:
+        """分析視頻並提取事件
+        
+        長視頻按時間切分成片段在進程池中並行解碼；設置 cache_dir 時結果按內容哈希和分析參數緩存。
+        event_callback 會按時間順序對每個事件調用一次。
+        """
         logger.info(f"🎬 開始分析視頻: {video_path}")
         
         # 打開視頻文件
@@ -180,16 +205,47 @@ class VideoAnalysisEngine:
         
         logger.info(f"📊 視頻信息: {width}x{height}, {fps:.2f}fps, {total_duration:.2f}s, {frame_count}幀")
         
-        # 分析視頻幀
-        frames = self._extract_frames(cap, fps)
-        detected_events = self._detect_events(frames, fps)
+        cache_key = self._analysis_cache_key(video_path, fps) if use_cache and self.cache_dir else None
+        cached = self._load_cached_analysis(cache_key) if cache_key else None
+        
+        if cached is not None:
+            cap.release()
+            detected_events, sampled_frames = cached
+            logger.info(f"⚡ 命中分析緩存: {cache_key[:12]}")
+            if event_callback:
+                for event in detected_events:
+                    event_callback(event)
+        else:
+            workers = workers or self.max_workers
+            segments = self._plan_segments(frame_count, fps, workers)
+            
+            if len(segments) > 1:
+                cap.release()
+                detected_events, sampled_frames = self._analyze_segments_parallel(
+                    video_path, fps, segments, workers, event_callback)
+            else:
+                # 流式分析視頻幀：解碼、降採樣、滑動窗口比較，內存與視頻長度無關
+                frame_counter = {"sampled": 0}
+                detected_events = []
+                try:
+                    for event in self._iter_events(self._iter_frames(cap, fps, frame_counter)):
+                        detected_events.append(event)
+                        if event_callback:
+                            event_callback(event)
+                finally:
+                    cap.release()
+                sampled_frames = frame_counter["sampled"]
+            
+            if cache_key:
+                self._store_cached_analysis(cache_key, detected_events, sampled_frames)
+        
+        logger.info(f"📸 處理了 {sampled_frames} 個關鍵幀，檢測到 {len(detected_events)} 個事件")
+        
         workflow_steps = self._correlate_with_workflow(detected_events, workflow_text)
-        error_segments = self._detect_error_segments(frames, detected_events)
+        error_segments = self._detect_error_segments(detected_events)
         performance_metrics = self._calculate_performance_metrics(detected_events, total_duration)
         text_correlations = self._correlate_text_video(workflow_text, detected_events)
-        quality_score = self._calculate_video_quality(frames, detected_events)
-        
-        cap.release()
+        quality_score = self._calculate_video_quality(sampled_frames, detected_events)
         
         # 創建分析結果
         result = VideoAnalysisResult(
@@ -211,91 +267,270 @@ class VideoAnalysisEngine:
         logger.info(f"✅ 視頻分析完成，檢測到 {len(detected_events)} 個事件")
         return result
     
-    def _extract_frames(self, cap: cv2.VideoCapture, fps: float) -> List[VideoFrame]:
-        """提取關鍵幀"""
-        frames = []
-        frame_id = 0
-        
-        # 每秒提取2-4幀，根據fps調整
-        sample_rate = max(1, int(fps / 3))
-        
-        while True:
+    def _plan_segments(self, frame_count: int, fps: float, workers: int) -> List[Tuple[int, Optional[int]]]:
+        """把視頻切分成並行片段 [start, end]，相鄰片段共享邊界採樣幀"""
+        sample_rate = self._sample_rate(fps)
+        min_segment_frames = max(sample_rate, int(self.segment_seconds * fps)) if fps > 0 else 0
+        if workers <= 1 or frame_count <= 0 or min_segment_frames <= 0:
+            return [(0, None)]
+        
+        segment_count = min(workers * 2, frame_count // min_segment_frames)
+        if segment_count <= 1:
+            return [(0, None)]
+        
+        # 邊界對齊到採樣幀，保證並行與串行採樣到相同的幀
+        boundaries = [0]
+        for i in range(1, segment_count):
+            boundary = (frame_count * i // segment_count) // sample_rate * sample_rate
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        
+        segments = []
+        for i, start in enumerate(boundaries):
+            end = boundaries[i + 1] if i + 1 < len(boundaries) else None
+            segments.append((start, end))
+        return segments
+    
+    def _analyze_segments_parallel(self, video_path: str, fps: float,
+                                   segments: List[Tuple[int, Optional[int]]], workers: int,
+                                   event_callback: Optional[Callable[[VideoEvent], None]] = None
+                                   ) -> Tuple[List[VideoEvent], int]:
+        """在進程池中分析各片段並按時間順序合併事件"""
+        logger.info(f"🧩 分 {len(segments)} 個片段並行分析，進程數: {workers}")
+        
+        detected_events = []
+        seen_event_ids = set()
+        sampled_frames = 0
+        
+        with ProcessPoolExecutor(max_workers=min(workers, len(segments))) as executor:
+            futures = [
+                executor.submit(_analyze_video_segment, video_path, fps, start, end,
+                                self.analysis_width, self.static_hash_threshold)
+                for start, end in segments
+            ]
+            
+            # 按片段順序收集，保證事件按時間排列
+            for index, future in enumerate(futures):
+                segment_result = future.result()
+                # 除第一個片段外，起始幀是與上一片段共享的邊界幀
+                sampled_frames += segment_result["sampled_frames"] - (1 if index > 0 and segment_result["sampled_frames"] else 0)
+                
+                for event in segment_result["events"]:
+                    if event.event_id in seen_event_ids:
+                        continue
+                    seen_event_ids.add(event.event_id)
+                    detected_events.append(event)
+                    if event_callback:
+                        event_callback(event)
+        
+        detected_events.sort(key=lambda e: e.timestamp)
+        return detected_events, sampled_frames
+    
+    def _content_hash(self, video_path: str) -> str:
+        """計算視頻內容哈希（按路徑、大小和修改時間記憶）"""
+        stat = os.stat(video_path)
+        memo_key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+        if memo_key in self._content_hash_memo:
+            return self._content_hash_memo[memo_key]
+        
+        digest = hashlib.sha256()
+        with open(video_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        
+        content_hash = digest.hexdigest()
+        self._content_hash_memo[memo_key] = content_hash
+        return content_hash
+    
+    def _analysis_cache_key(self, video_path: str, fps: float) -> str:
+        """分析緩存鍵：內容哈希 + 影響結果的分析參數"""
+        params = {
+            "version": self.CACHE_VERSION,
+            "content": self._content_hash(video_path),
+            "analysis_width": self.analysis_width,
+            "static_hash_threshold": self.static_hash_threshold,
+            "sample_rate": self._sample_rate(fps),
+            "event_patterns": self.event_patterns
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    
+    @staticmethod
+    def _json_default(value: Any) -> Any:
+        """numpy 標量轉為 Python 原生類型，其他不可序列化的值直接報錯"""
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"無法序列化的類型: {type(value).__name__}")
+    
+    @staticmethod
+    def _event_to_dict(event: VideoEvent) -> Dict[str, Any]:
+        data = asdict(event)
+        data["event_type"] = event.event_type.value
+        return data
+    
+    @staticmethod
+    def _event_from_dict(data: Dict[str, Any]) -> VideoEvent:
+        data = dict(data)
+        data["event_type"] = VideoEventType(data["event_type"])
+        if data.get("coordinates") is not None:
+            data["coordinates"] = tuple(data["coordinates"])
+        return VideoEvent(**data)
+    
+    def _load_cached_analysis(self, cache_key: str) -> Optional[Tuple[List[VideoEvent], int]]:
+        """讀取緩存的檢測結果（JSON 格式，不反序列化任意對象）"""
+        cache_file = self.cache_dir / f"{cache_key}.json"
+        if not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            events = [self._event_from_dict(item) for item in cached["events"]]
+            return events, int(cached["sampled_frames"])
+        except Exception as e:
+            logger.warning(f"讀取分析緩存失敗: {e}")
+            return None
+    
+    def _store_cached_analysis(self, cache_key: str, events: List[VideoEvent], sampled_frames: int):
+        """原子寫入檢測結果緩存"""
+        try:
+            payload = json.dumps({
+                "events": [self._event_to_dict(event) for event in events],
+                "sampled_frames": sampled_frames
+            }, ensure_ascii=False, default=self._json_default)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            cache_file = self.cache_dir / f"{cache_key}.json"
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            logger.warning(f"寫入分析緩存失敗: {e}")
+    
+    @staticmethod
+    def _sample_rate(fps: float) -> int:
+        """每秒提取2-4幀，根據fps調整"""
+        return max(1, int(fps / 3))
+    
+    def _iter_frames(self, cap: cv2.VideoCapture, fps: float,
+                     counter: Optional[Dict[str, int]] = None,
+                     start_frame: int = 0, end_frame: Optional[int] = None) -> Iterator[VideoFrame]:
+        """逐幀產出降採樣後的關鍵幀（生成器），end_frame 為包含的結束幀"""
+        frame_id = start_frame
+        if start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        
+        sample_rate = self._sample_rate(fps)
+        
+        while end_frame is None or frame_id <= end_frame:
+            # 非採樣幀只抓取不解碼
+            if frame_id % sample_rate != 0:
+                if not cap.grab():
+                    break
+                frame_id += 1
+                continue
+            
             ret, frame = cap.read()
             if not ret:
                 break
             
-            if frame_id % sample_rate == 0:
-                timestamp = frame_id / fps
-                frame_hash = hashlib.md5(frame.tobytes()).hexdigest()[:16]
-                
-                video_frame = VideoFrame(
-                    frame_id=f"frame_{frame_id:06d}",
-                    timestamp=timestamp,
-                    frame_data=frame.copy(),
-                    frame_hash=frame_hash
-                )
-                frames.append(video_frame)
+            color, gray, scale = self._downsample_frame(frame)
+            video_frame = VideoFrame(
+                frame_id=f"frame_{frame_id:06d}",
+                timestamp=frame_id / fps if fps > 0 else 0.0,
+                frame_data=color,
+                frame_hash=self._perceptual_hash(gray),
+                gray_data=gray,
+                scale=scale
+            )
+            if counter is not None:
+                counter["sampled"] = counter.get("sampled", 0) + 1
+            yield video_frame
             
             frame_id += 1
-        
-        logger.info(f"📸 提取了 {len(frames)} 個關鍵幀")
-        return frames
     
-    def _detect_events(self, frames: List[VideoFrame], fps: float) -> List[VideoEvent]:
-        """檢測視頻事件"""
+    def _downsample_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+        """降採樣到分析分辨率並生成灰度圖"""
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if self.analysis_width and width > self.analysis_width:
+            scale = self.analysis_width / width
+            frame = cv2.resize(frame, (self.analysis_width, max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame, gray, scale
+    
+    def _perceptual_hash(self, gray: np.ndarray) -> str:
+        """計算64位差異哈希（dHash），相似畫面哈希相近"""
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return np.packbits(bits).tobytes().hex()
+    
+    @staticmethod
+    def hash_distance(hash_a: str, hash_b: str) -> int:
+        """兩個感知哈希之間的漢明距離"""
+        return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+    
+    def _iter_events(self, frames: Iterable[VideoFrame]) -> Iterator[VideoEvent]:
+        """以兩幀滑動窗口檢測視頻事件，邊解碼邊產出（按時間順序）"""
+        prev_frame = None
+        
+        for curr_frame in frames:
+            if prev_frame is not None and not self._is_static_pair(prev_frame, curr_frame):
+                yield from self._detect_frame_pair_events(prev_frame, curr_frame)
+            prev_frame = curr_frame
+    
+    def _is_static_pair(self, prev_frame: VideoFrame, curr_frame: VideoFrame) -> bool:
+        """畫面幾乎不變的相鄰幀，跳過OCR和輪廓等昂貴的事件檢測"""
+        if self.hash_distance(prev_frame.frame_hash, curr_frame.frame_hash) >= self.static_hash_threshold:
+            return False
+        # dHash 只有 8x9 分辨率，再確認沒有達到最小點擊面積的像素變化
+        changed = np.count_nonzero(cv2.absdiff(prev_frame.gray_data, curr_frame.gray_data) > 30)
+        return changed <= 100 * curr_frame.scale * curr_frame.scale
+    
+    def _detect_frame_pair_events(self, prev_frame: VideoFrame, curr_frame: VideoFrame) -> List[VideoEvent]:
+        """檢測相鄰兩幀之間的事件"""
         events = []
         
-        for i in range(1, len(frames)):
-            prev_frame = frames[i-1]
-            curr_frame = frames[i]
-            
-            # 檢測點擊事件
-            click_events = self._detect_click_events(prev_frame, curr_frame)
-            events.extend(click_events)
-            
-            # 檢測輸入事件
-            input_events = self._detect_input_events(prev_frame, curr_frame)
-            events.extend(input_events)
-            
-            # 檢測滾動事件
-            scroll_events = self._detect_scroll_events(prev_frame, curr_frame)
-            events.extend(scroll_events)
-            
-            # 檢測錯誤事件
-            error_events = self._detect_error_events(prev_frame, curr_frame)
-            events.extend(error_events)
-            
-            # 檢測導航事件
-            nav_events = self._detect_navigation_events(prev_frame, curr_frame)
-            events.extend(nav_events)
+        # 檢測點擊事件
+        events.extend(self._detect_click_events(prev_frame, curr_frame))
+        
+        # 檢測輸入事件
+        events.extend(self._detect_input_events(prev_frame, curr_frame))
+        
+        # 檢測滾動事件
+        events.extend(self._detect_scroll_events(prev_frame, curr_frame))
+        
+        # 檢測錯誤事件
+        events.extend(self._detect_error_events(prev_frame, curr_frame))
         
-        # 按時間排序事件
-        events.sort(key=lambda e: e.timestamp)
+        # 檢測導航事件
+        events.extend(self._detect_navigation_events(prev_frame, curr_frame))
         
-        logger.info(f"🔍 檢測到 {len(events)} 個事件")
         return events
     
     def _detect_click_events(self, prev_frame: VideoFrame, curr_frame: VideoFrame) -> List[VideoEvent]:
         """檢測點擊事件"""
         events = []
         
-        # 計算幀差異
-        diff = cv2.absdiff(prev_frame.frame_data, curr_frame.frame_data)
-        gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
+        # 計算幀差異（灰度）
+        gray_diff = cv2.absdiff(prev_frame.gray_data, curr_frame.gray_data)
         
         # 查找顯著變化區域
         _, thresh = cv2.threshold(gray_diff, 30, 255, cv2.THRESH_BINARY)
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
+        area_scale = curr_frame.scale * curr_frame.scale
         for contour in contours:
-            area = cv2.contourArea(contour)
+            # 面積換算回原始分辨率
+            area = cv2.contourArea(contour) / area_scale
             if 100 < area < 5000:  # 點擊區域大小範圍
                 # 獲取邊界框
                 x, y, w, h = cv2.boundingRect(contour)
-                center_x, center_y = x + w//2, y + h//2
                 
                 # 檢查是否為點擊模式
-                if self._is_click_pattern(prev_frame.frame_data, curr_frame.frame_data, (center_x, center_y)):
+                if self._is_click_pattern(prev_frame.gray_data, curr_frame.gray_data,
+                                          (x + w//2, y + h//2), curr_frame.scale):
+                    center_x = int((x + w/2) / curr_frame.scale)
+                    center_y = int((y + h/2) / curr_frame.scale)
                     event = VideoEvent(
                         event_id=f"click_{curr_frame.frame_id}_{center_x}_{center_y}",
                         event_type=VideoEventType.CLICK,
@@ -342,8 +577,8 @@ class VideoAnalysisEngine:
         events = []
         
         # 檢測垂直內容移動
-        prev_gray = cv2.cvtColor(prev_frame.frame_data, cv2.COLOR_BGR2GRAY)
-        curr_gray = cv2.cvtColor(curr_frame.frame_data, cv2.COLOR_BGR2GRAY)
+        prev_gray = prev_frame.gray_data
+        curr_gray = curr_frame.gray_data
         
         # 使用光流檢測運動
         flow = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, None, None)
@@ -372,14 +607,14 @@ class VideoAnalysisEngine:
         events = []
         
         # 檢測錯誤顏色特徵
-        error_regions = self._detect_error_colors(curr_frame.frame_data)
+        error_regions = self._detect_error_colors(curr_frame.frame_data, curr_frame.scale)
         
         # 檢測錯誤文本
         frame_text = self.text_extractor.extract_text(curr_frame.frame_data)
         error_texts = self._detect_error_text(frame_text)
         
         # 檢測彈窗
-        popup_detected = self._detect_popup(prev_frame.frame_data, curr_frame.frame_data)
+        popup_detected = self._detect_popup(prev_frame.gray_data, curr_frame.gray_data, curr_frame.scale)
         
         if error_regions or error_texts or popup_detected:
             event = VideoEvent(
@@ -425,12 +660,12 @@ class VideoAnalysisEngine:
         return events
     
     def _is_click_pattern(self, prev_frame: np.ndarray, curr_frame: np.ndarray, 
-                         coordinates: Tuple[int, int]) -> bool:
+                         coordinates: Tuple[int, int], scale: float = 1.0) -> bool:
         """判斷是否為點擊模式"""
         x, y = coordinates
         
         # 檢查點擊區域的顏色變化
-        region_size = 20
+        region_size = max(2, int(20 * scale))
         x1, y1 = max(0, x-region_size), max(0, y-region_size)
         x2, y2 = min(prev_frame.shape[1], x+region_size), min(prev_frame.shape[0], y+region_size)
         
@@ -484,7 +719,7 @@ class VideoAnalysisEngine:
         # 簡化版本：返回隨機值模擬
         return np.random.uniform(-50, 50)
     
-    def _detect_error_colors(self, frame: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_error_colors(self, frame: np.ndarray, scale: float = 1.0) -> List[Dict[str, Any]]:
         """檢測錯誤顏色"""
         error_regions = []
         
@@ -503,14 +738,15 @@ class VideoAnalysisEngine:
         
         contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
+        area_scale = scale * scale
         for contour in contours:
-            area = cv2.contourArea(contour)
+            area = cv2.contourArea(contour) / area_scale
             if area > 100:  # 最小錯誤區域大小
                 x, y, w, h = cv2.boundingRect(contour)
                 error_regions.append({
                     "color": "red",
                     "area": area,
-                    "bbox": (x, y, w, h)
+                    "bbox": tuple(int(v / scale) for v in (x, y, w, h))
                 })
         
         return error_regions
@@ -531,17 +767,17 @@ class VideoAnalysisEngine:
         
         return found_errors
     
-    def _detect_popup(self, prev_frame: np.ndarray, curr_frame: np.ndarray) -> bool:
+    def _detect_popup(self, prev_gray: np.ndarray, curr_gray: np.ndarray, scale: float = 1.0) -> bool:
         """檢測彈窗"""
         # 簡單的彈窗檢測：檢查是否有新的矩形區域出現
-        diff = cv2.absdiff(prev_frame, curr_frame)
-        gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
+        gray_diff = cv2.absdiff(prev_gray, curr_gray)
         
         _, thresh = cv2.threshold(gray_diff, 50, 255, cv2.THRESH_BINARY)
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
+        area_scale = scale * scale
         for contour in contours:
-            area = cv2.contourArea(contour)
+            area = cv2.contourArea(contour) / area_scale
             if area > 10000:  # 彈窗最小大小
                 # 檢查是否為矩形
                 epsilon = 0.02 * cv2.arcLength(contour, True)
@@ -587,7 +823,7 @@ class VideoAnalysisEngine:
         
         return steps
     
-    def _detect_error_segments(self, frames: List[VideoFrame], events: List[VideoEvent]) -> List[Dict[str, Any]]:
+    def _detect_error_segments(self, events: List[VideoEvent]) -> List[Dict[str, Any]]:
         """檢測錯誤片段"""
         error_segments = []
         
@@ -642,12 +878,12 @@ class VideoAnalysisEngine:
         
         return correlations
     
-    def _calculate_video_quality(self, frames: List[VideoFrame], events: List[VideoEvent]) -> float:
+    def _calculate_video_quality(self, sampled_frames: int, events: List[VideoEvent]) -> float:
         """計算視頻質量評分"""
         quality_score = 0.0
         
         # 基於幀數量評分 (30%)
-        frame_score = min(len(frames) / 100, 1.0)  # 100幀為滿分
+        frame_score = min(sampled_frames / 100, 1.0)  # 100幀為滿分
         quality_score += frame_score * 0.3
         
         # 基於事件檢測評分 (40%)
@@ -662,6 +898,31 @@ class VideoAnalysisEngine:
         
         return min(quality_score, 1.0)
 
+_segment_engine = None
+
+def _analyze_video_segment(video_path: str, fps: float, start_frame: int,
+                           end_frame: Optional[int], analysis_width: int,
+                           static_hash_threshold: int) -> Dict[str, Any]:
+    """進程池工作函數：定位到片段起點並流式檢測片段內事件"""
+    global _segment_engine
+    if (_segment_engine is None or _segment_engine.analysis_width != analysis_width
+            or _segment_engine.static_hash_threshold != static_hash_threshold):
+        _segment_engine = VideoAnalysisEngine(analysis_width=analysis_width, max_workers=1, cache_dir=None,
+                                              static_hash_threshold=static_hash_threshold)
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"無法打開視頻文件: {video_path}")
+    
+    counter = {"sampled": 0}
+    try:
+        frames = _segment_engine._iter_frames(cap, fps, counter, start_frame, end_frame)
+        events = list(_segment_engine._iter_events(frames))
+    finally:
+        cap.release()
+    
+    return {"events": events, "sampled_frames": counter["sampled"]}
+
 class UIElementDetector:
     """UI元素檢測器"""
     
@@ -1182,6 +1443,94 @@ def test_video_driven_optimization():
         "patterns": patterns
     }
 
+def generate_synthetic_video(video_path: str, duration: float = 60.0, fps: float = 30.0,
+                             resolution: Tuple[int, int] = (1280, 720)) -> str:
+    """用OpenCV生成帶移動方塊、彈窗和紅色錯誤區域的合成錄屏"""
+    width, height = resolution
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise ValueError(f"無法創建視頻文件: {video_path}")
+    
+    rng = np.random.default_rng(42)
+    total_frames = int(duration * fps)
+    for i in range(total_frames):
+        frame = np.full((height, width, 3), 235, dtype=np.uint8)
+        cv2.rectangle(frame, (0, 0), (width, 40), (60, 60, 60), -1)
+        
+        # 模擬光標點擊
+        x = int((i * 7) % (width - 40))
+        y = int(80 + (i * 3) % (height - 160))
+        cv2.rectangle(frame, (x, y), (x + 30, y + 30), (200, 120, 40), -1)
+        
+        # 每10秒出現一次彈窗，每15秒出現一次錯誤提示
+        second = i / fps
+        if int(second) % 10 == 5:
+            cv2.rectangle(frame, (width // 4, height // 4), (3 * width // 4, 3 * height // 4), (255, 255, 255), -1)
+        if int(second) % 15 == 7:
+            cv2.rectangle(frame, (20, height - 80), (320, height - 30), (0, 0, 255), -1)
+        
+        noise = rng.integers(0, 4, size=(height, width, 1), dtype=np.uint8)
+        writer.write(cv2.add(frame, noise.repeat(3, axis=2)))
+    
+    writer.release()
+    return video_path
+
+def benchmark_video_analysis(durations: Tuple[float, ...] = (30.0, 120.0),
+                             resolution: Tuple[int, int] = (1280, 720),
+                             workers: Optional[int] = None,
+                             work_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """對比串行、並行片段和緩存命中三種模式的分析耗時"""
+    import tempfile
+    import shutil
+    
+    work_dir = work_dir or tempfile.mkdtemp(prefix="video_bench_")
+    workers = workers or os.cpu_count() or 1
+    results = []
+    
+    try:
+        for duration in durations:
+            video_path = os.path.join(work_dir, f"synthetic_{int(duration)}s.mp4")
+            generate_synthetic_video(video_path, duration=duration, resolution=resolution)
+            cache_dir = os.path.join(work_dir, "cache")
+            
+            serial_engine = VideoAnalysisEngine(max_workers=1, cache_dir=None)
+            start = time.perf_counter()
+            serial_result = serial_engine.analyze_video(video_path)
+            serial_time = time.perf_counter() - start
+            
+            parallel_engine = VideoAnalysisEngine(max_workers=workers, segment_seconds=10.0, cache_dir=cache_dir)
+            start = time.perf_counter()
+            parallel_result = parallel_engine.analyze_video(video_path)
+            parallel_time = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            parallel_engine.analyze_video(video_path)
+            cached_time = time.perf_counter() - start
+            
+            results.append({
+                "duration_seconds": duration,
+                "resolution": resolution,
+                "workers": workers,
+                "serial_seconds": serial_time,
+                "parallel_seconds": parallel_time,
+                "cached_seconds": cached_time,
+                "speedup": serial_time / parallel_time if parallel_time > 0 else 0,
+                "serial_events": len(serial_result.detected_events),
+                "parallel_events": len(parallel_result.detected_events)
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    for row in results:
+        print(f"⏱️ {row['duration_seconds']:.0f}s {row['resolution'][0]}x{row['resolution'][1]}: "
+              f"串行 {row['serial_seconds']:.2f}s, 並行({row['workers']}) {row['parallel_seconds']:.2f}s "
+              f"(x{row['speedup']:.1f}), 緩存 {row['cached_seconds'] * 1000:.1f}ms")
+    
+    return results
+
 if __name__ == "__main__":
-    test_video_driven_optimization()
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark_video_analysis()
+    else:
+        test_video_driven_optimization()
 
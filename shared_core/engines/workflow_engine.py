@@ -2,10 +2,14 @@
 
 import asyncio
 import json
+import os
+import hashlib
 import logging
+from collections import ChainMap
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Mapping
+from dataclasses import dataclass, asdict, field
 from enum import Enum
 import uuid
 
@@ -49,6 +53,7 @@ class WorkflowNode:
     input_data: Dict[str, Any] = None
     output_data: Dict[str, Any] = None
     error_message: Optional[str] = None
+    depends_on: List[str] = field(default_factory=list)  # 依賴的節點ID
     
     def __post_init__(self):
         if self.input_data is None:
@@ -68,6 +73,82 @@ class WorkflowExecution:
     total_duration: Optional[float] = None
     success_rate: float = 0.0
 
+# 節點類型之間的默認依賴關係（監控配置只依賴架構設計，可與編碼/測試/部署並行）
+NODE_DEPENDENCIES: Dict[WorkflowNodeType, List[WorkflowNodeType]] = {
+    WorkflowNodeType.REQUIREMENT_ANALYSIS: [],
+    WorkflowNodeType.ARCHITECTURE_DESIGN: [WorkflowNodeType.REQUIREMENT_ANALYSIS],
+    WorkflowNodeType.CODE_IMPLEMENTATION: [WorkflowNodeType.ARCHITECTURE_DESIGN],
+    WorkflowNodeType.TEST_VERIFICATION: [WorkflowNodeType.CODE_IMPLEMENTATION],
+    WorkflowNodeType.DEPLOYMENT_RELEASE: [WorkflowNodeType.TEST_VERIFICATION],
+    WorkflowNodeType.MONITORING_OPERATIONS: [WorkflowNodeType.ARCHITECTURE_DESIGN]
+}
+
+class WorkflowCheckpointStore:
+    """工作流檢查點存儲 - 每個檢查點鍵一個JSON文件，記錄已完成節點的輸出
+    
+    檢查點鍵由工作流定義和輸入數據決定（見 WorkflowEngine._checkpoint_key），
+    重啟後重新創建的同一工作流可以找到之前的檢查點。
+    checkpoint_dir 為 None 時不落盤，檢查點只保存在內存中，僅在當前進程內可恢復。
+    """
+    
+    def __init__(self, checkpoint_dir: Optional[str] = None):
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        self._memory: Dict[str, str] = {}
+    
+    def _path(self, checkpoint_key: str) -> Path:
+        return self.checkpoint_dir / f"{checkpoint_key}.json"
+    
+    def load(self, checkpoint_key: str, input_fingerprint: str) -> Dict[str, Dict[str, Any]]:
+        """讀取已完成節點；輸入數據變化時檢查點失效"""
+        if self.checkpoint_dir is None:
+            payload = self._memory.get(checkpoint_key)
+            checkpoint = json.loads(payload) if payload else {}
+        else:
+            path = self._path(checkpoint_key)
+            if not path.exists():
+                return {}
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    checkpoint = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ 無法讀取檢查點 {path}: {e}")
+                return {}
+        if checkpoint.get("input_fingerprint") != input_fingerprint:
+            return {}
+        return checkpoint.get("completed_nodes", {})
+    
+    def save(self, checkpoint_key: str, input_fingerprint: str, completed_nodes: Dict[str, Dict[str, Any]]):
+        """原子寫入檢查點
+        
+        節點輸出無法序列化為JSON時拋出 TypeError/ValueError，不寫入任何內容；寫盤失敗拋出 OSError。
+        """
+        payload = json.dumps({
+            "checkpoint_key": checkpoint_key,
+            "input_fingerprint": input_fingerprint,
+            "updated_at": datetime.now().isoformat(),
+            "completed_nodes": completed_nodes
+        }, ensure_ascii=False)
+        
+        if self.checkpoint_dir is None:
+            self._memory[checkpoint_key] = payload
+            return
+        
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(checkpoint_key)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    
+    def clear(self, checkpoint_key: str):
+        """刪除檢查點"""
+        self._memory.pop(checkpoint_key, None)
+        if self.checkpoint_dir is None:
+            return
+        path = self._path(checkpoint_key)
+        if path.exists():
+            path.unlink()
+
 class AutomationFramework:
     """自動化框架 - 負責編碼實現節點"""
     
@@ -179,11 +260,15 @@ class ReleaseManager:
 class WorkflowEngine:
     """工作流引擎 - 統一管理六個節點"""
     
-    def __init__(self, edition: EditionType = EditionType.PERSONAL_PRO):
+    def __init__(self, edition: EditionType = EditionType.PERSONAL_PRO,
+                 max_concurrency: int = 4,
+                 checkpoint_store: Optional[WorkflowCheckpointStore] = None):
         self.edition = edition
         self.automation_framework = AutomationFramework()
         self.intelligent_intervention = IntelligentIntervention()
         self.release_manager = ReleaseManager()
+        self.max_concurrency = max_concurrency
+        self.checkpoint_store = checkpoint_store or WorkflowCheckpointStore()
         
         # 根據版本配置可用節點
         self.available_nodes = self._get_available_nodes()
@@ -211,18 +296,32 @@ class WorkflowEngine:
             # 開源版：基礎功能
             return [WorkflowNodeType.CODE_IMPLEMENTATION]
     
+    def _resolve_dependency_types(self, node_type: WorkflowNodeType) -> List[WorkflowNodeType]:
+        """解析節點在當前版本中的依賴；不可用的依賴節點替換為它自身的依賴"""
+        resolved = []
+        for dependency in NODE_DEPENDENCIES.get(node_type, []):
+            if dependency in self.available_nodes:
+                candidates = [dependency]
+            else:
+                candidates = self._resolve_dependency_types(dependency)
+            resolved.extend(c for c in candidates if c not in resolved)
+        return resolved
+    
     def create_workflow(self, project_name: str) -> WorkflowExecution:
         """創建工作流"""
         workflow_id = str(uuid.uuid4())
         nodes = []
+        node_ids: Dict[WorkflowNodeType, str] = {}
         
         for node_type in self.available_nodes:
             node = WorkflowNode(
                 id=str(uuid.uuid4()),
                 type=node_type,
                 name=self._get_node_name(node_type),
-                description=self._get_node_description(node_type)
+                description=self._get_node_description(node_type),
+                depends_on=[node_ids[dep] for dep in self._resolve_dependency_types(node_type) if dep in node_ids]
             )
+            node_ids[node_type] = node.id
             nodes.append(node)
         
         workflow = WorkflowExecution(
@@ -236,66 +335,197 @@ class WorkflowEngine:
         
         return workflow
     
-    async def execute_workflow(self, workflow: WorkflowExecution, input_data: Dict[str, Any]) -> WorkflowExecution:
-        """執行工作流"""
+    @staticmethod
+    def _input_fingerprint(input_data: Dict[str, Any]) -> str:
+        """輸入數據指紋，用於判斷檢查點是否仍然有效"""
+        return hashlib.sha256(json.dumps(input_data, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+    
+    @staticmethod
+    def _node_key(node: WorkflowNode) -> str:
+        """節點在檢查點中的穩定鍵（節點ID每次創建都不同，不能用於恢復）"""
+        return f"{node.type.value}:{node.name}"
+    
+    def _checkpoint_key(self, workflow: WorkflowExecution, input_fingerprint: str) -> str:
+        """檢查點鍵：工作流定義（版本、節點及其依賴）+ 輸入指紋，與運行時生成的ID無關"""
+        node_keys = {node.id: self._node_key(node) for node in workflow.nodes}
+        if len(set(node_keys.values())) != len(node_keys):
+            raise ValueError("工作流存在同類型同名節點，無法建立檢查點")
+        definition = {
+            "edition": workflow.edition.value,
+            "nodes": sorted([node_keys[node.id], sorted(node_keys[dep] for dep in node.depends_on)]
+                            for node in workflow.nodes),
+            "input_fingerprint": input_fingerprint
+        }
+        return hashlib.sha256(json.dumps(definition, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    
+    @staticmethod
+    def _topological_order(workflow: WorkflowExecution) -> List[WorkflowNode]:
+        """按依賴關係排序節點（同層保持聲明順序），存在環或未知依賴時拋出異常"""
+        nodes_by_id = {node.id: node for node in workflow.nodes}
+        for node in workflow.nodes:
+            unknown = [dep for dep in node.depends_on if dep not in nodes_by_id]
+            if unknown:
+                raise ValueError(f"節點 {node.name} 依賴未知節點: {unknown}")
+        
+        ordered, placed = [], set()
+        while len(ordered) < len(workflow.nodes):
+            ready = [n for n in workflow.nodes if n.id not in placed and all(d in placed for d in n.depends_on)]
+            if not ready:
+                raise ValueError("工作流依賴存在環")
+            for node in ready:
+                ordered.append(node)
+                placed.add(node.id)
+        return ordered
+    
+    def _build_node_input(self, node: WorkflowNode, nodes_by_id: Dict[str, WorkflowNode],
+                          order_index: Dict[str, int], input_data: Dict[str, Any]) -> Mapping[str, Any]:
+        """構造節點輸入：按引用疊加所有祖先節點的輸出（越近的祖先優先），不做拷貝"""
+        ancestors, stack = set(), list(node.depends_on)
+        while stack:
+            ancestor_id = stack.pop()
+            if ancestor_id not in ancestors:
+                ancestors.add(ancestor_id)
+                stack.extend(nodes_by_id[ancestor_id].depends_on)
+        
+        ordered_ancestors = sorted(ancestors, key=lambda node_id: order_index[node_id], reverse=True)
+        # 第一層是節點自己的空字典，節點處理器的寫入不會污染上游輸出
+        return ChainMap({}, *[nodes_by_id[a].output_data for a in ordered_ancestors], input_data)
+    
+    async def _run_node(self, node: WorkflowNode) -> Dict[str, Any]:
+        """根據節點類型執行相應邏輯"""
+        if node.type == WorkflowNodeType.CODE_IMPLEMENTATION:
+            return await self.automation_framework.generate_code(node.input_data)
+        elif node.type == WorkflowNodeType.TEST_VERIFICATION:
+            return await self.intelligent_intervention.run_quality_assurance(node.input_data)
+        elif node.type == WorkflowNodeType.DEPLOYMENT_RELEASE:
+            return await self.release_manager.deploy_and_manage(node.input_data)
+        else:
+            # 其他節點的模擬實現
+            return await self._execute_generic_node(node.type, node.input_data)
+    
+    async def execute_workflow(self, workflow: WorkflowExecution, input_data: Dict[str, Any],
+                               resume: bool = True) -> WorkflowExecution:
+        """按依賴DAG執行工作流
+        
+        互不依賴的分支在 max_concurrency 限制下並發執行；每個完成的節點寫入檢查點，
+        失敗後以相同定義的工作流（包括重啟後重新創建的）和相同輸入再次執行時從檢查點恢復，
+        只重跑未完成的節點。節點輸出必須可以序列化為JSON，否則該節點視為失敗。
+        """
         logger.info(f"🚀 開始執行工作流: {workflow.id}")
         
         workflow.status = NodeStatus.RUNNING
         workflow.start_time = datetime.now()
+        running: Dict[asyncio.Task, WorkflowNode] = {}
         
         try:
-            current_data = input_data.copy()
+            ordered_nodes = self._topological_order(workflow)
+            nodes_by_id = {node.id: node for node in workflow.nodes}
+            order_index = {node.id: i for i, node in enumerate(ordered_nodes)}
+            fingerprint = self._input_fingerprint(input_data)
+            checkpoint_key = self._checkpoint_key(workflow, fingerprint)
             
+            # 從檢查點恢復已完成節點（按節點穩定鍵）
+            completed = self.checkpoint_store.load(checkpoint_key, fingerprint) if resume else {}
             for node in workflow.nodes:
-                logger.info(f"📍 執行節點: {node.name}")
-                node.status = NodeStatus.RUNNING
-                node.start_time = datetime.now()
-                node.input_data = current_data.copy()
-                
-                try:
-                    # 根據節點類型執行相應邏輯
-                    if node.type == WorkflowNodeType.CODE_IMPLEMENTATION:
-                        result = await self.automation_framework.generate_code(current_data)
-                    elif node.type == WorkflowNodeType.TEST_VERIFICATION:
-                        result = await self.intelligent_intervention.run_quality_assurance(current_data)
-                    elif node.type == WorkflowNodeType.DEPLOYMENT_RELEASE:
-                        result = await self.release_manager.deploy_and_manage(current_data)
-                    else:
-                        # 其他節點的模擬實現
-                        result = await self._execute_generic_node(node.type, current_data)
-                    
-                    node.output_data = result
+                record = completed.get(self._node_key(node))
+                if record is not None:
+                    node.output_data = record["output_data"]
                     node.status = NodeStatus.COMPLETED
+                    node.error_message = None
+                    node.start_time = datetime.fromisoformat(record["start_time"])
+                    node.end_time = datetime.fromisoformat(record["end_time"])
+                else:
+                    node.status = NodeStatus.PENDING
+                    node.error_message = None
+            if completed:
+                logger.info(f"♻️ 從檢查點恢復 {len(completed)} 個已完成節點")
+            
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            
+            async def run(node: WorkflowNode):
+                async with semaphore:
+                    logger.info(f"📍 執行節點: {node.name}")
+                    node.status = NodeStatus.RUNNING
+                    node.start_time = datetime.now()
+                    node.input_data = self._build_node_input(node, nodes_by_id, order_index, input_data)
+                    node.output_data = await self._run_node(node)
+            
+            def launch_ready():
+                for node in ordered_nodes:
+                    if node.status != NodeStatus.PENDING or node in running.values():
+                        continue
+                    dependency_status = [nodes_by_id[dep].status for dep in node.depends_on]
+                    if any(status in (NodeStatus.FAILED, NodeStatus.SKIPPED) for status in dependency_status):
+                        node.status = NodeStatus.SKIPPED
+                        logger.warning(f"⏭️ 跳過節點（上游失敗）: {node.name}")
+                    elif all(status == NodeStatus.COMPLETED for status in dependency_status):
+                        running[asyncio.create_task(run(node))] = node
+            
+            launch_ready()
+            while running:
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node = running.pop(task)
                     node.end_time = datetime.now()
+                    error = task.exception()
+                    if error is not None:
+                        node.status = NodeStatus.FAILED
+                        node.error_message = str(error)
+                        logger.error(f"❌ 節點執行失敗: {node.name} - {error}")
+                        continue
                     
-                    # 將輸出作為下一個節點的輸入
-                    current_data.update(result)
-                    
-                except Exception as e:
-                    node.status = NodeStatus.FAILED
-                    node.error_message = str(e)
-                    node.end_time = datetime.now()
-                    logger.error(f"❌ 節點執行失敗: {node.name} - {e}")
-                    break
+                    node_key = self._node_key(node)
+                    completed[node_key] = {
+                        "output_data": node.output_data,
+                        "start_time": node.start_time.isoformat(),
+                        "end_time": node.end_time.isoformat()
+                    }
+                    try:
+                        self.checkpoint_store.save(checkpoint_key, fingerprint, completed)
+                    except (TypeError, ValueError) as e:
+                        # 輸出無法持久化時不能悄悄轉成字符串，否則恢復後下游拿到的數據與首次執行不同
+                        completed.pop(node_key)
+                        node.status = NodeStatus.FAILED
+                        node.error_message = f"節點輸出無法序列化為JSON檢查點: {e}"
+                        logger.error(f"❌ 節點輸出無法寫入檢查點: {node.name} - {e}")
+                        continue
+                    except OSError as e:
+                        # 寫盤失敗只影響恢復能力，節點本身已成功
+                        logger.warning(f"⚠️ 檢查點寫入失敗，本次執行無法從該節點恢復: {node.name} - {e}")
+                    node.status = NodeStatus.COMPLETED
+                launch_ready()
             
             # 計算執行結果
             workflow.end_time = datetime.now()
             workflow.total_duration = (workflow.end_time - workflow.start_time).total_seconds()
             
             completed_nodes = sum(1 for node in workflow.nodes if node.status == NodeStatus.COMPLETED)
-            workflow.success_rate = completed_nodes / len(workflow.nodes) * 100
+            workflow.success_rate = completed_nodes / len(workflow.nodes) * 100 if workflow.nodes else 100
             
             if workflow.success_rate == 100:
                 workflow.status = NodeStatus.COMPLETED
+                try:
+                    self.checkpoint_store.clear(checkpoint_key)
+                except OSError as e:
+                    logger.warning(f"⚠️ 檢查點刪除失敗: {e}")
                 logger.info(f"✅ 工作流執行完成: {workflow.id}")
             else:
                 workflow.status = NodeStatus.FAILED
-                logger.warning(f"⚠️ 工作流部分失敗: {workflow.id}")
+                logger.warning(f"⚠️ 工作流部分失敗: {workflow.id}（已保存檢查點，可重新執行以恢復）")
                 
         except Exception as e:
             workflow.status = NodeStatus.FAILED
             workflow.end_time = datetime.now()
             logger.error(f"❌ 工作流執行失敗: {e}")
+        finally:
+            # 異常或被取消時不留下仍在運行的節點任務
+            if running:
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+                for node in running.values():
+                    node.status = NodeStatus.FAILED
+                    node.error_message = node.error_message or "工作流中止，節點被取消"
         
         return workflow
     
@@ -361,6 +591,7 @@ class WorkflowEngine:
                     "name": node.name,
                     "type": node.type.value,
                     "status": node.status.value,
+                    "depends_on": [n.name for n in workflow.nodes if n.id in node.depends_on],
                     "duration": (node.end_time - node.start_time).total_seconds() if node.start_time and node.end_time else None
                 }
                 for node in workflow.nodes
@@ -2,13 +2,19 @@
 """
 修復的事件循環管理器
 解決異步事件循環問題
+
+每個進程只維護一個常駐的後台事件循環線程，同步代碼通過
+run_coroutine_threadsafe 提交協程，適配器可在該循環上共享
+連接池等長生命週期的客戶端。
 """
 
 import asyncio
+import concurrent.futures
+import inspect
 import logging
 import threading
-from typing import Optional, Any, Callable
-from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import Optional, Any, Callable, Dict, Awaitable
 
 logger = logging.getLogger(__name__)
 
@@ -19,73 +25,182 @@ class FixedEventLoopManager:
     _lock = threading.Lock()
     _loop = None
     _thread = None
-    _executor = None
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
         return cls._instance
     
-    def __init__(self):
+    def __init__(self, default_timeout: float = 30.0):
         if hasattr(self, '_initialized'):
             return
         
         self._initialized = True
-        self._executor = ThreadPoolExecutor(max_workers=4)
+        self.default_timeout = default_timeout
+        self._start_lock = threading.Lock()
+        self._resources: Dict[str, Any] = {}
+        self._resource_locks: Dict[str, asyncio.Lock] = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "cancelled": 0
+        }
         logger.info("事件循環管理器初始化完成")
     
-    def get_or_create_loop(self) -> asyncio.AbstractEventLoop:
-        """獲取或創建事件循環"""
-        try:
-            # 嘗試獲取當前線程的事件循環
-            loop = asyncio.get_running_loop()
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """確保後台事件循環線程已啟動"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed() and self._thread is not None and self._thread.is_alive():
             return loop
-        except RuntimeError:
-            # 沒有運行中的事件循環，創建新的
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_closed():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                return loop
-            except RuntimeError:
-                # 創建新的事件循環
-                loop = asyncio.new_event_loop()
+        
+        with self._start_lock:
+            if self._loop is not None and not self._loop.is_closed() and self._thread.is_alive():
+                return self._loop
+            
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            
+            def run_loop():
                 asyncio.set_event_loop(loop)
-                return loop
+                loop.call_soon(started.set)
+                loop.run_forever()
+            
+            thread = threading.Thread(target=run_loop, name="FixedEventLoop", daemon=True)
+            thread.start()
+            started.wait()
+            self._loop = loop
+            self._thread = thread
+            logger.info("後台事件循環已啟動")
+            return loop
+    
+    def get_or_create_loop(self) -> asyncio.AbstractEventLoop:
+        """獲取共享的後台事件循環"""
+        return self._ensure_loop()
+    
+    def in_loop_thread(self) -> bool:
+        """當前是否運行在後台事件循環線程中"""
+        return self._thread is not None and threading.get_ident() == self._thread.ident
+    
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+    
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """提交協程到後台循環，立即返回 concurrent.futures.Future"""
+        loop = self._ensure_loop()
+        self._count("submitted")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+    
+    def run_coroutine(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """同步等待協程結果，超時時取消協程並拋出 concurrent.futures.TimeoutError"""
+        if self.in_loop_thread():
+            # 在循環線程內阻塞等待會造成死鎖
+            if inspect.iscoroutine(coro):
+                coro.close()
+            raise RuntimeError("不能在後台事件循環線程內同步等待協程，請直接 await")
+        
+        future = self.submit(coro)
+        try:
+            result = future.result(timeout=timeout if timeout is not None else self.default_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._count("timeouts")
+            raise
+        except concurrent.futures.CancelledError:
+            self._count("cancelled")
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+        self._count("completed")
+        return result
     
     def run_async_function(self, coro_func: Callable, *args, **kwargs) -> Any:
         """在事件循環中運行異步函數"""
         try:
-            loop = self.get_or_create_loop()
-            
-            # 如果循環正在運行，使用線程池執行
-            if loop.is_running():
-                future = self._executor.submit(self._run_in_new_loop, coro_func, *args, **kwargs)
-                return future.result(timeout=30)
-            else:
-                # 循環未運行，直接運行
-                return loop.run_until_complete(coro_func(*args, **kwargs))
-                
+            return self.run_coroutine(coro_func(*args, **kwargs))
+        except concurrent.futures.TimeoutError:
+            logger.error(f"運行異步函數超時: {getattr(coro_func, '__name__', coro_func)}")
+            return None
         except Exception as e:
             logger.error(f"運行異步函數失敗: {e}")
             return None
     
-    def _run_in_new_loop(self, coro_func: Callable, *args, **kwargs) -> Any:
-        """在新的事件循環中運行協程"""
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        try:
-            return new_loop.run_until_complete(coro_func(*args, **kwargs))
-        finally:
-            new_loop.close()
+    async def get_shared_resource(self, name: str, factory: Callable[[], Any]) -> Any:
+        """獲取在後台循環上共享的資源（如 aiohttp.ClientSession），首次訪問時創建
+        
+        必須在後台循環上運行的協程中調用；factory 可以是同步或異步的。
+        關閉管理器時會調用資源的 close()/aclose()。
+        """
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+        
+        lock = self._resource_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            resource = self._resources.get(name)
+            if resource is None:
+                resource = factory()
+                if inspect.isawaitable(resource):
+                    resource = await resource
+                self._resources[name] = resource
+                logger.info(f"已創建共享資源: {name}")
+            return resource
     
-    def close(self):
+    async def _close_resources(self):
+        """關閉所有共享資源"""
+        for name, resource in list(self._resources.items()):
+            try:
+                closer = getattr(resource, 'aclose', None) or getattr(resource, 'close', None)
+                if closer is not None:
+                    result = closer()
+                    if inspect.isawaitable(result):
+                        await result
+            except Exception as e:
+                logger.warning(f"關閉共享資源 {name} 失敗: {e}")
+        self._resources.clear()
+        self._resource_locks.clear()
+    
+    async def _cancel_pending_tasks(self):
+        """取消循環上仍在運行的任務"""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取提交統計"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["loop_running"] = self._loop is not None and self._loop.is_running()
+        stats["shared_resources"] = list(self._resources.keys())
+        return stats
+    
+    def close(self, timeout: float = 5.0):
         """關閉事件循環管理器"""
-        if self._executor:
-            self._executor.shutdown(wait=True)
+        with self._start_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        
+        if loop is not None and not loop.is_closed():
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_resources(), loop).result(timeout=timeout)
+                asyncio.run_coroutine_threadsafe(self._cancel_pending_tasks(), loop).result(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"清理後台事件循環失敗: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=timeout)
+            if not loop.is_running():
+                loop.close()
         logger.info("事件循環管理器已關閉")
 
 # 全局事件循環管理器
@@ -98,3 +213,47 @@ def get_loop_manager() -> FixedEventLoopManager:
         _global_loop_manager = FixedEventLoopManager()
     return _global_loop_manager
 
+def benchmark_loop_manager(calls: int = 2000, io_delay: float = 0.0) -> Dict[str, Any]:
+    """對比每次調用新建線程池+事件循環與共享後台循環的調用吞吐"""
+    
+    async def operation(value: int) -> int:
+        await asyncio.sleep(io_delay)
+        return value
+    
+    def legacy_call(value: int) -> int:
+        # 修改前的做法：每次調用都新建線程池和事件循環
+        def run_in_new_loop():
+            new_loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(new_loop)
+            try:
+                return new_loop.run_until_complete(operation(value))
+            finally:
+                new_loop.close()
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(run_in_new_loop).result(timeout=30)
+    
+    manager = get_loop_manager()
+    results = {}
+    for name, call in (("per_call_loop", legacy_call),
+                       ("shared_loop", lambda value: manager.run_coroutine(operation(value)))):
+        start = time.perf_counter()
+        for i in range(calls):
+            call(i)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "calls": calls,
+            "elapsed_seconds": elapsed,
+            "calls_per_second": calls / elapsed if elapsed > 0 else 0.0
+        }
+    
+    results["speedup"] = (results["shared_loop"]["calls_per_second"] /
+                          max(results["per_call_loop"]["calls_per_second"], 1e-9))
+    return results
+
+if __name__ == "__main__":
+    import json
+    
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(benchmark_loop_manager(), indent=2))
+    get_loop_manager().close()
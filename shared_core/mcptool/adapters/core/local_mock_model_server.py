@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+本地模擬模型服務器
+模擬 Ollama 和 SuperMemory 的HTTP接口，用於離線測量適配器的延遲和吞吐
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class MockModelRequestHandler(BaseHTTPRequestHandler):
+    """模擬請求處理器，支持 keep-alive"""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+    
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b"{}")
+    
+    def _send_json(self, data: Any, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+    
+    def _generated_tokens(self, prompt: str):
+        count = self.server.tokens_per_response
+        return [f"回應{i}:{prompt[:8]} " for i in range(count)]
+    
+    def _stream_ndjson(self, chunks):
+        """以 chunked 編碼逐行輸出 NDJSON"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.server.first_token_latency)
+        for chunk in chunks:
+            self._send_chunk(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+            if not chunk.get("done"):
+                time.sleep(self.server.token_latency)
+        self._send_chunk(b"")
+    
+    def do_GET(self):
+        self.server.record_request()
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model_name}]})
+        elif self.path.endswith("/health"):
+            self._send_json({"status": "ok"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+    
+    def do_POST(self):
+        self.server.record_request()
+        payload = self._read_json()
+        path = self.path
+        
+        if path == "/api/generate":
+            tokens = self._generated_tokens(payload.get("prompt", ""))
+            if payload.get("stream", True):
+                chunks = [{"model": payload.get("model"), "response": token, "done": False} for token in tokens]
+                chunks.append({"model": payload.get("model"), "response": "", "done": True, "context": [1, 2, 3]})
+                self._stream_ndjson(chunks)
+            else:
+                time.sleep(self.server.first_token_latency + self.server.token_latency * len(tokens))
+                self._send_json({"model": payload.get("model"), "response": "".join(tokens),
+                                 "done": True, "context": [1, 2, 3]})
+        elif path == "/api/chat":
+            messages = payload.get("messages") or [{}]
+            tokens = self._generated_tokens(messages[-1].get("content", ""))
+            if payload.get("stream", True):
+                chunks = [{"model": payload.get("model"), "message": {"role": "assistant", "content": token},
+                           "done": False} for token in tokens]
+                chunks.append({"model": payload.get("model"), "message": {"role": "assistant", "content": ""},
+                               "done": True})
+                self._stream_ndjson(chunks)
+            else:
+                time.sleep(self.server.first_token_latency + self.server.token_latency * len(tokens))
+                self._send_json({"model": payload.get("model"),
+                                 "message": {"role": "assistant", "content": "".join(tokens)}, "done": True})
+        elif path == "/api/show":
+            self._send_json({"modelfile": "", "details": {"family": "qwen"}})
+        else:
+            self._handle_supermemory(path.rsplit("/", 1)[-1], payload)
+    
+    def _handle_supermemory(self, endpoint: str, payload: Dict[str, Any]):
+        time.sleep(self.server.first_token_latency)
+        memories = self.server.memories
+        if endpoint == "store":
+            memories[payload.get("key")] = payload
+            self._send_json({"id": payload.get("key"), "timestamp": time.time()})
+        elif endpoint == "retrieve":
+            memory = memories.get(payload.get("key"))
+            if memory is None:
+                self._send_json({"error": "not found"}, status=404)
+            else:
+                self._send_json({"value": memory.get("value"), "metadata": memory.get("metadata", {}),
+                                 "timestamp": time.time()})
+        elif endpoint == "search":
+            query = payload.get("query", "")
+            results = [{"key": key, "content": memory.get("value")} for key, memory in memories.items()
+                       if query in str(memory.get("value"))][:payload.get("limit", 10)]
+            self._send_json({"results": results, "total": len(results)})
+        elif endpoint == "delete":
+            memories.pop(payload.get("key"), None)
+            self._send_json({"deleted": True})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+class LocalMockModelServer(ThreadingHTTPServer):
+    """在後台線程運行的本地模擬服務器"""
+    
+    daemon_threads = True
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 first_token_latency: float = 0.02, token_latency: float = 0.005,
+                 tokens_per_response: int = 20, model_name: str = "qwen2.5:8b"):
+        super().__init__((host, port), MockModelRequestHandler)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.tokens_per_response = tokens_per_response
+        self.model_name = model_name
+        self.memories: Dict[str, Dict[str, Any]] = {}
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def record_request(self):
+        with self._count_lock:
+            self.request_count += 1
+    
+    def start(self) -> "LocalMockModelServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="LocalMockModelServer", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="本地模擬 Ollama/SuperMemory 服務器")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-latency", type=float, default=0.02)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    args = parser.parse_args()
+    
+    server = LocalMockModelServer(port=args.port, first_token_latency=args.first_token_latency,
+                                  token_latency=args.token_latency)
+    print(f"模擬服務器運行於 {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+共享的異步HTTP客戶端
+為模型適配器提供 keep-alive 連接池、按主機並發限制、
+帶抖動的指數退避重試，以及相同在途請求的合併
+"""
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+@dataclass
+class HTTPResponse:
+    """HTTP響應"""
+    status: int
+    text: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+    attempts: int = 1
+    
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+    
+    def json(self) -> Any:
+        return json.loads(self.text) if self.text else None
+
+class HTTPStatusError(Exception):
+    """流式請求返回非2xx狀態"""
+    
+    def __init__(self, status: int, text: str):
+        super().__init__(f"HTTP {status}: {text[:200]}")
+        self.status = status
+        self.text = text
+
+class PooledHTTPClient:
+    """基於 aiohttp 的共享異步HTTP客戶端
+    
+    aiohttp 的會話綁定創建它的事件循環，因此每個事件循環各持有一個會話；
+    同步代碼應通過 FixedEventLoopManager 的共享循環調用，以便複用連接。
+    """
+    
+    def __init__(self, max_connections: int = 100, per_host_limit: int = 16,
+                 timeout: float = 60.0, max_retries: int = 2,
+                 backoff_base: float = 0.2, backoff_max: float = 5.0,
+                 retry_statuses: Tuple[int, ...] = RETRY_STATUSES,
+                 keepalive_timeout: float = 30.0):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = set(retry_statuses)
+        self.keepalive_timeout = keepalive_timeout
+        
+        self._sessions: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._host_semaphores: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore] = {}
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "network_calls": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "errors": 0,
+            "total_latency": 0.0
+        }
+    
+    def _get_session(self):
+        """獲取當前事件循環上的會話"""
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp 未安裝，無法使用共享HTTP客戶端")
+        
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.per_host_limit,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            with self._lock:
+                self._prune_closed_loops()
+                self._sessions[loop] = session
+        return session
+    
+    def _prune_closed_loops(self):
+        """清理已結束循環上的會話和主機信號量（調用方持有 _lock）"""
+        for stale_loop in [l for l in self._sessions if l.is_closed()]:
+            self._release_stale_session(self._sessions.pop(stale_loop))
+        for key in [k for k in self._host_semaphores if k[0].is_closed()]:
+            del self._host_semaphores[key]
+    
+    @staticmethod
+    def _release_stale_session(session):
+        """同步釋放已關閉循環上的會話
+        
+        循環已關閉，無法 await session.close()；先與連接器解綁（會話視為已關閉，
+        不再告警），再同步關閉連接器，釋放連接池持有的連接。
+        """
+        if session.closed:
+            return
+        connector = session.connector
+        session.detach()
+        try:
+            connector._close()  # close() 的同步部分，不需要事件循環
+        except Exception as e:
+            logger.debug(f"釋放過期會話的連接器失敗: {e}")
+    
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """按主機限制並發，超出時在客戶端排隊而不是佔用連接"""
+        key = (asyncio.get_running_loop(), urlsplit(url).netloc)
+        semaphore = self._host_semaphores.get(key)
+        if semaphore is None:
+            with self._lock:
+                semaphore = self._host_semaphores.setdefault(key, asyncio.Semaphore(self.per_host_limit))
+        return semaphore
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """全抖動指數退避"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    @staticmethod
+    def _coalesce_key(method: str, url: str, json_body: Any, headers: Optional[Dict[str, str]]) -> Tuple:
+        body = json.dumps(json_body, sort_keys=True, ensure_ascii=False, default=str) if json_body is not None else ""
+        return (method.upper(), url, body, tuple(sorted((headers or {}).items())))
+    
+    async def request(self, method: str, url: str, json_body: Any = None,
+                      headers: Optional[Dict[str, str]] = None,
+                      timeout: Optional[float] = None,
+                      coalesce: Optional[bool] = None) -> HTTPResponse:
+        """發送請求
+        
+        coalesce 默認只對 GET 開啟；相同的在途請求共享一次網絡調用的結果。
+        """
+        self.stats["requests"] += 1
+        if coalesce is None:
+            coalesce = method.upper() == "GET"
+        
+        if not coalesce:
+            return await self._request_with_retries(method, url, json_body, headers, timeout)
+        
+        key = (asyncio.get_running_loop(),) + self._coalesce_key(method, url, json_body, headers)
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+        
+        future = asyncio.ensure_future(self._request_with_retries(method, url, json_body, headers, timeout))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+    
+    async def _request_with_retries(self, method: str, url: str, json_body: Any,
+                                    headers: Optional[Dict[str, str]],
+                                    timeout: Optional[float]) -> HTTPResponse:
+        session = self._get_session()
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout is not None else None
+        started = time.perf_counter()
+        attempt = 0
+        
+        while True:
+            try:
+                async with self._host_semaphore(url):
+                    self.stats["network_calls"] += 1
+                    async with session.request(method, url, json=json_body, headers=headers,
+                                               timeout=request_timeout) as response:
+                        text = await response.text()
+                        result = HTTPResponse(
+                            status=response.status,
+                            text=text,
+                            headers=dict(response.headers),
+                            attempts=attempt + 1
+                        )
+                
+                if result.status not in self.retry_statuses or attempt >= self.max_retries:
+                    result.elapsed = time.perf_counter() - started
+                    self.stats["total_latency"] += result.elapsed
+                    return result
+            
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    self.stats["errors"] += 1
+                    raise
+                logger.debug(f"HTTP請求失敗，準備重試: {method} {url} - {e}")
+            
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._backoff_delay(attempt))
+    
+    async def stream_lines(self, method: str, url: str, json_body: Any = None,
+                           headers: Optional[Dict[str, str]] = None,
+                           idle_timeout: Optional[float] = None) -> AsyncIterator[bytes]:
+        """流式讀取響應，逐行產出（適用於 NDJSON）
+        
+        只在收到響應頭之前重試；idle_timeout 限制兩次讀取之間的最長間隔。
+        消費方按需拉取，讀取速度由消費方決定（背壓）；提前停止迭代或取消任務會關閉連接。
+        """
+        self.stats["requests"] += 1
+        session = self._get_session()
+        request_timeout = aiohttp.ClientTimeout(total=None, sock_read=idle_timeout or self.timeout)
+        attempt = 0
+        
+        async with self._host_semaphore(url):
+            while True:
+                try:
+                    self.stats["network_calls"] += 1
+                    response = await session.request(method, url, json=json_body, headers=headers,
+                                                     timeout=request_timeout)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if attempt >= self.max_retries:
+                        self.stats["errors"] += 1
+                        raise
+                    logger.debug(f"流式請求連接失敗，準備重試: {method} {url} - {e}")
+                else:
+                    if response.status not in self.retry_statuses or attempt >= self.max_retries:
+                        break
+                    response.release()
+                
+                attempt += 1
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff_delay(attempt))
+            
+            completed = False
+            try:
+                if response.status >= 300:
+                    raise HTTPStatusError(response.status, await response.text())
+                async for line in response.content:
+                    line = line.strip()
+                    if line:
+                        yield line
+                completed = True
+            finally:
+                # 讀完的連接歸還連接池，中途放棄的連接直接關閉
+                if completed:
+                    response.release()
+                else:
+                    response.close()
+    
+    async def get_json(self, url: str, **kwargs) -> Any:
+        return (await self.request("GET", url, **kwargs)).json()
+    
+    async def post_json(self, url: str, json_body: Any, **kwargs) -> HTTPResponse:
+        return await self.request("POST", url, json_body=json_body, **kwargs)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取客戶端統計"""
+        stats = dict(self.stats)
+        calls = stats["network_calls"] or 1
+        stats["average_latency_ms"] = stats["total_latency"] / calls * 1000
+        stats["open_sessions"] = sum(1 for s in self._sessions.values() if not s.closed)
+        return stats
+    
+    async def close(self):
+        """關閉當前事件循環上的會話，並釋放已結束循環上遺留的會話"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.pop(loop, None)
+            for key in [k for k in self._host_semaphores if k[0] is loop]:
+                del self._host_semaphores[key]
+            self._prune_closed_loops()
+        if session is not None and not session.closed:
+            await session.close()
+
+# 進程內共享的HTTP客戶端
+_shared_http_client: Optional[PooledHTTPClient] = None
+_shared_http_client_lock = threading.Lock()
+
+def get_shared_http_client(**kwargs) -> PooledHTTPClient:
+    """獲取進程內共享的HTTP客戶端，參數只在首次創建時生效"""
+    global _shared_http_client
+    if _shared_http_client is None:
+        with _shared_http_client_lock:
+            if _shared_http_client is None:
+                _shared_http_client = PooledHTTPClient(**kwargs)
+    return _shared_http_client
@@ -16,6 +16,11 @@ import json
 import asyncio
 import logging
 import subprocess
+import hashlib
+import heapq
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional, Union, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -91,6 +96,96 @@ class LoopStage(Enum):
     FEEDBACK = "feedback"
     ITERATION = "iteration"
 
+# 每次迭代的階段流水線：同一組內的階段互不依賴，並發執行
+STAGE_PIPELINE = [
+    (LoopStage.REQUIREMENT_ANALYSIS,),
+    (LoopStage.CODE_GENERATION,),
+    (LoopStage.CODE_OPTIMIZATION,),
+    (LoopStage.TESTING,),
+    (LoopStage.DEPLOYMENT,),
+    (LoopStage.MONITORING, LoopStage.FEEDBACK)
+]
+
+# 可按輸入內容哈希緩存產物的階段；部署、監控和反饋有外部副作用，每次迭代都重新執行
+CACHEABLE_STAGES = (
+    LoopStage.REQUIREMENT_ANALYSIS,
+    LoopStage.CODE_GENERATION,
+    LoopStage.CODE_OPTIMIZATION,
+    LoopStage.TESTING
+)
+
+# DevelopmentRequest.priority 到調度優先級的映射，數值越小越優先
+LOOP_PRIORITY_RANKS = {
+    "urgent": 0,
+    "critical": 0,
+    "high": 1,
+    "medium": 2,
+    "normal": 2,
+    "low": 3
+}
+
+class StageGate:
+    """階段並發閘門
+    
+    限制同時執行某個共享階段（如代碼生成、測試）的閉環數；等待者按
+    (優先級, 到達順序) 排隊，釋放時名額直接移交給隊首，後來者不能插隊。
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self._waiters: List[tuple] = []
+        self._sequence = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+    
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+    
+    async def acquire(self, priority_rank: int):
+        started = time.monotonic()
+        if self.in_use < self.capacity and not self.waiting:
+            self.in_use += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._sequence += 1
+            heapq.heappush(self._waiters, (priority_rank, self._sequence, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 名額已移交但等待方被取消，繼續傳給下一位
+                    self.release()
+                raise
+        self.acquired += 1
+        self.total_wait += time.monotonic() - started
+    
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_use -= 1
+    
+    @asynccontextmanager
+    async def slot(self, priority_rank: int):
+        await self.acquire(priority_rank)
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "average_wait": self.total_wait / self.acquired if self.acquired else 0.0
+        }
+
 class DeploymentTarget(Enum):
     """部署目標枚舉"""
     DEVELOPMENT = "development"
@@ -102,6 +197,7 @@ class DeploymentTarget(Enum):
 class LoopStatus(Enum):
     """閉環狀態枚舉"""
     IDLE = "idle"
+    QUEUED = "queued"
     RUNNING = "running"
     PAUSED = "paused"
     COMPLETED = "completed"
@@ -184,6 +280,24 @@ class DevDeployLoopCoordinatorMCP(BaseMCP):
         self.loop_history = []
         self.max_history_size = self.config.get("max_history_size", 100)
         
+        # 階段產物緩存：鍵為階段名和輸入內容的哈希，按LRU淘汰
+        self.stage_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stage_cache_size = self.config.get("stage_cache_size", 256)
+        
+        # 閉環調度：全局和每個項目的並發上限，超出時按優先級排隊等待准入
+        self.max_concurrent_loops = self.config.get("max_concurrent_loops", 4)
+        self.max_loops_per_project = self.config.get("max_loops_per_project", 1)
+        self.throughput_window = self.config.get("throughput_window_seconds", 300)
+        stage_limits = self.config.get("stage_concurrency", {"code_generation": 2, "testing": 2})
+        self.stage_gates = {LoopStage(stage): StageGate(limit) for stage, limit in stage_limits.items()}
+        self._admission_queue: List[tuple] = []
+        self._admission_sequence = 0
+        self._running_loops: Dict[str, asyncio.Task] = {}
+        self._project_running: Dict[str, int] = defaultdict(int)
+        self._queued_at: Dict[str, float] = {}
+        self._queue_times = deque(maxlen=1000)
+        self._completion_times = deque(maxlen=10000)
+        
         # 統計信息
         self.loop_stats = {
             "total_loops": 0,
@@ -191,7 +305,9 @@ class DevDeployLoopCoordinatorMCP(BaseMCP):
             "failed_loops": 0,
             "average_duration": 0.0,
             "stage_success_rates": {stage.value: 0.0 for stage in LoopStage},
-            "deployment_targets": {target.value: 0 for target in DeploymentTarget}
+            "deployment_targets": {target.value: 0 for target in DeploymentTarget},
+            "stage_cache_hits": 0,
+            "stage_cache_misses": 0
         }
         
         # 閉環階段處理器
@@ -289,15 +405,13 @@ class DevDeployLoopCoordinatorMCP(BaseMCP):
                 execution_id=self._generate_execution_id(),
                 request=request,
                 current_stage=LoopStage.REQUIREMENT_ANALYSIS,
-                status=LoopStatus.RUNNING,
+                status=LoopStatus.QUEUED,
                 stages_completed=[]
             )
             
-            # 註冊活動閉環
+            # 註冊活動閉環，經准入控制後啟動
             self.active_loops[execution.execution_id] = execution
-            
-            # 啟動閉環執行
-            asyncio.create_task(self._execute_loop(execution))
+            self._enqueue_loop(execution)
             
             self.loop_stats["total_loops"] += 1
             
@@ -311,7 +425,8 @@ class DevDeployLoopCoordinatorMCP(BaseMCP):
                 "status": "success",
                 "execution_id": execution.execution_id,
                 "request_id": request.request_id,
-                "message": "開發部署閉環已啟動",
+                "message": "開發部署閉環已啟動" if execution.status == LoopStatus.RUNNING else "開發部署閉環已排隊",
+                "loop_status": execution.status.value,
                 "current_stage": execution.current_stage.value
             }
             
@@ -332,67 +447,115 @@ class DevDeployLoopCoordinatorMCP(BaseMCP):
         import uuid
         return f"exec_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
     
+    def _priority_rank(self, execution: LoopExecution) -> int:
+        return LOOP_PRIORITY_RANKS.get(str(execution.request.priority).lower(), LOOP_PRIORITY_RANKS["medium"])
+    
+    def _enqueue_loop(self, execution: LoopExecution):
+        """將閉環放入准入隊列，並嘗試立即准入"""
+        execution.status = LoopStatus.QUEUED
+        self._queued_at[execution.execution_id] = time.monotonic()
+        self._admission_sequence += 1
+        heapq.heappush(self._admission_queue,
+                       (self._priority_rank(execution), self._admission_sequence, execution.execution_id))
+        self._admit_loops()
+    
+    def _admit_loops(self):
+        """在並發上限內按優先級准入排隊的閉環；項目已滿的閉環保留在隊列中"""
+        deferred = []
+        while self._admission_queue and len(self._running_loops) < self.max_concurrent_loops:
+            entry = heapq.heappop(self._admission_queue)
+            execution = self.active_loops.get(entry[2])
+            if execution is None or execution.status != LoopStatus.QUEUED:
+                # 排隊期間已取消
+                self._queued_at.pop(entry[2], None)
+                continue
+            if self._project_running[execution.request.project_name] >= self.max_loops_per_project:
+                deferred.append(entry)
+                continue
+            self._start_admitted_loop(execution)
+        
+        for entry in deferred:
+            heapq.heappush(self._admission_queue, entry)
+    
+    def _start_admitted_loop(self, execution: LoopExecution):
+        execution_id = execution.execution_id
+        queued_at = self._queued_at.pop(execution_id, None)
+        if queued_at is not None:
+            self._queue_times.append(time.monotonic() - queued_at)
+        execution.status = LoopStatus.RUNNING
+        self._project_running[execution.request.project_name] += 1
+        self._running_loops[execution_id] = asyncio.create_task(self._run_admitted_loop(execution))
+    
+    async def _run_admitted_loop(self, execution: LoopExecution):
+        """執行已准入的閉環，結束（含暫停）後釋放名額並准入下一個"""
+        try:
+            await self._execute_loop(execution)
+        finally:
+            self._running_loops.pop(execution.execution_id, None)
+            project = execution.request.project_name
+            self._project_running[project] -= 1
+            if self._project_running[project] <= 0:
+                del self._project_running[project]
+            if execution.status in (LoopStatus.COMPLETED, LoopStatus.FAILED):
+                self._completion_times.append(time.monotonic())
+            self._admit_loops()
+    
+    def _scheduler_metrics(self) -> Dict[str, Any]:
+        """調度器指標：並發、排隊、吞吐和排隊時間"""
+        now = time.monotonic()
+        completed_recently = sum(1 for t in self._completion_times if now - t <= self.throughput_window)
+        queue_times = sorted(self._queue_times)
+        return {
+            "running_loops": len(self._running_loops),
+            "queued_loops": sum(1 for e in self.active_loops.values() if e.status == LoopStatus.QUEUED),
+            "max_concurrent_loops": self.max_concurrent_loops,
+            "max_loops_per_project": self.max_loops_per_project,
+            "running_by_project": dict(self._project_running),
+            "throughput_per_minute": completed_recently / (self.throughput_window / 60.0),
+            "queue_time": {
+                "samples": len(queue_times),
+                "average": sum(queue_times) / len(queue_times) if queue_times else 0.0,
+                "p95": queue_times[min(len(queue_times) - 1, int(len(queue_times) * 0.95))] if queue_times else 0.0,
+                "max": queue_times[-1] if queue_times else 0.0
+            },
+            "stage_gates": {stage.value: gate.get_stats() for stage, gate in self.stage_gates.items()}
+        }
+    
     async def _execute_loop(self, execution: LoopExecution):
-        """執行閉環流程"""
+        """執行閉環流程
+        
+        迭代式狀態機：每輪按 STAGE_PIPELINE 執行各組階段，評估後決定是否進入下一輪。
+        可緩存階段的輸入未變時直接復用上一輪（或其他閉環）的產物；
+        迭代時只從 rerun_from 指定的階段開始重新執行。
+        """
         try:
             log_info(LogCategory.MCP, f"開始執行閉環: {execution.execution_id}", {})
             
-            # 定義閉環階段順序
-            stages = [
-                LoopStage.REQUIREMENT_ANALYSIS,
-                LoopStage.CODE_GENERATION,
-                LoopStage.CODE_OPTIMIZATION,
-                LoopStage.TESTING,
-                LoopStage.DEPLOYMENT,
-                LoopStage.MONITORING,
-                LoopStage.FEEDBACK
-            ]
-            
-            # 執行各個階段
-            for stage in stages:
-                if execution.status != LoopStatus.RUNNING:
-                    break
-                
-                execution.current_stage = stage
+            while execution.status == LoopStatus.RUNNING:
+                execution.stages_completed = []
+                rerun_from = execution.request.metadata.get("rerun_from")
+                rerun_index = next((i for i, group in enumerate(STAGE_PIPELINE)
+                                    if any(stage.value == rerun_from for stage in group)), None)
                 
-                try:
-                    # 執行階段處理器
-                    stage_result = await self.stage_processors[stage](execution)
+                # 執行本輪各組階段
+                for index, group in enumerate(STAGE_PIPELINE):
+                    if execution.status != LoopStatus.RUNNING:
+                        break
                     
-                    if stage_result.get("status") == "success":
-                        execution.stages_completed.append(stage.value)
-                        log_info(LogCategory.MCP, f"閉環階段完成: {stage.value}", {
-                            "execution_id": execution.execution_id
-                        })
-                    else:
-                        # 階段失敗
-                        error_msg = stage_result.get("message", f"階段 {stage.value} 執行失敗")
-                        execution.error_messages.append(error_msg)
-                        
-                        # 決定是否繼續或重試
-                        if await self._should_retry_stage(execution, stage):
-                            log_warning(LogCategory.MCP, f"重試閉環階段: {stage.value}", {})
-                            continue
-                        else:
-                            execution.status = LoopStatus.FAILED
-                            break
-                
-                except Exception as e:
-                    error_msg = f"階段 {stage.value} 執行異常: {str(e)}"
-                    execution.error_messages.append(error_msg)
-                    log_error(LogCategory.MCP, error_msg, {})
+                    execution.current_stage = group[0]
+                    use_cache = rerun_index is None or index < rerun_index
+                    outcomes = await asyncio.gather(*(self._run_stage(execution, stage, use_cache) for stage in group))
                     
-                    if not await self._should_retry_stage(execution, stage):
+                    if not all(outcomes) and execution.status == LoopStatus.RUNNING:
                         execution.status = LoopStatus.FAILED
-                        break
-            
-            # 檢查是否需要迭代
-            if execution.status == LoopStatus.RUNNING:
+                
+                if execution.status != LoopStatus.RUNNING:
+                    break
+                
+                # 檢查是否需要迭代
+                execution.current_stage = LoopStage.ITERATION
                 iteration_result = await self._process_iteration(execution)
-                if iteration_result.get("iterate", False):
-                    # 開始新的迭代
-                    await self._execute_loop(execution)
-                else:
+                if not iteration_result.get("iterate", False):
                     # 閉環完成
                     execution.status = LoopStatus.COMPLETED
                     execution.end_time = datetime.now().isoformat()
@@ -400,6 +563,13 @@ class DevDeployLoopCoordinatorMCP(BaseMCP):
                     
                     self.loop_stats["successful_loops"] += 1
             
+            if execution.status in (LoopStatus.PAUSED, LoopStatus.QUEUED, LoopStatus.CANCELLED):
+                # 暫停或重新排隊的閉環保留在活動列表中等待恢復；取消時 cancel_loop 已記錄歷史
+                return
+            
+            if execution.status == LoopStatus.FAILED:
+                self.loop_stats["failed_loops"] += 1
+            
             # 更新統計信息
             self._update_loop_stats(execution)
             
@@ -428,6 +598,111 @@ class DevDeployLoopCoordinatorMCP(BaseMCP):
             if execution.execution_id in self.active_loops:
                 del self.active_loops[execution.execution_id]
     
+    async def _run_stage(self, execution: LoopExecution, stage: LoopStage, use_cache: bool) -> bool:
+        """執行單個階段（含緩存查找和重試），返回是否成功"""
+        while True:
+            cache_key = self._stage_cache_key(execution, stage)
+            if cache_key is not None and use_cache and cache_key in self.stage_cache:
+                self.stage_cache.move_to_end(cache_key)
+                self._restore_stage_artifacts(execution, stage, self.stage_cache[cache_key])
+                self.loop_stats["stage_cache_hits"] += 1
+                execution.stages_completed.append(stage.value)
+                log_info(LogCategory.MCP, f"閉環階段復用緩存: {stage.value}", {
+                    "execution_id": execution.execution_id
+                })
+                return True
+            
+            try:
+                # 執行階段處理器；共享階段需先取得閘門名額
+                gate = self.stage_gates.get(stage)
+                if gate is not None:
+                    async with gate.slot(self._priority_rank(execution)):
+                        stage_result = await self.stage_processors[stage](execution)
+                else:
+                    stage_result = await self.stage_processors[stage](execution)
+            except Exception as e:
+                stage_result = {"status": "error", "message": f"階段 {stage.value} 執行異常: {str(e)}"}
+            
+            if stage_result.get("status") == "success":
+                if cache_key is not None:
+                    self.loop_stats["stage_cache_misses"] += 1
+                    self.stage_cache[cache_key] = self._capture_stage_artifacts(execution, stage)
+                    self.stage_cache.move_to_end(cache_key)
+                    while len(self.stage_cache) > self.stage_cache_size:
+                        self.stage_cache.popitem(last=False)
+                execution.stages_completed.append(stage.value)
+                log_info(LogCategory.MCP, f"閉環階段完成: {stage.value}", {
+                    "execution_id": execution.execution_id
+                })
+                return True
+            
+            # 階段失敗
+            error_msg = stage_result.get("message", f"階段 {stage.value} 執行失敗")
+            execution.error_messages.append(error_msg)
+            log_error(LogCategory.MCP, error_msg, {})
+            
+            # 決定是否重試
+            if execution.status != LoopStatus.RUNNING or not await self._should_retry_stage(execution, stage):
+                return False
+            log_warning(LogCategory.MCP, f"重試閉環階段: {stage.value}", {})
+    
+    def _stage_inputs(self, execution: LoopExecution, stage: LoopStage) -> Optional[Dict[str, Any]]:
+        """可緩存階段的輸入；返回None表示該階段不緩存"""
+        request = execution.request
+        if stage == LoopStage.REQUIREMENT_ANALYSIS:
+            return {
+                "requirement": request.user_requirement,
+                "project_name": request.project_name,
+                "language": request.target_language
+            }
+        if stage == LoopStage.CODE_GENERATION:
+            return {
+                "requirement": request.user_requirement,
+                "project_name": request.project_name,
+                "language": request.target_language,
+                "analysis": request.context.get("requirement_analysis")
+            }
+        if stage == LoopStage.CODE_OPTIMIZATION:
+            return {"project_name": request.project_name, "language": request.target_language,
+                    "code": execution.generated_code}
+        if stage == LoopStage.TESTING:
+            return {"code": execution.optimized_code or execution.generated_code}
+        return None
+    
+    def _stage_cache_key(self, execution: LoopExecution, stage: LoopStage) -> Optional[str]:
+        """階段名和輸入內容的SHA-256"""
+        inputs = self._stage_inputs(execution, stage)
+        if inputs is None:
+            return None
+        payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+        return f"{stage.value}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+    
+    def _capture_stage_artifacts(self, execution: LoopExecution, stage: LoopStage) -> Dict[str, Any]:
+        """提取階段寫入執行狀態的產物"""
+        request = execution.request
+        if stage == LoopStage.REQUIREMENT_ANALYSIS:
+            return {"context": {"requirement_analysis": request.context.get("requirement_analysis"),
+                                "analyzed_at": request.context.get("analyzed_at")}}
+        if stage == LoopStage.CODE_GENERATION:
+            return {"generated_code": execution.generated_code,
+                    "metadata": {key: request.metadata[key] for key in ("code_file_path", "project_dir")
+                                 if key in request.metadata}}
+        if stage == LoopStage.CODE_OPTIMIZATION:
+            return {"optimized_code": execution.optimized_code,
+                    "metadata": {key: request.metadata[key] for key in ("optimized_code_file_path",)
+                                 if key in request.metadata}}
+        if stage == LoopStage.TESTING:
+            return {"test_results": execution.test_results}
+        return {}
+    
+    def _restore_stage_artifacts(self, execution: LoopExecution, stage: LoopStage, artifacts: Dict[str, Any]):
+        """把緩存的產物寫回執行狀態"""
+        execution.request.context.update(artifacts.get("context", {}))
+        execution.request.metadata.update(artifacts.get("metadata", {}))
+        for field_name in ("generated_code", "optimized_code", "test_results"):
+            if field_name in artifacts:
+                setattr(execution, field_name, artifacts[field_name])
+    
     async def _process_requirement_analysis(self, execution: LoopExecution) -> Dict[str, Any]:
         """處理需求分析階段"""
         try:
@@ -1001,16 +1276,23 @@ if __name__ == "__main__":
             else:
                 reason = f"總體分數: {overall_score:.2f}, 測試成功率: {test_success_rate:.2f}"
             
+            rerun_from = None
             if should_iterate:
                 # 更新迭代計數
                 execution.request.metadata["iteration_count"] = iteration_count + 1
                 
-                # 重置階段狀態
-                execution.stages_completed = []
-                execution.current_stage = LoopStage.REQUIREMENT_ANALYSIS
+                # 只重跑受影響的階段，之前的階段在輸入不變時復用緩存
+                if not feedback.get("deployment_success", True):
+                    rerun_from = LoopStage.DEPLOYMENT
+                elif test_success_rate < 0.9:
+                    rerun_from = LoopStage.TESTING
+                else:
+                    rerun_from = LoopStage.CODE_OPTIMIZATION
+                execution.request.metadata["rerun_from"] = rerun_from.value
             
             return {
                 "iterate": should_iterate,
+                "rerun_from": rerun_from.value if rerun_from else None,
                 "reason": reason,
                 "overall_score": overall_score,
                 "iteration_count": iteration_count + (1 if should_iterate else 0)
@@ -1091,12 +1373,18 @@ if __name__ == "__main__":
         except Exception as e:
             log_error(LogCategory.MCP, f"記錄閉環歷史失敗: {str(e)}", {})
     
-    def get_loop_status(self, execution_id: str) -> Dict[str, Any]:
-        """獲取閉環狀態"""
+    def get_loop_status(self, execution_id: Optional[str] = None) -> Dict[str, Any]:
+        """獲取閉環狀態；不指定 execution_id 時只返回調度器指標"""
         try:
+            if execution_id is None:
+                return {
+                    "status": "success",
+                    "scheduler": self._scheduler_metrics()
+                }
+            
             if execution_id in self.active_loops:
                 execution = self.active_loops[execution_id]
-                return {
+                status = {
                     "status": "success",
                     "execution_id": execution_id,
                     "loop_status": execution.status.value,
@@ -1104,8 +1392,16 @@ if __name__ == "__main__":
                     "stages_completed": execution.stages_completed,
                     "progress": len(execution.stages_completed) / len(LoopStage) * 100,
                     "start_time": execution.start_time,
-                    "error_count": len(execution.error_messages)
+                    "error_count": len(execution.error_messages),
+                    "scheduler": self._scheduler_metrics()
                 }
+                if execution.status == LoopStatus.QUEUED:
+                    queued = sorted(entry for entry in self._admission_queue
+                                    if entry[2] in self.active_loops
+                                    and self.active_loops[entry[2]].status == LoopStatus.QUEUED)
+                    status["queue_position"] = next((i for i, entry in enumerate(queued) if entry[2] == execution_id), None)
+                    status["queued_for"] = time.monotonic() - self._queued_at.get(execution_id, time.monotonic())
+                return status
             else:
                 # 檢查歷史記錄
                 for entry in self.loop_history:
@@ -1175,10 +1471,12 @@ if __name__ == "__main__":
             
             execution = self.active_loops[execution_id]
             if execution.status == LoopStatus.PAUSED:
-                execution.status = LoopStatus.RUNNING
-                
-                # 重新啟動執行
-                asyncio.create_task(self._execute_loop(execution))
+                if execution_id in self._running_loops:
+                    # 暫停時當前階段仍在執行，閉環未讓出名額，直接繼續即可
+                    execution.status = LoopStatus.RUNNING
+                else:
+                    # 重新排隊，經准入控制後繼續執行
+                    self._enqueue_loop(execution)
                 
                 log_info(LogCategory.MCP, f"閉環已恢復: {execution_id}", {})
                 
@@ -1435,7 +1733,9 @@ if __name__ == "__main__":
                 "failed_loops": 0,
                 "average_duration": 0.0,
                 "stage_success_rates": {stage.value: 0.0 for stage in LoopStage},
-                "deployment_targets": {target.value: 0 for target in DeploymentTarget}
+                "deployment_targets": {target.value: 0 for target in DeploymentTarget},
+                "stage_cache_hits": 0,
+                "stage_cache_misses": 0
             }
             
             # 清空歷史記錄
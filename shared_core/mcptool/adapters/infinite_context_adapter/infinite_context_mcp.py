@@ -14,6 +14,13 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from collections import defaultdict, deque
 
+try:
+    from .tiered_memory_store import TieredMemoryStore
+    from .context_compressor import ContextCompressor, estimate_tokens
+except ImportError:
+    from tiered_memory_store import TieredMemoryStore
+    from context_compressor import ContextCompressor, estimate_tokens
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("infinite_context")
@@ -21,22 +28,26 @@ logger = logging.getLogger("infinite_context")
 class InfiniteContextAdapterMCP:
     """無限上下文適配器"""
     
-    def __init__(self):
-        """初始化適配器"""
+    def __init__(self, storage_path: Optional[str] = None,
+                 hot_budget_bytes: int = 8 * 1024 * 1024):
+        """初始化適配器
+        
+        storage_path 為 None 時記憶只屬於本實例（臨時冷層），傳入路徑才持久化並可被其他進程共享。
+        """
         self.adapter_name = "infinite_context"
         self.version = "1.0.0"
         self.is_available = True
         
-        # 上下文存儲
-        self.context_store = {}
-        self.memory_bank = defaultdict(list)
+        # 上下文、記憶和知識圖譜共用分層存儲：熱層有字節預算，超出部分降級到磁盤冷層
+        self.memory_store = TieredMemoryStore(storage_path, hot_budget_bytes=hot_budget_bytes)
         self.conversation_history = deque(maxlen=1000)
-        self.knowledge_graph = defaultdict(dict)
+        self.compressor = ContextCompressor()
         
         # 配置參數
         self.max_context_length = 100000  # 最大上下文長度
         self.memory_retention_days = 30   # 記憶保持天數
         self.similarity_threshold = 0.7   # 相似度閾值
+        self._last_purge = datetime.now()
         
         # 上下文分析能力
         self.context_capabilities = {
@@ -68,7 +79,7 @@ class InfiniteContextAdapterMCP:
                 "name": "上下文壓縮器",
                 "description": "智能壓縮長文本保留關鍵信息",
                 "category": "compression",
-                "parameters": ["text", "compression_ratio", "preserve_keywords"]
+                "parameters": ["text", "token_budget", "compression_ratio", "preserve_keywords"]
             },
             "search_knowledge": {
                 "name": "知識搜索器",
@@ -199,48 +210,53 @@ class InfiniteContextAdapterMCP:
                     'similarity_threshold': self.similarity_threshold
                 },
                 'performance_metrics': {
-                    'context_entries': len(self.context_store),
-                    'memory_entries': sum(len(memories) for memories in self.memory_bank.values()),
+                    'context_entries': self.memory_store.count('context'),
+                    'memory_entries': self.memory_store.count('memory'),
                     'conversation_history_length': len(self.conversation_history),
-                    'knowledge_graph_nodes': len(self.knowledge_graph)
+                    'knowledge_graph_nodes': self.memory_store.count('knowledge')
                 }
             }
         }
     
     def _get_context_stats(self) -> Dict[str, Any]:
         """獲取上下文統計信息"""
-        total_memory_size = sum(len(str(memories)) for memories in self.memory_bank.values())
+        store_stats = self.memory_store.get_stats()
+        context_entries = self.memory_store.count('context')
+        knowledge_nodes = self.memory_store.count('knowledge')
+        memory_categories = self.memory_store.categories('memory')
         
         return {
             'status': 'success',
             'message': '上下文統計信息獲取成功',
             'data': {
                 'storage_stats': {
-                    'context_store_entries': len(self.context_store),
-                    'memory_bank_categories': len(self.memory_bank),
-                    'total_memory_size_bytes': total_memory_size,
+                    'context_store_entries': context_entries,
+                    'memory_bank_categories': len(memory_categories),
+                    'total_memory_size_bytes': store_stats['hot_bytes'],
                     'conversation_history_length': len(self.conversation_history),
-                    'knowledge_graph_nodes': len(self.knowledge_graph)
+                    'knowledge_graph_nodes': knowledge_nodes,
+                    'tiers': store_stats
                 },
                 'performance_stats': {
                     'average_context_length': self._calculate_average_context_length(),
-                    'memory_utilization': min(total_memory_size / (self.max_context_length * 10), 1.0),
-                    'knowledge_density': len(self.knowledge_graph) / max(len(self.context_store), 1)
+                    'memory_utilization': min(store_stats['hot_bytes'] / max(store_stats['hot_budget_bytes'], 1), 1.0),
+                    'knowledge_density': knowledge_nodes / max(context_entries, 1)
                 },
                 'recent_activity': {
                     'last_context_update': self._get_last_update_time(),
-                    'active_memory_categories': list(self.memory_bank.keys())[:5]
+                    'active_memory_categories': memory_categories[:5]
                 }
             }
         }
     
     def _calculate_average_context_length(self) -> float:
-        """計算平均上下文長度"""
-        if not self.context_store:
+        """計算平均上下文長度（熱層）"""
+        lengths = [record['payload'].get('analysis', {}).get('text_length', 0)
+                   for record in self.memory_store.hot_records('context')]
+        if not lengths:
             return 0.0
         
-        total_length = sum(len(str(context)) for context in self.context_store.values())
-        return total_length / len(self.context_store)
+        return sum(lengths) / len(lengths)
     
     def _get_last_update_time(self) -> str:
         """獲取最後更新時間"""
@@ -335,12 +351,12 @@ class InfiniteContextAdapterMCP:
             })
         
         # 存儲上下文
-        self.context_store[context_id] = {
+        self.memory_store.put(context_id, 'context', text, {
             'text': text,
             'analysis': analysis_result,
             'timestamp': datetime.now().isoformat(),
             'type': context_type
-        }
+        }, importance=self._calculate_importance(text), category=context_type)
         
         return analysis_result
     
@@ -544,12 +560,14 @@ class InfiniteContextAdapterMCP:
             'importance_score': self._calculate_importance(content)
         }
         
-        # 存儲記憶
-        self.memory_bank[memory_type].append(memory_entry)
+        # 存儲記憶（超出熱層預算時由存儲自動降級低優先級記憶）
+        self.memory_store.put(memory_id, 'memory', content, memory_entry,
+                              importance=memory_entry['importance_score'], category=memory_type)
         
-        # 記憶管理
-        if len(self.memory_bank[memory_type]) > 100:  # 限制記憶數量
-            self._cleanup_memory(memory_type)
+        # 記憶管理：每天最多清理一次超過保留期的冷層記憶
+        if datetime.now() - self._last_purge > timedelta(days=1):
+            self.memory_store.purge_older_than(self.memory_retention_days * 86400)
+            self._last_purge = datetime.now()
         
         return {
             'memory_id': memory_id,
@@ -557,7 +575,7 @@ class InfiniteContextAdapterMCP:
             'content_length': len(content),
             'importance_score': memory_entry['importance_score'],
             'retention_policy': retention_policy,
-            'total_memories': len(self.memory_bank[memory_type]),
+            'total_memories': self.memory_store.count('memory', memory_type),
             'storage_status': 'success'
         }
     
@@ -588,65 +606,35 @@ class InfiniteContextAdapterMCP:
         
         return min(importance_score, 1.0)
     
-    def _cleanup_memory(self, memory_type: str):
-        """清理記憶"""
-        memories = self.memory_bank[memory_type]
-        
-        # 按重要性和訪問次數排序，保留前80個
-        memories.sort(key=lambda x: (x['importance_score'], x['access_count']), reverse=True)
-        self.memory_bank[memory_type] = memories[:80]
-        
-        logger.info(f"清理 {memory_type} 記憶，保留 {len(self.memory_bank[memory_type])} 條")
-    
     def _execute_compress_context(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """執行上下文壓縮"""
+        """執行上下文壓縮
+        
+        優先按 token_budget 壓縮；未指定時按 compression_ratio 換算為token預算。
+        """
         text = params.get('text', '')
         compression_ratio = params.get('compression_ratio', 0.5)
         preserve_keywords = params.get('preserve_keywords', [])
+        token_budget = params.get('token_budget')
         
         if not text:
             return {'error': '壓縮文本不能為空'}
         
-        # 簡化的文本壓縮
-        sentences = [s.strip() for s in text.split('.') if s.strip()]
-        target_sentences = max(1, int(len(sentences) * compression_ratio))
-        
-        # 計算句子重要性
-        sentence_scores = []
-        for i, sentence in enumerate(sentences):
-            score = 0.5  # 基礎分數
-            
-            # 關鍵詞加分
-            for keyword in preserve_keywords:
-                if keyword.lower() in sentence.lower():
-                    score += 0.3
-            
-            # 長度加分（適中長度的句子更重要）
-            word_count = len(sentence.split())
-            if 10 <= word_count <= 30:
-                score += 0.2
-            
-            # 數字和數據加分
-            import re
-            if re.search(r'\d+', sentence):
-                score += 0.2
-            
-            sentence_scores.append((score, i, sentence))
+        if token_budget is None:
+            token_budget = max(1, int(estimate_tokens(text) * compression_ratio))
         
-        # 選擇最重要的句子
-        sentence_scores.sort(reverse=True)
-        selected_sentences = sentence_scores[:target_sentences]
-        selected_sentences.sort(key=lambda x: x[1])  # 按原順序排列
-        
-        compressed_text = '. '.join([s[2] for s in selected_sentences]) + '.'
+        result = self.compressor.compress(text, int(token_budget), preserve_keywords)
+        compressed_text = result['compressed_text']
         
         return {
             'original_length': len(text),
             'compressed_length': len(compressed_text),
             'compression_ratio': len(compressed_text) / len(text),
             'target_ratio': compression_ratio,
-            'sentences_original': len(sentences),
-            'sentences_compressed': len(selected_sentences),
+            'token_budget': result['token_budget'],
+            'original_tokens': result['original_tokens'],
+            'compressed_tokens': result['compressed_tokens'],
+            'sentences_original': result['sentences_original'],
+            'sentences_compressed': result['sentences_compressed'],
             'preserved_keywords': preserve_keywords,
             'compressed_text': compressed_text
         }
@@ -661,32 +649,29 @@ class InfiniteContextAdapterMCP:
             return {'error': '搜索查詢不能為空'}
         
         search_results = []
-        query_lower = query.lower()
         
-        # 搜索上下文存儲
-        for context_id, context_data in self.context_store.items():
-            relevance_score = self._calculate_relevance(query_lower, context_data)
-            
-            if relevance_score > self.similarity_threshold:
+        # 通過熱層倒排索引和冷層FTS5同時檢索上下文和記憶
+        for record in self.memory_store.search(query, kinds=('context', 'memory'), limit=max_results,
+                                               min_relevance=self.similarity_threshold):
+            payload = record['payload']
+            if record['kind'] == 'context':
                 search_results.append({
-                    'context_id': context_id,
-                    'relevance_score': relevance_score,
-                    'context_type': context_data.get('type', 'unknown'),
-                    'timestamp': context_data.get('timestamp', ''),
-                    'text_preview': context_data.get('text', '')[:200] + '...'
+                    'context_id': record['id'],
+                    'relevance_score': record['relevance'],
+                    'context_type': payload.get('type', 'unknown'),
+                    'timestamp': payload.get('timestamp', ''),
+                    'text_preview': payload.get('text', '')[:200] + '...',
+                    'tier': record['tier']
+                })
+            else:
+                search_results.append({
+                    'memory_id': record['id'],
+                    'memory_type': record['category'],
+                    'relevance_score': record['relevance'],
+                    'importance_score': payload.get('importance_score', record['importance']),
+                    'content_preview': payload.get('content', '')[:200] + '...',
+                    'tier': record['tier']
                 })
-        
-        # 搜索記憶庫
-        for memory_type, memories in self.memory_bank.items():
-            for memory in memories:
-                if query_lower in memory['content'].lower():
-                    search_results.append({
-                        'memory_id': memory['id'],
-                        'memory_type': memory_type,
-                        'relevance_score': 0.8,
-                        'importance_score': memory['importance_score'],
-                        'content_preview': memory['content'][:200] + '...'
-                    })
         
         # 排序和限制結果
         search_results.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
@@ -697,23 +682,10 @@ class InfiniteContextAdapterMCP:
             'search_type': search_type,
             'results': search_results,
             'total_found': len(search_results),
-            'search_domains': ['context_store', 'memory_bank'],
+            'search_domains': ['context_store', 'memory_bank', 'cold_storage'],
             'similarity_threshold': self.similarity_threshold
         }
     
-    def _calculate_relevance(self, query: str, context_data: Dict[str, Any]) -> float:
-        """計算相關性分數"""
-        text = context_data.get('text', '').lower()
-        
-        # 簡單的相關性計算
-        query_words = query.split()
-        text_words = text.split()
-        
-        matches = sum(1 for word in query_words if word in text_words)
-        relevance = matches / len(query_words) if query_words else 0
-        
-        return relevance
-    
     def _execute_synthesize_context(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """執行上下文合成"""
         contexts = params.get('contexts', [])
@@ -867,11 +839,11 @@ class InfiniteContextAdapterMCP:
         
         # 存儲學習結果到知識圖譜
         pattern_id = hashlib.md5(str(learning_result).encode()).hexdigest()
-        self.knowledge_graph[pattern_id] = {
+        self.memory_store.put(pattern_id, 'knowledge', json.dumps(learning_result, ensure_ascii=False, default=str), {
             'type': 'learned_pattern',
             'result': learning_result,
             'timestamp': datetime.now().isoformat()
-        }
+        }, category=pattern_type)
         
         learning_result['pattern_id'] = pattern_id
         
@@ -888,6 +860,7 @@ def create_cli_interface():
     parser.add_argument('--tool-name', help='工具名稱')
     parser.add_argument('--query', help='搜索查詢')
     parser.add_argument('--params', help='工具參數（JSON格式）')
+    parser.add_argument('--storage-path', help='記憶存儲數據庫路徑（不指定時使用臨時存儲，不保留記憶）')
     
     return parser
 
@@ -897,7 +870,7 @@ def main():
     args = parser.parse_args()
     
     # 初始化適配器
-    adapter = InfiniteContextAdapterMCP()
+    adapter = InfiniteContextAdapterMCP(storage_path=args.storage_path)
     
     # 構建請求
     request = {'action': args.action}
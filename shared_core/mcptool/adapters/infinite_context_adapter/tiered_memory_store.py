@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+分層記憶存儲 - 無限上下文適配器
+
+熱層保存在內存中，按重要性、訪問次數和最近訪問時間組成的優先級放入最小堆，
+超出字節預算時把優先級最低的條目降級到磁盤上的冷層 (SQLite FTS5)；
+訪問冷層條目時將其提升回熱層。搜索同時覆蓋兩層，均走倒排索引。
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+logger = logging.getLogger("infinite_context.tiered_memory_store")
+
+# ASCII詞或連續的CJK字符
+_TOKEN_PATTERN = re.compile(r'[a-z0-9_]+|[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+')
+
+# 最近訪問時間換算為優先級的尺度：晚一天訪問相當於重要性 +1
+RECENCY_SCALE_SECONDS = 86400.0
+
+def tokenize(text: str) -> List[str]:
+    """多語言分詞：ASCII按詞切分，CJK按字二元組切分（單字保留為一元組）"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if word[0].isascii():
+            tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+class TieredMemoryStore:
+    """熱層 (內存 + 堆) / 冷層 (SQLite FTS5) 兩級記憶存儲
+    
+    db_path 為 None 時冷層使用實例私有的臨時文件，關閉或回收時刪除；
+    需要跨進程持久化或共享記憶時顯式傳入 db_path。
+    """
+    
+    def __init__(self, db_path: Optional[str] = None,
+                 hot_budget_bytes: int = 8 * 1024 * 1024):
+        self.db_path = db_path
+        self.persistent = db_path is not None
+        self.hot_budget_bytes = hot_budget_bytes
+        self._temp_dir: Optional[str] = None
+        self._cleanup = None
+        
+        # 熱層
+        self._hot: Dict[str, Dict[str, Any]] = {}
+        self._hot_sizes: Dict[str, int] = {}
+        self._hot_bytes = 0
+        self._heap: List[Tuple[float, int, str]] = []
+        self._versions: Dict[str, int] = {}
+        self._version_counter = 0
+        self._index: Dict[str, set] = defaultdict(set)
+        
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats = {
+            "hot_hits": 0,
+            "cold_hits": 0,
+            "misses": 0,
+            "promotions": 0,
+            "demotions": 0
+        }
+    
+    # ---- 冷層 ----
+    
+    def _has_cold(self) -> bool:
+        """冷層是否已經存在（避免為只讀查詢創建數據庫）"""
+        return self._conn is not None or (self.db_path is not None and os.path.exists(self.db_path))
+    
+    def _db(self) -> sqlite3.Connection:
+        """延遲打開冷層數據庫"""
+        if self._conn is None:
+            if self.db_path is None:
+                self._temp_dir = tempfile.mkdtemp(prefix="infinite_context_")
+                self._cleanup = weakref.finalize(self, shutil.rmtree, self._temp_dir, True)
+                self.db_path = os.path.join(self._temp_dir, "memory_store.db")
+            elif self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    category TEXT,
+                    importance REAL,
+                    access_count INTEGER,
+                    last_access REAL,
+                    record TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_kind ON entries (kind, category)")
+            # 預先分好詞的文本交給FTS5索引，CJK二元組在unicode61分詞器下也能正確匹配
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(id UNINDEXED, tokens)")
+            self._conn = conn
+        return self._conn
+    
+    def _write_cold(self, record: Dict[str, Any]):
+        conn = self._db()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (record["id"], record["kind"], record.get("category"), record["importance"],
+                 record["access_count"], record["last_access"], json.dumps(record, ensure_ascii=False))
+            )
+            conn.execute("DELETE FROM entries_fts WHERE id = ?", (record["id"],))
+            conn.execute("INSERT INTO entries_fts (id, tokens) VALUES (?, ?)",
+                         (record["id"], " ".join(record["tokens"])))
+    
+    def _take_cold(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        """從冷層取出並刪除條目"""
+        if not self._has_cold():
+            return None
+        conn = self._db()
+        row = conn.execute("SELECT record FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+            conn.execute("DELETE FROM entries_fts WHERE id = ?", (entry_id,))
+        return json.loads(row[0])
+    
+    # ---- 熱層 ----
+    
+    @staticmethod
+    def _priority(record: Dict[str, Any]) -> float:
+        """優先級只依賴寫入時的狀態，因此堆中的鍵不會隨時間失效"""
+        return (record["importance"]
+                + 0.2 * math.log1p(record["access_count"])
+                + record["last_access"] / RECENCY_SCALE_SECONDS)
+    
+    def _push(self, record: Dict[str, Any]):
+        self._version_counter += 1
+        self._versions[record["id"]] = self._version_counter
+        heapq.heappush(self._heap, (self._priority(record), self._version_counter, record["id"]))
+        
+        # 過期的堆項過多時重建
+        if len(self._heap) > 2 * len(self._hot) + 64:
+            self._heap = [(self._priority(r), self._versions[i], i) for i, r in self._hot.items()]
+            heapq.heapify(self._heap)
+    
+    def _add_hot(self, record: Dict[str, Any]):
+        entry_id = record["id"]
+        if entry_id in self._hot:
+            self._remove_hot(entry_id)
+        size = len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        self._hot[entry_id] = record
+        self._hot_sizes[entry_id] = size
+        self._hot_bytes += size
+        for token in set(record["tokens"]):
+            self._index[token].add(entry_id)
+        self._push(record)
+    
+    def _remove_hot(self, entry_id: str) -> Dict[str, Any]:
+        record = self._hot.pop(entry_id)
+        self._hot_bytes -= self._hot_sizes.pop(entry_id)
+        self._versions.pop(entry_id, None)
+        for token in set(record["tokens"]):
+            ids = self._index.get(token)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._index[token]
+        return record
+    
+    def _enforce_budget(self, protect: Optional[str] = None):
+        """超出預算時按優先級從低到高降級到冷層，剛訪問的條目 protect 保留在熱層"""
+        protected_item = None
+        while self._hot_bytes > self.hot_budget_bytes and self._heap:
+            item = heapq.heappop(self._heap)
+            _, version, entry_id = item
+            if self._versions.get(entry_id) != version:
+                continue  # 過期堆項
+            if entry_id == protect:
+                protected_item = item
+                continue
+            self._write_cold(self._remove_hot(entry_id))
+            self.stats["demotions"] += 1
+        if protected_item is not None:
+            heapq.heappush(self._heap, protected_item)
+    
+    # ---- 公共接口 ----
+    
+    def put(self, entry_id: str, kind: str, text: str, payload: Dict[str, Any],
+            importance: float = 0.5, category: Optional[str] = None) -> Dict[str, Any]:
+        """寫入條目（已存在則覆蓋），新條目進入熱層"""
+        now = time.time()
+        with self._lock:
+            previous = self._hot.get(entry_id) or self._take_cold(entry_id)
+            record = {
+                "id": entry_id,
+                "kind": kind,
+                "category": category,
+                "importance": importance,
+                "access_count": previous["access_count"] if previous else 0,
+                "created_at": previous["created_at"] if previous else now,
+                "last_access": now,
+                "tokens": tokenize(text),
+                "payload": payload
+            }
+            self._add_hot(record)
+            self._enforce_budget()
+            return record
+    
+    def get(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        """讀取條目並記錄訪問；冷層條目會被提升回熱層"""
+        with self._lock:
+            record = self._hot.get(entry_id)
+            if record is not None:
+                self.stats["hot_hits"] += 1
+                self._remove_hot(entry_id)
+            else:
+                record = self._take_cold(entry_id)
+                if record is None:
+                    self.stats["misses"] += 1
+                    return None
+                self.stats["cold_hits"] += 1
+                self.stats["promotions"] += 1
+            
+            record["access_count"] += 1
+            record["last_access"] = time.time()
+            self._add_hot(record)
+            self._enforce_budget(protect=entry_id)
+            return record
+    
+    def search(self, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 10,
+               min_relevance: float = 0.0) -> List[Dict[str, Any]]:
+        """在熱層和冷層中檢索，相關度為命中的查詢詞比例
+        
+        返回的記錄附帶 relevance 和 tier 字段，按相關度和重要性排序。
+        """
+        query_tokens = set(tokenize(query))
+        if not query_tokens:
+            return []
+        kinds = set(kinds) if kinds else None
+        candidates: Dict[str, Tuple[float, Dict[str, Any], str]] = {}
+        
+        with self._lock:
+            # 熱層：倒排索引
+            hits: Dict[str, int] = defaultdict(int)
+            for token in query_tokens:
+                for entry_id in self._index.get(token, ()):
+                    hits[entry_id] += 1
+            for entry_id, count in hits.items():
+                record = self._hot[entry_id]
+                if kinds is None or record["kind"] in kinds:
+                    candidates[entry_id] = (count / len(query_tokens), record, "hot")
+            
+            # 冷層：FTS5
+            if self._has_cold():
+                match = " OR ".join('"' + token.replace('"', '""') + '"' for token in query_tokens)
+                rows = self._db().execute(
+                    """SELECT e.record FROM entries_fts f JOIN entries e ON e.id = f.id
+                       WHERE entries_fts MATCH ? ORDER BY bm25(entries_fts) LIMIT ?""",
+                    (match, max(limit * 5, 50))
+                ).fetchall()
+                for (raw,) in rows:
+                    record = json.loads(raw)
+                    if kinds is not None and record["kind"] not in kinds:
+                        continue
+                    matched = len(query_tokens.intersection(record["tokens"]))
+                    candidates[record["id"]] = (matched / len(query_tokens), record, "cold")
+        
+        results = [
+            {**record, "relevance": relevance, "tier": tier}
+            for relevance, record, tier in candidates.values()
+            if relevance >= min_relevance
+        ]
+        results.sort(key=lambda r: (r["relevance"], r["importance"]), reverse=True)
+        return results[:limit]
+    
+    def hot_records(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """熱層中的條目快照（不記錄訪問）"""
+        with self._lock:
+            return [r for r in self._hot.values() if kind is None or r["kind"] == kind]
+    
+    def count(self, kind: Optional[str] = None, category: Optional[str] = None) -> int:
+        """統計兩層中的條目數"""
+        with self._lock:
+            hot = sum(1 for r in self._hot.values()
+                      if (kind is None or r["kind"] == kind) and (category is None or r["category"] == category))
+            if not self._has_cold():
+                return hot
+            sql, args = "SELECT COUNT(*) FROM entries WHERE 1=1", []
+            if kind is not None:
+                sql += " AND kind = ?"
+                args.append(kind)
+            if category is not None:
+                sql += " AND category = ?"
+                args.append(category)
+            return hot + self._db().execute(sql, args).fetchone()[0]
+    
+    def categories(self, kind: str) -> List[str]:
+        """列出某類條目的所有分類"""
+        with self._lock:
+            found = {r["category"] for r in self._hot.values() if r["kind"] == kind and r["category"]}
+            if self._has_cold():
+                rows = self._db().execute(
+                    "SELECT DISTINCT category FROM entries WHERE kind = ? AND category IS NOT NULL", (kind,))
+                found.update(row[0] for row in rows)
+            return sorted(found)
+    
+    def purge_older_than(self, max_age_seconds: float) -> int:
+        """刪除冷層中超過保留期且長期未訪問的條目"""
+        if not self._has_cold():
+            return 0
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute("DELETE FROM entries_fts WHERE id IN (SELECT id FROM entries WHERE last_access < ?)",
+                             (cutoff,))
+                removed = conn.execute("DELETE FROM entries WHERE last_access < ?", (cutoff,)).rowcount
+        return removed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取分層存儲統計"""
+        with self._lock:
+            cold_entries = 0
+            if self._has_cold():
+                cold_entries = self._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                **self.stats,
+                "hot_entries": len(self._hot),
+                "hot_bytes": self._hot_bytes,
+                "hot_budget_bytes": self.hot_budget_bytes,
+                "cold_entries": cold_entries,
+                "indexed_tokens": len(self._index)
+            }
+    
+    def close(self):
+        """持久化存儲把熱層寫入冷層並關閉數據庫；私有臨時存儲直接丟棄"""
+        with self._lock:
+            for entry_id in list(self._hot):
+                record = self._remove_hot(entry_id)
+                if self.persistent:
+                    self._write_cold(record)
+            self._heap.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self._cleanup is not None:
+                self._cleanup()
+                self._cleanup = None
+                self.db_path = None
@@ -8,8 +8,10 @@ import json
 import logging
 import asyncio
 import threading
+import queue
 import time
-from typing import Dict, List, Any, Optional, Callable
+from collections import deque
+from typing import Dict, List, Any, Optional, Callable, Tuple
 from datetime import datetime
 import os
 import sys
@@ -42,6 +44,245 @@ def get_instance(project_root: str = None):
         _instance = IntelligentWorkflowEngineMCP(project_root)
     return _instance
 
+class WorkflowEventBus:
+    """
+    非阻塞事件总线
+    
+    - 每个主题一个有界队列，发布方只入队，不执行监听器
+    - 监听器列表写时复制，分发时不持有任何锁，注册不会被慢监听器阻塞
+    - 工作线程池按主题轮转分发：同一主题同时只由一个线程处理，保证主题内顺序
+    - 队列满时按策略处理：drop_oldest / drop_newest / block（带超时的背压）
+    - 记录每个主题的发布、分发、丢弃、错误计数和分发延迟
+    """
+    
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    BLOCK = "block"
+    
+    def __init__(self, max_workers: int = 4, queue_size: int = 1000,
+                 drop_policy: str = DROP_OLDEST, block_timeout: float = 1.0,
+                 dispatch_batch: int = 32, latency_window: int = 1000):
+        if drop_policy not in (self.DROP_OLDEST, self.DROP_NEWEST, self.BLOCK):
+            raise ValueError(f"未知的丢弃策略: {drop_policy}")
+        
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.dispatch_batch = dispatch_batch
+        self.latency_window = latency_window
+        
+        self._listeners: Dict[str, Tuple[Callable, ...]] = {}
+        self._subscribe_lock = threading.Lock()
+        
+        self._queues: Dict[str, queue.Queue] = {}
+        self._ready_topics: queue.Queue = queue.Queue()
+        self._scheduled_topics = set()
+        self._schedule_lock = threading.Lock()
+        
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._metrics_lock = threading.Lock()
+        
+        self._pending = 0
+        self._pending_condition = threading.Condition()
+        
+        self._workers: List[threading.Thread] = []
+        self._started = False
+        self._start_lock = threading.Lock()
+    
+    @property
+    def listeners(self) -> Dict[str, List[Callable]]:
+        """当前监听器快照"""
+        return {topic: list(callbacks) for topic, callbacks in self._listeners.items()}
+    
+    def subscribe(self, topic: str, callback: Callable):
+        """注册监听器（写时复制，不影响正在进行的分发）"""
+        with self._subscribe_lock:
+            listeners = dict(self._listeners)
+            listeners[topic] = listeners.get(topic, ()) + (callback,)
+            self._listeners = listeners
+    
+    def unsubscribe(self, topic: str, callback: Callable):
+        """移除监听器"""
+        with self._subscribe_lock:
+            listeners = dict(self._listeners)
+            remaining = tuple(cb for cb in listeners.get(topic, ()) if cb is not callback)
+            if remaining:
+                listeners[topic] = remaining
+            else:
+                listeners.pop(topic, None)
+            self._listeners = listeners
+    
+    def publish(self, topic: str, event_data: Dict[str, Any]) -> bool:
+        """发布事件，立即返回；返回False表示事件被丢弃"""
+        self._ensure_started()
+        topic_queue = self._get_queue(topic)
+        item = (time.perf_counter(), event_data)
+        
+        # 先计入待处理数再入队，避免工作线程先取出事件导致计数短暂为负、flush 提前返回
+        with self._pending_condition:
+            self._pending += 1
+        
+        accepted = True
+        dropped = 0
+        if self.drop_policy == self.DROP_NEWEST:
+            try:
+                topic_queue.put_nowait(item)
+            except queue.Full:
+                accepted, dropped = False, 1
+        elif self.drop_policy == self.BLOCK:
+            try:
+                topic_queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                accepted, dropped = False, 1
+        else:
+            while True:
+                try:
+                    topic_queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        topic_queue.get_nowait()
+                        dropped += 1
+                        self._finish_pending(1)
+                    except queue.Empty:
+                        pass
+        
+        with self._metrics_lock:
+            metrics = self._topic_metrics(topic)
+            metrics["published"] += 1
+            metrics["dropped"] += dropped
+        
+        if accepted:
+            self._schedule(topic)
+        else:
+            self._finish_pending(1)
+        return accepted
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有已入队事件分发完毕"""
+        with self._pending_condition:
+            return self._pending_condition.wait_for(lambda: self._pending == 0, timeout)
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """每个主题的计数、队列深度和分发延迟（毫秒）"""
+        with self._metrics_lock:
+            snapshot = {}
+            for topic, metrics in self._metrics.items():
+                latencies = sorted(metrics["latencies_ms"])
+                topic_queue = self._queues.get(topic)
+                snapshot[topic] = {
+                    "published": metrics["published"],
+                    "dispatched": metrics["dispatched"],
+                    "dropped": metrics["dropped"],
+                    "errors": metrics["errors"],
+                    "queue_depth": topic_queue.qsize() if topic_queue else 0,
+                    "listeners": len(self._listeners.get(topic, ())),
+                    "avg_dispatch_latency_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+                    "p95_dispatch_latency_ms": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+                    "max_dispatch_latency_ms": latencies[-1] if latencies else 0.0,
+                    "avg_handler_time_ms": metrics["handler_time_ms"] / metrics["dispatched"] if metrics["dispatched"] else 0.0
+                }
+            return snapshot
+    
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """停止工作线程"""
+        if wait:
+            self.flush(timeout)
+        for _ in self._workers:
+            self._ready_topics.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout)
+        self._workers = []
+        self._started = False
+    
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"workflow-event-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._started = True
+    
+    def _get_queue(self, topic: str) -> queue.Queue:
+        topic_queue = self._queues.get(topic)
+        if topic_queue is None:
+            with self._schedule_lock:
+                topic_queue = self._queues.setdefault(topic, queue.Queue(maxsize=self.queue_size))
+        return topic_queue
+    
+    def _topic_metrics(self, topic: str) -> Dict[str, Any]:
+        metrics = self._metrics.get(topic)
+        if metrics is None:
+            metrics = self._metrics[topic] = {
+                "published": 0,
+                "dispatched": 0,
+                "dropped": 0,
+                "errors": 0,
+                "handler_time_ms": 0.0,
+                "latencies_ms": deque(maxlen=self.latency_window)
+            }
+        return metrics
+    
+    def _schedule(self, topic: str):
+        with self._schedule_lock:
+            if topic not in self._scheduled_topics:
+                self._scheduled_topics.add(topic)
+                self._ready_topics.put(topic)
+    
+    def _finish_pending(self, count: int):
+        with self._pending_condition:
+            self._pending -= count
+            if self._pending <= 0:
+                self._pending_condition.notify_all()
+    
+    def _worker_loop(self):
+        while True:
+            topic = self._ready_topics.get()
+            if topic is None:
+                return
+            
+            topic_queue = self._queues[topic]
+            for _ in range(self.dispatch_batch):
+                try:
+                    enqueued_at, event_data = topic_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._dispatch(topic, enqueued_at, event_data)
+            
+            # 队列仍有事件则重新排队，让其他主题有机会被处理
+            with self._schedule_lock:
+                if topic_queue.empty():
+                    self._scheduled_topics.discard(topic)
+                else:
+                    self._ready_topics.put(topic)
+    
+    def _dispatch(self, topic: str, enqueued_at: float, event_data: Dict[str, Any]):
+        started_at = time.perf_counter()
+        errors = 0
+        
+        for callback in self._listeners.get(topic, ()):
+            try:
+                callback(event_data)
+            except Exception as e:
+                errors += 1
+                logger.error(f"事件处理异常: {str(e)}")
+        
+        finished_at = time.perf_counter()
+        with self._metrics_lock:
+            metrics = self._topic_metrics(topic)
+            metrics["dispatched"] += 1
+            metrics["errors"] += errors
+            metrics["handler_time_ms"] += (finished_at - started_at) * 1000
+            metrics["latencies_ms"].append((started_at - enqueued_at) * 1000)
+        
+        self._finish_pending(1)
+
 class IntelligentWorkflowEngineMCP(BaseMCP):
     """智能工作流引擎MCP适配器 - 整合版"""
     
@@ -60,8 +301,8 @@ class IntelligentWorkflowEngineMCP(BaseMCP):
         self.workflow_nodes = []
         self.workflow_connections = []
         
-        # 初始化事件监听器
-        self.event_listeners = {}
+        # 初始化事件总线
+        self.event_bus = WorkflowEventBus()
         
         # 初始化工作流状态
         self.workflow_status = {
@@ -74,9 +315,6 @@ class IntelligentWorkflowEngineMCP(BaseMCP):
         # 初始化工作流线程
         self.workflow_thread = None
         
-        # 初始化事件同步锁
-        self.event_lock = threading.Lock()
-        
         # 初始化测试模式标志
         self.is_test_mode = False
         
@@ -148,6 +386,8 @@ class IntelligentWorkflowEngineMCP(BaseMCP):
                 return self._register_event_listener_action(input_data)
             elif action == "trigger_event":
                 return self._trigger_event_action(input_data)
+            elif action == "get_event_metrics":
+                return self._get_event_metrics_action()
             else:
                 return {
                     "status": "error",
@@ -413,26 +653,24 @@ class IntelligentWorkflowEngineMCP(BaseMCP):
     
     # WorkflowDriver集成方法
     
+    @property
+    def event_listeners(self) -> Dict[str, List[Callable]]:
+        """已注册的事件监听器快照"""
+        return self.event_bus.listeners
+    
     def register_event_listener(self, event_type: str, callback: Callable):
         """注册事件监听器"""
-        with self.event_lock:
-            if event_type not in self.event_listeners:
-                self.event_listeners[event_type] = []
-            
-            self.event_listeners[event_type].append(callback)
-            logger.info(f"已注册事件监听器: {event_type}")
-    
-    def trigger_event(self, event_type: str, event_data: Dict[str, Any]):
-        """触发事件"""
-        with self.event_lock:
-            if event_type in self.event_listeners:
-                for callback in self.event_listeners[event_type]:
-                    try:
-                        callback(event_data)
-                    except Exception as e:
-                        logger.error(f"事件处理异常: {str(e)}")
-            
+        self.event_bus.subscribe(event_type, callback)
+        logger.info(f"已注册事件监听器: {event_type}")
+    
+    def trigger_event(self, event_type: str, event_data: Dict[str, Any]) -> bool:
+        """触发事件（异步分发，不等待监听器执行）"""
+        accepted = self.event_bus.publish(event_type, event_data)
+        if accepted:
             logger.info(f"已触发事件: {event_type}")
+        else:
+            logger.warning(f"事件队列已满，事件被丢弃: {event_type}")
+        return accepted
     
     def create_workflow_node(self, node_type: str, name: str, description: str, data: Dict[str, Any] = None) -> str:
         """创建工作流节点"""
@@ -906,11 +1144,19 @@ class IntelligentWorkflowEngineMCP(BaseMCP):
                 "timestamp": datetime.now().isoformat()
             }
         
-        self.trigger_event(event_type, event_data)
+        accepted = self.trigger_event(event_type, event_data)
         
+        return {
+            "status": "success" if accepted else "error",
+            "message": f"事件已触发: {event_type}" if accepted else f"事件队列已满，事件被丢弃: {event_type}",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _get_event_metrics_action(self) -> Dict[str, Any]:
+        """获取事件总线指标的MCP接口"""
         return {
             "status": "success",
-            "message": f"事件已触发: {event_type}",
+            "event_metrics": self.event_bus.get_metrics(),
             "timestamp": datetime.now().isoformat()
         }
     
@@ -10,11 +10,15 @@ import asyncio
 import logging
 import platform
 import subprocess
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, AsyncIterator
 from pathlib import Path
-import requests
 import time
 
+try:
+    from mcptool.adapters.core.pooled_http_client import get_shared_http_client
+except ImportError:
+    from shared_core.mcptool.adapters.core.pooled_http_client import get_shared_http_client
+
 logger = logging.getLogger(__name__)
 
 class Qwen3LocalModelMCP:
@@ -26,6 +30,10 @@ class Qwen3LocalModelMCP:
         self.base_url = self.config.get('base_url', 'http://localhost:11434')
         self.api_endpoint = f"{self.base_url}/api/generate"
         self.chat_endpoint = f"{self.base_url}/api/chat"
+        self.request_timeout = self.config.get('timeout', 60)
+        
+        # 進程內共享的連接池客戶端，避免每次調用新建TCP連接並阻塞事件循環
+        self.http = get_shared_http_client()
         
         # 平台檢測
         self.platform = platform.system().lower()
@@ -148,8 +156,8 @@ class Qwen3LocalModelMCP:
     async def _check_ollama_running(self) -> bool:
         """檢查Ollama服務是否運行"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
+            response = await self.http.request("GET", f"{self.base_url}/api/tags", timeout=5)
+            return response.status == 200
         except:
             return False
     
@@ -157,8 +165,8 @@ class Qwen3LocalModelMCP:
         """確保Qwen3模型可用"""
         try:
             # 檢查模型是否已下載
-            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
-            if response.status_code == 200:
+            response = await self.http.request("GET", f"{self.base_url}/api/tags", timeout=10)
+            if response.status == 200:
                 models = response.json().get('models', [])
                 for model in models:
                     if self.model_name in model.get('name', ''):
@@ -195,13 +203,16 @@ class Qwen3LocalModelMCP:
                 **kwargs
             }
             
-            response = requests.post(
+            # 相同的在途請求合併為一次調用
+            response = await self.http.request(
+                "POST",
                 self.api_endpoint,
-                json=payload,
-                timeout=60
+                json_body=payload,
+                timeout=self.request_timeout,
+                coalesce=True
             )
             
-            if response.status_code == 200:
+            if response.status == 200:
                 result = response.json()
                 return {
                     "success": True,
@@ -213,7 +224,7 @@ class Qwen3LocalModelMCP:
             else:
                 return {
                     "success": False,
-                    "error": f"API請求失敗: {response.status_code}",
+                    "error": f"API請求失敗: {response.status}",
                     "details": response.text
                 }
                 
@@ -224,6 +235,62 @@ class Qwen3LocalModelMCP:
                 "error": str(e)
             }
     
+    async def _stream_ndjson(self, endpoint: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """逐行解析Ollama的NDJSON流"""
+        async for line in self.http.stream_lines("POST", endpoint, json_body=payload,
+                                                 idle_timeout=self.request_timeout):
+            chunk = json.loads(line)
+            if chunk.get('error'):
+                raise RuntimeError(chunk['error'])
+            yield chunk
+    
+    async def stream_response(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """流式生成回應，每收到一個分片就產出一次
+        
+        產出 {"token", "done"}，最後一個分片附帶 context 和生成統計。
+        迭代由調用方驅動，提前停止迭代或取消任務會中止生成並關閉連接。
+        """
+        if not self.model_loaded:
+            await self.initialize()
+        
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            **kwargs,
+            "stream": True
+        }
+        
+        async for chunk in self._stream_ndjson(self.api_endpoint, payload):
+            result = {
+                "token": chunk.get('response', ''),
+                "done": chunk.get('done', False)
+            }
+            if result["done"]:
+                result.update({
+                    "context": chunk.get('context', []),
+                    "eval_count": chunk.get('eval_count'),
+                    "total_duration": chunk.get('total_duration')
+                })
+            yield result
+    
+    async def stream_chat(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """流式聊天完成，產出格式與 stream_response 相同"""
+        if not self.model_loaded:
+            await self.initialize()
+        
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            **kwargs,
+            "stream": True
+        }
+        
+        async for chunk in self._stream_ndjson(self.chat_endpoint, payload):
+            yield {
+                "token": chunk.get('message', {}).get('content', ''),
+                "done": chunk.get('done', False)
+            }
+    
     async def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
         """聊天完成"""
         try:
@@ -237,13 +304,15 @@ class Qwen3LocalModelMCP:
                 **kwargs
             }
             
-            response = requests.post(
+            response = await self.http.request(
+                "POST",
                 self.chat_endpoint,
-                json=payload,
-                timeout=60
+                json_body=payload,
+                timeout=self.request_timeout,
+                coalesce=True
             )
             
-            if response.status_code == 200:
+            if response.status == 200:
                 result = response.json()
                 return {
                     "success": True,
@@ -254,7 +323,7 @@ class Qwen3LocalModelMCP:
             else:
                 return {
                     "success": False,
-                    "error": f"聊天API請求失敗: {response.status_code}",
+                    "error": f"聊天API請求失敗: {response.status}",
                     "details": response.text
                 }
                 
@@ -268,13 +337,15 @@ class Qwen3LocalModelMCP:
     async def get_model_info(self) -> Dict[str, Any]:
         """獲取模型信息"""
         try:
-            response = requests.post(
+            response = await self.http.request(
+                "POST",
                 f"{self.base_url}/api/show",
-                json={"name": self.model_name},
-                timeout=10
+                json_body={"name": self.model_name},
+                timeout=10,
+                coalesce=True
             )
             
-            if response.status_code == 200:
+            if response.status == 200:
                 return {
                     "success": True,
                     "model_info": response.json()
@@ -282,7 +353,7 @@ class Qwen3LocalModelMCP:
             else:
                 return {
                     "success": False,
-                    "error": f"獲取模型信息失敗: {response.status_code}"
+                    "error": f"獲取模型信息失敗: {response.status}"
                 }
                 
         except Exception as e:
@@ -331,6 +402,7 @@ class Qwen3LocalModelMCP:
             "capabilities": [
                 "text_generation",
                 "chat_completion", 
+                "streaming",
                 "cross_platform_deployment",
                 "local_inference"
             ]
@@ -350,7 +422,7 @@ ADAPTER_METADATA = {
     "description": "Qwen3 8B本地模型適配器，支持Windows WSL、macOS和Linux",
     "author": "PowerAutomation Team",
     "supported_platforms": ["windows_wsl", "macos", "linux"],
-    "dependencies": ["ollama", "requests"],
+    "dependencies": ["ollama", "aiohttp"],
     "config_schema": {
         "base_url": {
             "type": "string",
@@ -365,7 +437,121 @@ ADAPTER_METADATA = {
     }
 }
 
+async def benchmark_local_client(requests_count: int = 200, concurrency: int = 16,
+                                 duplicate_ratio: float = 0.25) -> Dict[str, Any]:
+    """用本地模擬服務器對比阻塞式逐次請求和共享連接池客戶端的延遲與吞吐"""
+    import urllib.request
+    try:
+        from mcptool.adapters.core.local_mock_model_server import LocalMockModelServer
+    except ImportError:
+        from shared_core.mcptool.adapters.core.local_mock_model_server import LocalMockModelServer
+    
+    def percentile(values: List[float], q: float) -> float:
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else 0.0
+    
+    duplicate_every = int(1 / duplicate_ratio) if duplicate_ratio > 0 else 0
+    prompts = [f"提示 {0 if duplicate_every and i % duplicate_every == 0 else i}" for i in range(requests_count)]
+    results = {}
+    
+    with LocalMockModelServer(first_token_latency=0.01, token_latency=0.001) as server:
+        adapter = Qwen3LocalModelMCP({'base_url': server.base_url})
+        adapter.model_loaded = True
+        
+        # 修改前的做法：在協程內同步阻塞請求，每次新建連接
+        latencies = []
+        start = time.perf_counter()
+        for prompt in prompts:
+            request_start = time.perf_counter()
+            body = json.dumps({"model": adapter.model_name, "prompt": prompt, "stream": False}).encode()
+            request = urllib.request.Request(adapter.api_endpoint, data=body,
+                                             headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=60) as response:
+                json.loads(response.read())
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+        results["blocking_per_call"] = {
+            "requests_per_second": requests_count / elapsed,
+            "p50_ms": percentile(latencies, 0.5),
+            "p99_ms": percentile(latencies, 0.99)
+        }
+        
+        # 共享連接池客戶端，限制並發
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        
+        async def call(prompt: str):
+            async with semaphore:
+                request_start = time.perf_counter()
+                await adapter.generate_response(prompt)
+                latencies.append(time.perf_counter() - request_start)
+        
+        server_requests_before = server.request_count
+        start = time.perf_counter()
+        await asyncio.gather(*(call(prompt) for prompt in prompts))
+        elapsed = time.perf_counter() - start
+        results["pooled_async"] = {
+            "requests_per_second": requests_count / elapsed,
+            "p50_ms": percentile(latencies, 0.5),
+            "p99_ms": percentile(latencies, 0.99),
+            "server_requests": server.request_count - server_requests_before,
+            "client_stats": adapter.http.get_stats()
+        }
+        await adapter.http.close()
+    
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return results
+
+async def benchmark_time_to_first_token(runs: int = 20, tokens_per_response: int = 50,
+                                        token_latency: float = 0.01) -> Dict[str, Any]:
+    """用本地模擬服務器對比非流式與流式調用的首個token延遲"""
+    try:
+        from mcptool.adapters.core.local_mock_model_server import LocalMockModelServer
+    except ImportError:
+        from shared_core.mcptool.adapters.core.local_mock_model_server import LocalMockModelServer
+    
+    blocking_ttft, streaming_ttft, streaming_total = [], [], []
+    with LocalMockModelServer(first_token_latency=0.02, token_latency=token_latency,
+                              tokens_per_response=tokens_per_response) as server:
+        adapter = Qwen3LocalModelMCP({'base_url': server.base_url})
+        adapter.model_loaded = True
+        
+        for i in range(runs):
+            # 非流式：首個token要等到完整生成結束
+            start = time.perf_counter()
+            await adapter.generate_response(f"非流式 {i}")
+            blocking_ttft.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            first_token = None
+            async for chunk in adapter.stream_response(f"流式 {i}"):
+                if first_token is None and chunk["token"]:
+                    first_token = time.perf_counter() - start
+            streaming_ttft.append(first_token or 0.0)
+            streaming_total.append(time.perf_counter() - start)
+        await adapter.http.close()
+    
+    def mean_ms(values: List[float]) -> float:
+        return sum(values) / len(values) * 1000 if values else 0.0
+    
+    results = {
+        "runs": runs,
+        "tokens_per_response": tokens_per_response,
+        "blocking_ttft_ms": mean_ms(blocking_ttft),
+        "streaming_ttft_ms": mean_ms(streaming_ttft),
+        "streaming_total_ms": mean_ms(streaming_total)
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return results
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        asyncio.run(benchmark_local_client())
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark-ttft":
+        asyncio.run(benchmark_time_to_first_token())
+        sys.exit(0)
+    
     # 測試適配器
     async def test_adapter():
         adapter = Qwen3LocalModelMCP()
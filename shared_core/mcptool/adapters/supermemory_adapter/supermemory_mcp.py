@@ -9,11 +9,13 @@ import os
 import json
 import logging
 import time
+import concurrent.futures
 from typing import List, Dict, Any, Optional, Union
-import requests
 
 # 導入接口定義
 from ..interfaces.adapter_interface import KiloCodeAdapterInterface
+from ..core.fixed_event_loop_manager import get_loop_manager
+from ..core.pooled_http_client import get_shared_http_client
 
 # 配置日誌
 logging.basicConfig(
@@ -43,6 +45,9 @@ class SuperMemoryAdapter(KiloCodeAdapterInterface):
         self.server_url = server_url or os.environ.get("SUPERMEMORY_SERVER_URL", "https://api.supermemory.ai/v1")
         self.timeout = int(os.environ.get("SUPERMEMORY_TIMEOUT", "30"))
         
+        # 同步接口通過共享事件循環調用連接池客戶端，跨調用複用連接
+        self.http = get_shared_http_client()
+        
         if not self.api_key:
             logger.warning("No API key provided for SuperMemory adapter")
         
@@ -80,18 +85,19 @@ class SuperMemoryAdapter(KiloCodeAdapterInterface):
         """檢查適配器健康狀態"""
         try:
             # 嘗試調用API檢查連接
-            response = requests.get(
+            response = get_loop_manager().run_coroutine(self.http.request(
+                "GET",
                 f"{self.server_url}/health",
                 headers={"Authorization": f"Bearer {self.api_key}"},
                 timeout=5
-            )
+            ), timeout=10)
             
             return {
-                "status": "healthy" if response.status_code == 200 else "unhealthy",
-                "api_accessible": response.status_code in [200, 401, 403],
+                "status": "healthy" if response.status == 200 else "unhealthy",
+                "api_accessible": response.status in [200, 401, 403],
                 "server_url": self.server_url,
                 "has_api_key": bool(self.api_key),
-                "response_code": response.status_code
+                "response_code": response.status
             }
         except Exception as e:
             return {
@@ -297,10 +303,40 @@ class SuperMemoryAdapter(KiloCodeAdapterInterface):
                 "deleted": False
             }
     
+    # 只讀端點的相同在途請求可以合併
+    COALESCED_ENDPOINTS = {"retrieve", "search"}
+    
     def _call_api(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         調用SuperMemory API
         
+        Args:
+            endpoint: API端點
+            data: 請求數據
+            
+        Returns:
+            API響應
+        """
+        if not self.api_key:
+            return {"error": "No API key available"}
+        
+        try:
+            # 留出重試退避的餘量
+            return get_loop_manager().run_coroutine(
+                self._call_api_async(endpoint, data),
+                timeout=self.timeout * 2
+            )
+        except concurrent.futures.TimeoutError:
+            logger.error(f"API call timed out: {endpoint}")
+            return {"error": "API call timed out"}
+        except Exception as e:
+            logger.error(f"Error calling API: {str(e)}")
+            return {"error": str(e)}
+    
+    async def _call_api_async(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        異步調用SuperMemory API，供運行在事件循環上的調用方直接await
+        
         Args:
             endpoint: API端點
             data: 請求數據
@@ -317,18 +353,20 @@ class SuperMemoryAdapter(KiloCodeAdapterInterface):
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(
+            response = await self.http.request(
+                "POST",
                 f"{self.server_url}/{endpoint}",
+                json_body=data,
                 headers=headers,
-                json=data,
-                timeout=self.timeout
+                timeout=self.timeout,
+                coalesce=endpoint in self.COALESCED_ENDPOINTS
             )
             
-            if response.status_code == 200:
+            if response.status == 200:
                 return response.json()
             else:
-                logger.error(f"API error: {response.status_code} - {response.text}")
-                return {"error": f"API returned status code {response.status_code}"}
+                logger.error(f"API error: {response.status} - {response.text}")
+                return {"error": f"API returned status code {response.status}"}
                 
         except Exception as e:
             logger.error(f"Error calling API: {str(e)}")
@@ -13,8 +13,9 @@ from flask_socketio import SocketIO, emit, join_room, leave_room
 import json
 import time
 import threading
+from collections import Counter, deque
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
 # 導入核心系統
@@ -24,12 +25,86 @@ from real_token_saving_system import (
     RealTimeCreditsManager
 )
 
+_LOCAL_EPOCH = datetime(1970, 1, 1)
+
+def _local_seconds(moment: datetime) -> float:
+    """把本地時間轉換為秒數，分桶邊界與本地的整點和零點對齊"""
+    return (moment - _LOCAL_EPOCH).total_seconds()
+
+class TimeBucketRing:
+    """固定大小的時間分桶環形緩衝區
+    
+    add 只更新一個桶；window 通過滾動合計返回最近 bucket_count 個桶的 (次數, 總和)，
+    current 返回當前桶（如本小時、今天）的 (次數, 總和)。推進時每個桶只清空一次，
+    查詢均為攤還 O(1)。window 也會推進緩衝區，本類不加鎖，並發訪問由調用方加鎖。
+    """
+    
+    def __init__(self, bucket_seconds: float, bucket_count: int):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        self._ids = [-1] * bucket_count
+        self._counts = [0] * bucket_count
+        self._sums = [0.0] * bucket_count
+        self._window_count = 0
+        self._window_sum = 0.0
+        self._head: Optional[int] = None
+    
+    def _advance(self, index: int):
+        """推進到桶序號 index，清空滑出窗口的桶"""
+        if self._head is None or index - self._head >= self.bucket_count:
+            self._ids = [-1] * self.bucket_count
+            self._counts = [0] * self.bucket_count
+            self._sums = [0.0] * self.bucket_count
+            self._window_count = 0
+            self._window_sum = 0.0
+        else:
+            for bucket in range(self._head + 1, index + 1):
+                slot = bucket % self.bucket_count
+                if self._ids[slot] != -1:
+                    self._window_count -= self._counts[slot]
+                    self._window_sum -= self._sums[slot]
+                self._ids[slot] = -1
+                self._counts[slot] = 0
+                self._sums[slot] = 0.0
+            if self._window_count == 0:
+                self._window_sum = 0.0
+        self._head = index
+    
+    def add(self, timestamp: float, value: float = 0.0):
+        index = int(timestamp // self.bucket_seconds)
+        if self._head is None or index > self._head:
+            self._advance(index)
+        elif index <= self._head - self.bucket_count:
+            return  # 早於環形緩衝區覆蓋的範圍
+        slot = index % self.bucket_count
+        self._ids[slot] = index
+        self._counts[slot] += 1
+        self._sums[slot] += value
+        self._window_count += 1
+        self._window_sum += value
+    
+    def window(self, now: float) -> Tuple[int, float]:
+        index = int(now // self.bucket_seconds)
+        if self._head is not None and index > self._head:
+            self._advance(index)
+        return self._window_count, self._window_sum
+    
+    def current(self, now: float) -> Tuple[int, float]:
+        index = int(now // self.bucket_seconds)
+        slot = index % self.bucket_count
+        if self._ids[slot] != index:
+            return 0, 0.0
+        return self._counts[slot], self._sums[slot]
+
 class AdminRealtimeMonitor:
     """端側Admin實時監控系統"""
     
-    def __init__(self, app: Flask, socketio: SocketIO):
+    def __init__(self, app: Flask, socketio: SocketIO, poll_interval: float = 5.0,
+                 min_push_interval: float = 0.5):
         self.app = app
         self.socketio = socketio
+        self.poll_interval = poll_interval
+        self.min_push_interval = min_push_interval
         
         # 初始化核心組件
         self.token_router = RealTokenSavingRouter()
@@ -45,6 +120,15 @@ class AdminRealtimeMonitor:
             'system_health': 'excellent'
         }
         
+        # 增量維護的窗口聚合：每條歷史記錄只解析一次
+        self._ingest_lock = threading.Lock()
+        self._reset_aggregates()
+        
+        # 有變更時喚醒監控線程推送，沒有變更時按 poll_interval 檢查窗口衰減
+        self._change_event = threading.Event()
+        self._last_pushed_update: Optional[Dict[str, Any]] = None
+        self._last_low_balance_users: Optional[List[str]] = None
+        
         # 初始化用戶積分
         self._initialize_demo_users()
         
@@ -218,6 +302,7 @@ class AdminRealtimeMonitor:
                     
                     # 實時推送更新
                     self._emit_credits_update(username, current_credits, new_credits)
+                    self.notify_change()
                     
                     return jsonify({
                         'success': True,
@@ -327,20 +412,32 @@ class AdminRealtimeMonitor:
                 emit('report_generated', report_data)
     
     def start_realtime_monitoring(self):
-        """啟動實時監控線程"""
+        """啟動實時監控線程
+        
+        線程在 notify_change() 或 poll_interval 超時時醒來，增量更新聚合，
+        只在推送內容變化時才推送；兩次推送之間至少間隔 min_push_interval，突發變更合併為一次推送。
+        """
         def monitoring_loop():
             while True:
                 try:
+                    self._change_event.wait(self.poll_interval)
+                    self._change_event.clear()
+                    
                     # 更新實時統計
+                    history_changed = self._ingest_history()
                     self._update_realtime_stats()
                     
-                    # 推送更新到管理員
-                    self._emit_realtime_update()
+                    # 推送有變化的更新到管理員
+                    update_data = self._build_realtime_update()
+                    if update_data != self._last_pushed_update:
+                        self._last_pushed_update = update_data
+                        self._emit_realtime_update(update_data)
                     
                     # 檢查積分變化
-                    self._check_credits_changes()
+                    if history_changed:
+                        self._check_credits_changes()
                     
-                    time.sleep(5)  # 每5秒更新一次
+                    time.sleep(self.min_push_interval)
                     
                 except Exception as e:
                     self.logger.error(f"Monitoring loop error: {e}")
@@ -350,6 +447,74 @@ class AdminRealtimeMonitor:
         monitoring_thread.start()
         self.logger.info("🔄 Realtime monitoring started")
     
+    def notify_change(self):
+        """通知監控線程有新數據，盡快推送"""
+        self._change_event.set()
+    
+    def _reset_aggregates(self):
+        """重置窗口聚合，下次查詢時從頭重放歷史記錄"""
+        self._savings_cursor = 0
+        self._credits_cursor = 0
+        self.savings_windows = {
+            'minute': TimeBucketRing(1, 60),          # 最近一分鐘，按秒分桶
+            'ten_minutes': TimeBucketRing(10, 60),    # 最近十分鐘，按10秒分桶
+            'hour': TimeBucketRing(3600, 24),         # 按本地整點分桶，保留一天
+            'day': TimeBucketRing(86400, 31)          # 按本地日期分桶，保留一個月
+        }
+        self.credits_windows = {
+            'day': TimeBucketRing(86400, 31)
+        }
+        self._task_type_counts = Counter()
+        self._local_processed = 0
+        self._recent_credits = deque(maxlen=10)
+    
+    def _ingest_history(self) -> bool:
+        """把節省和積分歷史中新增的條目計入聚合，返回是否有新條目"""
+        with self._ingest_lock:
+            savings_history = self.token_router.savings_history
+            credits_history = self.credits_manager.credits_history
+            if len(savings_history) < self._savings_cursor or len(credits_history) < self._credits_cursor:
+                # 歷史被清空或截斷，重建聚合
+                self._reset_aggregates()
+            
+            new_savings = savings_history[self._savings_cursor:]
+            new_credits = credits_history[self._credits_cursor:]
+            self._savings_cursor += len(new_savings)
+            self._credits_cursor += len(new_credits)
+            
+            for entry in new_savings:
+                timestamp = _local_seconds(datetime.fromisoformat(entry['timestamp']))
+                for ring in self.savings_windows.values():
+                    ring.add(timestamp, entry['cost_saved'])
+                self._task_type_counts[entry['task_type']] += 1
+                if 'LOCAL' in entry['routing']:
+                    self._local_processed += 1
+            
+            for entry in new_credits:
+                timestamp = _local_seconds(datetime.fromisoformat(entry['timestamp']))
+                for ring in self.credits_windows.values():
+                    ring.add(timestamp)
+                self._recent_credits.append((timestamp, entry))
+            
+            return bool(new_savings or new_credits)
+    
+    def _rings(self, source: str) -> Dict[str, TimeBucketRing]:
+        return self.savings_windows if source == 'savings' else self.credits_windows
+    
+    def query_window(self, name: str, now: Optional[float] = None, source: str = 'savings') -> Tuple[int, float]:
+        """同步歷史後在聚合鎖內推進並讀取窗口合計 (次數, 總和)"""
+        self._ingest_history()
+        now = _local_seconds(datetime.now()) if now is None else now
+        with self._ingest_lock:
+            return self._rings(source)[name].window(now)
+    
+    def query_current(self, name: str, now: Optional[float] = None, source: str = 'savings') -> Tuple[int, float]:
+        """同步歷史後在聚合鎖內讀取當前桶 (次數, 總和)"""
+        self._ingest_history()
+        now = _local_seconds(datetime.now()) if now is None else now
+        with self._ingest_lock:
+            return self._rings(source)[name].current(now)
+    
     def _check_admin_permission(self) -> bool:
         """檢查管理員權限"""
         if 'user' not in session:
@@ -361,36 +526,36 @@ class AdminRealtimeMonitor:
     
     def _update_realtime_stats(self):
         """更新實時統計"""
-        # 模擬實時數據更新
-        self.realtime_stats['requests_per_minute'] = len([
-            h for h in self.token_router.savings_history 
-            if datetime.fromisoformat(h['timestamp']) > datetime.now() - timedelta(minutes=1)
-        ])
+        self.realtime_stats['requests_per_minute'] = self.query_window('minute')[0]
         
         self.realtime_stats['current_token_savings'] = self.token_router.total_savings
         self.realtime_stats['active_users'] = len(self.credits_manager.current_credits)
     
-    def _emit_realtime_update(self):
+    def _build_realtime_update(self) -> Dict[str, Any]:
+        """構建推送內容（不含時間戳，便於比較是否有變化）"""
+        return {
+            'token_savings': {
+                'total': self.token_router.total_savings,
+                'tokens': self.token_router.total_tokens_saved,
+                'rate': self._calculate_current_savings_rate()
+            },
+            'privacy_status': {
+                'protection_rate': self.privacy_protector.get_privacy_report()['protection_rate'],
+                'violations': self.privacy_protector.privacy_violations
+            },
+            'credits_summary': {
+                'total': sum(self.credits_manager.current_credits.values()),
+                'users': len(self.credits_manager.current_credits),
+                'recent_changes': self._get_recent_credits_changes()
+            },
+            'system_health': self.realtime_stats['system_health']
+        }
+    
+    def _emit_realtime_update(self, update_data: Optional[Dict[str, Any]] = None):
         """推送實時更新"""
         try:
-            update_data = {
-                'timestamp': datetime.now().isoformat(),
-                'token_savings': {
-                    'total': self.token_router.total_savings,
-                    'tokens': self.token_router.total_tokens_saved,
-                    'rate': self._calculate_current_savings_rate()
-                },
-                'privacy_status': {
-                    'protection_rate': self.privacy_protector.get_privacy_report()['protection_rate'],
-                    'violations': self.privacy_protector.privacy_violations
-                },
-                'credits_summary': {
-                    'total': sum(self.credits_manager.current_credits.values()),
-                    'users': len(self.credits_manager.current_credits),
-                    'recent_changes': self._get_recent_credits_changes()
-                },
-                'system_health': self.realtime_stats['system_health']
-            }
+            update_data = dict(update_data or self._build_realtime_update())
+            update_data['timestamp'] = datetime.now().isoformat()
             
             self.socketio.emit('realtime_update', update_data, room='admin_monitor')
             
@@ -413,53 +578,37 @@ class AdminRealtimeMonitor:
     
     def _calculate_hourly_savings(self) -> float:
         """計算當前小時節省"""
-        current_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
-        hourly_savings = [
-            h['cost_saved'] for h in self.token_router.savings_history
-            if datetime.fromisoformat(h['timestamp']) >= current_hour
-        ]
-        return sum(hourly_savings)
+        return self.query_current('hour')[1]
     
     def _calculate_current_savings_rate(self) -> float:
-        """計算當前節省率"""
-        recent_savings = [
-            h for h in self.token_router.savings_history
-            if datetime.fromisoformat(h['timestamp']) > datetime.now() - timedelta(minutes=10)
-        ]
+        """計算當前節省率（最近十分鐘的平均每次節省）"""
+        count, total = self.query_window('ten_minutes')
         
-        if not recent_savings:
+        if not count:
             return 0.0
         
-        return sum(h['cost_saved'] for h in recent_savings) / len(recent_savings)
+        return total / count
     
     def _calculate_efficiency_score(self) -> float:
         """計算效率分數"""
-        if not self.token_router.savings_history:
+        self._ingest_history()
+        with self._ingest_lock:
+            local_processed, processed = self._local_processed, self._savings_cursor
+        if not processed:
             return 0.0
         
-        local_processed = len([
-            h for h in self.token_router.savings_history
-            if 'LOCAL' in h['routing']
-        ])
-        
-        total_processed = len(self.token_router.savings_history)
-        return (local_processed / total_processed) * 100
+        return (local_processed / processed) * 100
     
     def _count_todays_transactions(self) -> int:
         """計算今日交易數"""
-        today = datetime.now().date()
-        return len([
-            h for h in self.credits_manager.credits_history
-            if datetime.fromisoformat(h['timestamp']).date() == today
-        ])
+        return self.query_current('day', source='credits')[0]
     
     def _get_recent_credits_changes(self) -> List[Dict[str, Any]]:
         """獲取最近積分變化"""
-        recent = [
-            h for h in self.credits_manager.credits_history
-            if datetime.fromisoformat(h['timestamp']) > datetime.now() - timedelta(minutes=30)
-        ]
-        return recent[-10:]  # 最近10條
+        self._ingest_history()
+        since = _local_seconds(datetime.now() - timedelta(minutes=30))
+        with self._ingest_lock:
+            return [entry for timestamp, entry in self._recent_credits if timestamp > since]  # 最近10條
     
     def _check_credits_changes(self):
         """檢查積分變化並推送通知"""
@@ -469,6 +618,11 @@ class AdminRealtimeMonitor:
             if credits < 100
         ]
         
+        # 只在低餘額用戶集合變化時推送
+        if low_balance_users == self._last_low_balance_users:
+            return
+        self._last_low_balance_users = low_balance_users
+        
         if low_balance_users:
             self.socketio.emit('low_balance_alert', {
                 'users': low_balance_users,
@@ -486,14 +640,12 @@ class AdminRealtimeMonitor:
     
     def _get_trending_task_types(self) -> List[Dict[str, Any]]:
         """獲取熱門任務類型"""
-        task_counts = {}
-        for h in self.token_router.savings_history:
-            task_type = h['task_type']
-            task_counts[task_type] = task_counts.get(task_type, 0) + 1
-        
+        self._ingest_history()
+        with self._ingest_lock:
+            trending = self._task_type_counts.most_common(5)
         return [
             {'task_type': task, 'count': count}
-            for task, count in sorted(task_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+            for task, count in trending
         ]
     
     def _calculate_credits_trends(self) -> Dict[str, Any]:
@@ -573,6 +725,7 @@ def integrate_admin_monitor_to_platform(app: Flask, socketio: SocketIO) -> Admin
                     routing_decision, 
                     privacy_result
                 )
+                admin_monitor.notify_change()
     
     return admin_monitor
 
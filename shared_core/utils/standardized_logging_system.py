@@ -11,12 +11,14 @@ import time
 import os
 import sys
 from datetime import datetime
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 from pathlib import Path
 from dataclasses import dataclass, asdict
 from enum import Enum
 import threading
 import traceback
+import random
+import weakref
 
 class LogLevel(Enum):
     """日誌級別枚舉"""
@@ -396,9 +398,263 @@ def log_critical(category: Union[str, LogCategory], message: str,
     """全局嚴重錯誤日誌函數"""
     get_logger().log_critical(category, message, context, exception)
 
+# 進程內性能指標聚合
+class LatencyHistogram:
+    """HDR風格的對數-線性延遲直方圖（微秒精度，約1%相對誤差）"""
+    
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+    SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+    
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total_count = 0
+        self.error_count = 0
+        self.total_us = 0
+        self.max_us = 0
+    
+    @classmethod
+    def bucket_index(cls, value_us: int) -> int:
+        """計算數值所在的桶索引"""
+        if value_us < cls.SUB_BUCKET_COUNT:
+            return value_us
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS
+        return cls.SUB_BUCKET_COUNT + (shift - 1) * cls.SUB_BUCKET_HALF + ((value_us >> shift) - cls.SUB_BUCKET_HALF)
+    
+    @classmethod
+    def bucket_value(cls, index: int) -> int:
+        """返回桶的代表值（桶區間中點）"""
+        if index < cls.SUB_BUCKET_COUNT:
+            return index
+        offset = index - cls.SUB_BUCKET_COUNT
+        shift = offset // cls.SUB_BUCKET_HALF + 1
+        sub_bucket = offset % cls.SUB_BUCKET_HALF + cls.SUB_BUCKET_HALF
+        return (sub_bucket << shift) + ((1 << shift) >> 1)
+    
+    def record(self, value_us: int, success: bool = True):
+        """記錄一次延遲"""
+        index = self.bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total_count += 1
+        self.total_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+        if not success:
+            self.error_count += 1
+    
+    def merge(self, other: 'LatencyHistogram'):
+        """合併另一個直方圖"""
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.error_count += other.error_count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+    
+    def subtract(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        """返回與較早快照之間的增量直方圖（max_us 保留當前值）"""
+        delta = LatencyHistogram()
+        for index, count in self.counts.items():
+            diff = count - other.counts.get(index, 0)
+            if diff > 0:
+                delta.counts[index] = diff
+        delta.total_count = self.total_count - other.total_count
+        delta.error_count = self.error_count - other.error_count
+        delta.total_us = self.total_us - other.total_us
+        delta.max_us = self.max_us
+        return delta
+    
+    def percentile(self, percent: float) -> float:
+        """計算百分位延遲（微秒）"""
+        if self.total_count <= 0:
+            return 0.0
+        target = max(1, int(round(self.total_count * percent / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return float(min(self.bucket_value(index), self.max_us))
+        return float(self.max_us)
+    
+    def summary(self) -> Dict[str, float]:
+        """生成統計摘要（秒）"""
+        count = self.total_count
+        return {
+            'count': count,
+            'errors': self.error_count,
+            'mean_seconds': (self.total_us / count / 1e6) if count else 0.0,
+            'p50_seconds': self.percentile(50) / 1e6,
+            'p95_seconds': self.percentile(95) / 1e6,
+            'p99_seconds': self.percentile(99) / 1e6,
+            'max_seconds': self.max_us / 1e6
+        }
+
+class PerformanceMetricsRegistry:
+    """進程內性能指標註冊表
+    
+    每個線程寫入自己的分片，熱路徑不持鎖；只有在快照和刷新時才合併各分片。
+    已退出線程的分片在合併時併入退役匯總並移除，分片數只與存活的線程數有關。
+    刷新線程定期把區間統計寫入性能日誌，單次調用日誌按採樣率記錄。
+    """
+    
+    def __init__(self, flush_interval: float = 60.0, sample_rate: float = 0.01):
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        
+        self._local = threading.local()
+        self._shards: List[Tuple[weakref.ref, Dict[str, LatencyHistogram]]] = []  # (所屬線程, 分片)
+        self._retired: Dict[str, LatencyHistogram] = {}  # 已退出線程的累計指標
+        self._shards_lock = threading.Lock()
+        self._last_flushed: Dict[str, LatencyHistogram] = {}
+        self._flush_thread = None
+        self._stop_event = threading.Event()
+    
+    def _get_shard(self) -> Dict[str, LatencyHistogram]:
+        """獲取當前線程的指標分片"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+    
+    def record(self, operation: str, execution_time: float, success: bool = True):
+        """記錄一次調用"""
+        shard = self._get_shard()
+        histogram = shard.get(operation)
+        if histogram is None:
+            histogram = shard[operation] = LatencyHistogram()
+        histogram.record(max(0, int(execution_time * 1e6)), success)
+        
+        if self._flush_thread is None:
+            self._start_flush_thread()
+    
+    def should_sample(self) -> bool:
+        """判斷本次調用是否需要寫入單次日誌"""
+        return self.sample_rate >= 1.0 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+    
+    def _merged(self) -> Dict[str, LatencyHistogram]:
+        """合併所有線程分片，並把已退出線程的分片併入退役匯總"""
+        with self._shards_lock:
+            live = []
+            for thread_ref, shard in self._shards:
+                thread = thread_ref()
+                if thread is not None and thread.is_alive():
+                    live.append((thread_ref, shard))
+                    continue
+                # 線程已退出，分片不會再被寫入
+                for operation, histogram in shard.items():
+                    self._retired.setdefault(operation, LatencyHistogram()).merge(histogram)
+            self._shards = live
+            shards = [shard for _, shard in live]
+            
+            merged: Dict[str, LatencyHistogram] = {}
+            for operation, histogram in self._retired.items():
+                merged.setdefault(operation, LatencyHistogram()).merge(histogram)
+        
+        for shard in shards:
+            for operation, histogram in list(shard.items()):
+                merged.setdefault(operation, LatencyHistogram()).merge(histogram)
+        return merged
+    
+    def snapshot(self, operation: str = None) -> Dict[str, Dict[str, float]]:
+        """獲取累計的p50/p95/p99等統計"""
+        merged = self._merged()
+        if operation is not None:
+            histogram = merged.get(operation)
+            return {operation: histogram.summary()} if histogram else {}
+        return {name: histogram.summary() for name, histogram in merged.items()}
+    
+    def flush(self) -> Dict[str, Dict[str, float]]:
+        """把自上次刷新以來的區間統計寫入性能日誌"""
+        merged = self._merged()
+        flushed = {}
+        
+        for operation, histogram in merged.items():
+            previous = self._last_flushed.get(operation)
+            delta = histogram.subtract(previous) if previous else histogram
+            if delta.total_count <= 0:
+                continue
+            
+            metrics = delta.summary()
+            flushed[operation] = metrics
+            log_performance(operation, metrics)
+        
+        self._last_flushed = merged
+        return flushed
+    
+    def reset(self):
+        """清空所有指標"""
+        with self._shards_lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._retired = {}
+        self._last_flushed = {}
+    
+    def _start_flush_thread(self):
+        """啟動定期刷新線程"""
+        with self._shards_lock:
+            if self._flush_thread is not None:
+                return
+            
+            def flush_loop():
+                while not self._stop_event.wait(self.flush_interval):
+                    try:
+                        self.flush()
+                    except Exception as e:
+                        print(f"性能指標刷新失敗: {e}")
+            
+            self._flush_thread = threading.Thread(target=flush_loop, daemon=True)
+            self._flush_thread.start()
+    
+    def stop(self):
+        """停止刷新線程並做最後一次刷新"""
+        self._stop_event.set()
+        self.flush()
+
+_metrics_registry = None
+_metrics_registry_lock = threading.Lock()
+
+def get_metrics_registry() -> PerformanceMetricsRegistry:
+    """獲取全局性能指標註冊表"""
+    global _metrics_registry
+    if _metrics_registry is None:
+        with _metrics_registry_lock:
+            if _metrics_registry is None:
+                _metrics_registry = PerformanceMetricsRegistry()
+    return _metrics_registry
+
+def configure_performance_metrics(flush_interval: float = None, sample_rate: float = None) -> PerformanceMetricsRegistry:
+    """配置刷新間隔和單次調用日誌採樣率"""
+    registry = get_metrics_registry()
+    if flush_interval is not None:
+        registry.flush_interval = flush_interval
+    if sample_rate is not None:
+        registry.sample_rate = max(0.0, min(1.0, sample_rate))
+    return registry
+
+def get_performance_snapshot(operation: str = None) -> Dict[str, Dict[str, float]]:
+    """全局性能快照函數"""
+    return get_metrics_registry().snapshot(operation)
+
+def _record_call(op_name: str, execution_time: float, success: bool):
+    """記錄一次被監控的調用，並按採樣率寫入單次日誌"""
+    registry = get_metrics_registry()
+    registry.record(op_name, execution_time, success)
+    if registry.should_sample():
+        log_performance(op_name, {
+            'execution_time_seconds': execution_time,
+            'success': success,
+            'sample_rate': registry.sample_rate
+        })
+
 # 性能監控裝飾器
 def performance_monitor(operation_name: str = None):
-    """性能監控裝飾器 - 支持異步函數"""
+    """性能監控裝飾器 - 支持異步函數
+    
+    每次調用都計入指標註冊表，單次日誌只按採樣率寫入。
+    """
     def decorator(func):
         import asyncio
         import functools
@@ -408,26 +664,18 @@ def performance_monitor(operation_name: str = None):
             @functools.wraps(func)
             async def async_wrapper(*args, **kwargs):
                 op_name = operation_name or f"{func.__module__}.{func.__name__}"
-                start_time = time.time()
+                start_time = time.perf_counter()
                 
                 try:
                     result = await func(*args, **kwargs)
-                    execution_time = time.time() - start_time
-                    
-                    log_performance(op_name, {
-                        'execution_time_seconds': execution_time,
-                        'success': True
-                    })
+                    execution_time = time.perf_counter() - start_time
+                    _record_call(op_name, execution_time, True)
                     
                     return result
                     
                 except Exception as e:
-                    execution_time = time.time() - start_time
-                    
-                    log_performance(op_name, {
-                        'execution_time_seconds': execution_time,
-                        'success': False
-                    })
+                    execution_time = time.perf_counter() - start_time
+                    _record_call(op_name, execution_time, False)
                     
                     log_error(LogCategory.ERROR, f"函數執行失敗: {op_name}", 
                              {'function': func.__name__}, e)
@@ -439,26 +687,18 @@ def performance_monitor(operation_name: str = None):
             @functools.wraps(func)
             def sync_wrapper(*args, **kwargs):
                 op_name = operation_name or f"{func.__module__}.{func.__name__}"
-                start_time = time.time()
+                start_time = time.perf_counter()
                 
                 try:
                     result = func(*args, **kwargs)
-                    execution_time = time.time() - start_time
-                    
-                    log_performance(op_name, {
-                        'execution_time_seconds': execution_time,
-                        'success': True
-                    })
+                    execution_time = time.perf_counter() - start_time
+                    _record_call(op_name, execution_time, True)
                     
                     return result
                     
                 except Exception as e:
-                    execution_time = time.time() - start_time
-                    
-                    log_performance(op_name, {
-                        'execution_time_seconds': execution_time,
-                        'success': False
-                    })
+                    execution_time = time.perf_counter() - start_time
+                    _record_call(op_name, execution_time, False)
                     
                     log_error(LogCategory.ERROR, f"函數執行失敗: {op_name}", 
                              {'function': func.__name__}, e)
@@ -494,6 +734,15 @@ if __name__ == "__main__":
     result = test_function()
     print(f"測試結果: {result}")
     
+    # 測試指標聚合
+    @performance_monitor("hot_path")
+    def hot_path(i):
+        return i * i
+    
+    for i in range(10000):
+        hot_path(i)
+    print(f"性能快照: {json.dumps(get_performance_snapshot(), indent=2)}")
+    
     # 顯示日誌統計
     stats = logger.get_log_stats()
     print(f"日誌統計: {json.dumps(stats, indent=2, ensure_ascii=False)}")
@@ -0,0 +1,71 @@
+"""
+開發部署閉環協調器的暫停/恢復測試
+"""
+
+import asyncio
+
+from shared_core.mcptool.adapters.dev_deploy_loop_coordinator_mcp import (
+    DevDeployLoopCoordinatorMCP,
+    LoopStatus
+)
+
+def _fast_coordinator(stage_delay: float) -> DevDeployLoopCoordinatorMCP:
+    """各階段固定耗時且成功、不迭代的協調器"""
+    coordinator = DevDeployLoopCoordinatorMCP()
+
+    async def stage(execution):
+        await asyncio.sleep(stage_delay)
+        return {"status": "success"}
+
+    async def no_iteration(execution):
+        return {"iterate": False}
+
+    coordinator.stage_processors = {name: stage for name in coordinator.stage_processors}
+    coordinator._process_iteration = no_iteration
+    return coordinator
+
+def test_resume_while_stage_running_completes_loop():
+    async def scenario():
+        coordinator = _fast_coordinator(stage_delay=0.05)
+        started = await coordinator.start_development_loop("實現一個計算器", "calculator")
+        execution_id = started["execution_id"]
+
+        await asyncio.sleep(0.02)
+        assert (await coordinator.pause_loop(execution_id))["status"] == "success"
+        assert (await coordinator.resume_loop(execution_id))["status"] == "success"
+        assert coordinator.active_loops[execution_id].status == LoopStatus.RUNNING
+
+        for _ in range(200):
+            if execution_id not in coordinator.active_loops:
+                break
+            await asyncio.sleep(0.01)
+
+        assert execution_id not in coordinator.active_loops
+        assert coordinator.loop_history[-1]["execution_id"] == execution_id
+        assert coordinator.loop_history[-1]["status"] == LoopStatus.COMPLETED.value
+        assert not coordinator._running_loops
+
+    asyncio.run(scenario())
+
+def test_resume_after_stage_finished_requeues_loop():
+    async def scenario():
+        coordinator = _fast_coordinator(stage_delay=0.02)
+        started = await coordinator.start_development_loop("實現一個計算器", "calculator")
+        execution_id = started["execution_id"]
+
+        await asyncio.sleep(0.01)
+        await coordinator.pause_loop(execution_id)
+        # 等當前階段結束、閉環讓出名額
+        while execution_id in coordinator._running_loops:
+            await asyncio.sleep(0.01)
+        assert coordinator.active_loops[execution_id].status == LoopStatus.PAUSED
+
+        await coordinator.resume_loop(execution_id)
+        for _ in range(200):
+            if execution_id not in coordinator.active_loops:
+                break
+            await asyncio.sleep(0.01)
+
+        assert coordinator.loop_history[-1]["status"] == LoopStatus.COMPLETED.value
+
+    asyncio.run(scenario())
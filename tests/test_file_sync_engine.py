@@ -0,0 +1,80 @@
+"""
+橋接文件同步失敗重試測試
+"""
+
+import asyncio
+
+from shared_core.engines.file_acquisition_engine import (
+    FileSyncEngine,
+    LocalDirectoryTransport,
+    WSLBridgeConfig
+)
+
+class FlakyTransport(LocalDirectoryTransport):
+    """前 fail_checksums 次 checksums 拋異常、前 fail_copies 次複製全部失敗的本地傳輸"""
+
+    def __init__(self, fail_checksums: int = 0, fail_copies: int = 0):
+        self.fail_checksums = fail_checksums
+        self.fail_copies = fail_copies
+
+    async def checksums(self, paths):
+        if self.fail_checksums:
+            self.fail_checksums -= 1
+            raise OSError("目標不可用")
+        return await super().checksums(paths)
+
+    async def copy_files(self, pairs):
+        if self.fail_copies:
+            self.fail_copies -= 1
+            return [destination for _, destination in pairs]
+        return await super().copy_files(pairs)
+
+def _engine(tmp_path, transport, auto_sync=False):
+    source_dir, target_dir = tmp_path / "src", tmp_path / "dst"
+    source_dir.mkdir()
+    target_dir.mkdir()
+    engine = FileSyncEngine()
+    engine.register_bridge("bridge", WSLBridgeConfig(str(source_dir), str(target_dir),
+                                                     auto_sync=auto_sync, sync_interval=0.01), transport)
+    source = source_dir / "a.txt"
+    source.write_text("hello")
+    return engine, str(source), target_dir / "a.txt"
+
+def test_transport_error_keeps_pending_changes(tmp_path):
+    engine, source, target = _engine(tmp_path, FlakyTransport(fail_checksums=1))
+    engine.queue_change("bridge", source)
+
+    try:
+        asyncio.run(engine.sync_pending("bridge"))
+    except OSError:
+        pass
+    else:
+        raise AssertionError("transport error should propagate")
+    assert engine.get_stats()["pending"]["bridge"] == 1
+
+    batch = asyncio.run(engine.sync_pending("bridge"))
+    assert batch["full_copied"] == 1
+    assert target.read_text() == "hello"
+
+def test_failed_copy_is_requeued(tmp_path):
+    engine, source, target = _engine(tmp_path, FlakyTransport(fail_copies=1))
+    engine.queue_change("bridge", source)
+
+    assert asyncio.run(engine.sync_pending("bridge"))["failed"] == 1
+    assert engine.get_stats()["pending"]["bridge"] == 1
+    assert asyncio.run(engine.sync_pending("bridge"))["full_copied"] == 1
+    assert target.read_text() == "hello"
+
+def test_auto_sync_retries_after_error(tmp_path):
+    async def scenario():
+        engine, source, target = _engine(tmp_path, FlakyTransport(fail_checksums=2), auto_sync=True)
+        engine.bind_loop(asyncio.get_running_loop())
+        engine.queue_change("bridge", source)
+        for _ in range(200):
+            if target.exists():
+                break
+            await asyncio.sleep(0.01)
+        assert target.read_text() == "hello"
+        assert engine.bridges["bridge"].failures == 0
+
+    asyncio.run(scenario())
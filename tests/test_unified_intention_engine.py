@@ -0,0 +1,78 @@
+"""
+編譯式意圖分類器與逐個搜索的原實現的一致性測試
+"""
+
+import re
+from enum import Enum
+
+from shared_core.engines.unified_intention_engine import (
+    IntentionAnalysisResult,
+    IntentionClassifier,
+    WorkflowIntention
+)
+
+class ExtraIntention(Enum):
+    BUG_TRIAGE = "bug_triage"
+    REFACTORING = "refactoring"
+
+def legacy_analyze(classifier: IntentionClassifier, user_input: str) -> IntentionAnalysisResult:
+    """修改前的實現：每個關鍵詞做子串搜索，每個模式做一次 re.search"""
+    user_input_lower = user_input.lower()
+    best_match, best_score, best_keywords, best_patterns = None, 0.0, [], []
+    for intention, config in classifier.workflow_intentions.items():
+        keywords = [k for k in config["keywords"] if k.lower() in user_input_lower]
+        patterns = [p for p in config["patterns"] if re.search(p, user_input, re.IGNORECASE)]
+        score = len(keywords) * 1.0 + len(patterns) * 1.5
+        total_possible = len(config["keywords"]) + len(config["patterns"]) * 1.5
+        confidence = score / total_possible if total_possible > 0 else 0.0
+        if confidence > best_score:
+            best_score, best_match, best_keywords, best_patterns = confidence, intention, keywords, patterns
+    if best_score < 0.1:
+        best_match = WorkflowIntention.UNKNOWN
+    return IntentionAnalysisResult(best_match, best_score, best_keywords, best_patterns,
+                                   f"匹配到 {len(best_keywords)} 個關鍵詞和 {len(best_patterns)} 個模式")
+
+def _classifier_with_runtime_patterns() -> IntentionClassifier:
+    classifier = IntentionClassifier()
+    classifier.register_intention(
+        ExtraIntention.BUG_TRIAGE,
+        keywords=["crash", "崩潰"],
+        patterns=[r"bug|defect", r"colou?r", r"(?:unit )?regressions?", r"v\d+\.\d+", r"\bnull\b",
+                  r"^fix", r"c\+\+", r"錯誤|異常"],
+        target_engine="kilo_code_engine"
+    )
+    classifier.register_intention(
+        ExtraIntention.REFACTORING,
+        patterns=[r"[Rr]efactor", r"re(?:fact|writ)e", r"(extract|inline) method", r"clean\s*up"],
+        target_engine="kilo_code_engine"
+    )
+    return classifier
+
+INPUTS = [
+    "found a defect in the parser",
+    "there is a bug in the colour picker",
+    "wrong color after unit regressions in v2.10",
+    "null pointer in c++ module",
+    "fix the crash on startup",
+    "please fix this, the code crashes",
+    "系統出現異常和崩潰",
+    "refactor and extract method from the handler",
+    "rewrite the module, then clean up",
+    "幫我寫一個Python函數來計算斐波那契數列",
+    "部署這個應用到生產環境",
+    "為這個函數生成單元測試用例",
+    "nullable fields are not null",
+    "今天天氣如何？",
+    "",
+]
+
+def test_compiled_classifier_matches_legacy():
+    classifier = _classifier_with_runtime_patterns()
+    for text in INPUTS:
+        assert classifier.analyze_intention(text) == legacy_analyze(classifier, text), text
+
+def test_top_level_alternation_matches_later_branch():
+    classifier = _classifier_with_runtime_patterns()
+    result = classifier.analyze_intention("found a defect")
+    assert result.intention == ExtraIntention.BUG_TRIAGE
+    assert r"bug|defect" in result.patterns_matched
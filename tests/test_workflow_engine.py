@@ -0,0 +1,103 @@
+"""
+工作流引擎檢查點恢復測試
+"""
+
+import asyncio
+
+from shared_core.engines.workflow_engine import (
+    EditionType,
+    NodeStatus,
+    WorkflowCheckpointStore,
+    WorkflowEngine,
+    WorkflowNodeType
+)
+
+def _fast_engine(checkpoint_dir, outputs=None, fail_types=()) -> WorkflowEngine:
+    """節點立即返回的引擎，記錄實際執行過的節點類型"""
+    engine = WorkflowEngine(EditionType.PERSONAL_PRO,
+                            checkpoint_store=WorkflowCheckpointStore(str(checkpoint_dir)))
+    engine.executed = []
+
+    async def run_node(node):
+        engine.executed.append(node.type)
+        if node.type in fail_types:
+            raise RuntimeError("模擬失敗")
+        return (outputs or {}).get(node.type, {node.type.value: "done"})
+
+    engine._run_node = run_node
+    return engine
+
+INPUT = {"project_name": "checkpoint", "requirements": "resume after restart"}
+
+def test_resume_after_restart_uses_stable_keys(tmp_path):
+    first = _fast_engine(tmp_path, fail_types=(WorkflowNodeType.DEPLOYMENT_RELEASE,))
+    result = asyncio.run(first.execute_workflow(first.create_workflow("demo"), INPUT))
+    assert result.status == NodeStatus.FAILED
+
+    # 模擬進程重啟：新引擎、重新創建的工作流（節點ID全部不同）
+    second = _fast_engine(tmp_path)
+    workflow = second.create_workflow("demo")
+    result = asyncio.run(second.execute_workflow(workflow, INPUT))
+
+    assert result.status == NodeStatus.COMPLETED
+    assert second.executed == [WorkflowNodeType.DEPLOYMENT_RELEASE]
+    assert workflow.nodes[0].output_data == {WorkflowNodeType.CODE_IMPLEMENTATION.value: "done"}
+    assert not list(tmp_path.glob("*.json"))
+
+def test_unserializable_output_fails_node(tmp_path):
+    engine = _fast_engine(tmp_path, outputs={WorkflowNodeType.CODE_IMPLEMENTATION: {"handle": object()}})
+    workflow = engine.create_workflow("demo")
+    result = asyncio.run(engine.execute_workflow(workflow, INPUT))
+
+    statuses = {node.type: node.status for node in workflow.nodes}
+    assert result.status == NodeStatus.FAILED
+    assert statuses[WorkflowNodeType.CODE_IMPLEMENTATION] == NodeStatus.FAILED
+    assert statuses[WorkflowNodeType.TEST_VERIFICATION] == NodeStatus.SKIPPED
+    assert "JSON" in workflow.nodes[0].error_message
+
+class FailingStore(WorkflowCheckpointStore):
+    """第 fail_after 次之後的寫入拋出指定異常"""
+
+    def __init__(self, error: Exception, fail_after: int = 0):
+        super().__init__()
+        self.error = error
+        self.fail_after = fail_after
+
+    def save(self, checkpoint_key, input_fingerprint, completed_nodes):
+        if self.fail_after <= 0:
+            raise self.error
+        self.fail_after -= 1
+        super().save(checkpoint_key, input_fingerprint, completed_nodes)
+
+def test_checkpoint_write_error_does_not_fail_node():
+    engine = _fast_engine(None)
+    engine.checkpoint_store = FailingStore(OSError("read-only file system"))
+    result = asyncio.run(engine.execute_workflow(engine.create_workflow("demo"), INPUT))
+
+    assert result.status == NodeStatus.COMPLETED
+    assert all(node.status == NodeStatus.COMPLETED for node in result.nodes)
+
+def test_aborted_workflow_cancels_running_nodes():
+    engine = WorkflowEngine(EditionType.ENTERPRISE, checkpoint_store=FailingStore(RuntimeError("boom"), fail_after=2))
+    cancelled = []
+
+    async def run_node(node):
+        if node.type == WorkflowNodeType.MONITORING_OPERATIONS:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(node.type)
+                raise
+        return {node.type.value: "done"}
+
+    engine._run_node = run_node
+    workflow = engine.create_workflow("demo")
+
+    async def scenario():
+        result = await asyncio.wait_for(engine.execute_workflow(workflow, INPUT), timeout=5)
+        # 返回時並行分支必須已被取消，而不是留給事件循環關閉時清理
+        return result, list(cancelled)
+
+    result, cancelled_on_return = asyncio.run(scenario())
+    assert result.status == NodeStatus.FAILED
+    assert cancelled_on_return == [WorkflowNodeType.MONITORING_OPERATIONS]